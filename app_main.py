@@ -6,6 +6,9 @@ Esplora eventi e chatta con AI - Due pagine in una
 import streamlit as st
 import os
 
+from eventi.profiler import profiler_enabled, render_profiler_panel, session_profiler
+from eventi.sidecar import load_stats, upcoming_events
+
 # Configurazione pagina principale
 st.set_page_config(
     page_title="Gestione Eventi",
@@ -14,6 +17,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+profiler = session_profiler(st.session_state, profiler_enabled(st.query_params))
+profiler.start_run("Home")
+profiler.checkpoint("setup")
+
 # CSS comune per tutte le pagine
 st.markdown("""
 <style>
@@ -65,6 +72,7 @@ if "initialized" not in st.session_state:
     })
 
 # ==================== PAGINA HOME ====================
+profiler.checkpoint("contenuto")
 st.markdown('<div class="main-header">📊 Gestione Eventi</div>', unsafe_allow_html=True)
 
 st.markdown("""
@@ -109,27 +117,28 @@ with col2:
 st.markdown("---")
 
 # Verifica file Excel
+profiler.checkpoint("statistiche")
 EXCEL_FILE = "gestione_eventi.xlsx"
 if os.path.exists(EXCEL_FILE):
     st.success(f"✅ File dati trovato: `{EXCEL_FILE}`")
     
-    import pandas as pd
     try:
-        df = pd.read_excel(EXCEL_FILE)
+        # Indicatori dal sidecar scritto a ogni salvataggio: nessuna lettura del workbook
+        with profiler.section("statistiche_sidecar"):
+            stats = load_stats(EXCEL_FILE)
         
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("📊 Totale Eventi", f"{len(df):,}")
+            st.metric("📊 Totale Eventi", f"{stats['totale']:,}")
         with col2:
-            if 'CATEGORIA' in df.columns:
-                st.metric("🏷️ Categorie", df['CATEGORIA'].nunique())
+            if stats['categorie'] is not None:
+                st.metric("🏷️ Categorie", stats['categorie'])
         with col3:
-            if 'A CHI CHIEDERE' in df.columns:
-                st.metric("👥 Contatti", df['A CHI CHIEDERE'].nunique())
+            if stats['contatti'] is not None:
+                st.metric("👥 Contatti", stats['contatti'])
         with col4:
-            if 'DATA EVENTO' in df.columns:
-                df['DATA EVENTO'] = pd.to_datetime(df['DATA EVENTO'], errors='coerce')
-                future = len(df[df['DATA EVENTO'] >= pd.Timestamp.now()])
+            future = upcoming_events(stats)
+            if future is not None:
                 st.metric("📅 Prossimi", future)
     except Exception as e:
         st.warning(f"⚠️ Errore lettura file: {str(e)}")
@@ -137,6 +146,7 @@ else:
     st.error(f"❌ File `{EXCEL_FILE}` non trovato nella directory corrente")
     st.info("💡 Assicurati che il file Excel sia nella stessa cartella dell'applicazione")
 
+profiler.checkpoint("footer")
 st.markdown("---")
 st.markdown("""
 <div style='text-align: center; color: gray; font-size: 0.9rem;'>
@@ -144,3 +154,6 @@ st.markdown("""
     🔍 Esplorazione Visuale + 🤖 Analisi AI con Claude
 </div>
 """, unsafe_allow_html=True)
+
+profiler.finish()
+render_profiler_panel(profiler)
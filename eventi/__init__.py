@@ -0,0 +1,4 @@
+"""
+Moduli di supporto per l'app Gestione Eventi
+Logica condivisa tra le pagine Streamlit (caching, analisi, accesso ai dati)
+"""
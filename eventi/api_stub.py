@@ -0,0 +1,354 @@
+"""
+Stub locale dell'API Anthropic per i test (nessuna chiamata reale, nessun costo)
+Implementa gli endpoint usati dall'app:
+- POST /v1/messages                       risposta simulata, anche in streaming (SSE)
+- POST /v1/messages/batches               crea un batch
+- GET  /v1/messages/batches/{id}          stato del batch (concluso dopo `batch_delay` secondi)
+- GET  /v1/messages/batches/{id}/results  risultati JSONL
+
+Per i test di carico simula latenza (con jitter), streaming a frammenti, un limite di
+richieste al minuto (429 con retry-after) e sovraccarichi casuali (529). Se la richiesta
+contiene strumenti, il primo turno chiama uno strumento come farebbe il modello.
+
+Avvio:  python -m eventi.api_stub --port 8765 --latency-ms 800 --rpm 50
+Uso:    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=stub streamlit run app_main.py
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8765
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _last_user_text(messages):
+    for message in reversed(messages or []):
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, str):
+            return content
+        return " ".join(b.get("text", "") for b in content if isinstance(b, dict))
+    return ""
+
+
+def _prompt_chars(params):
+    system = params.get("system") or ""
+    chars = len(system) if isinstance(system, str) else sum(len(b.get("text", "")) for b in system)
+    return chars + len(json.dumps(params.get("messages", []), ensure_ascii=False))
+
+
+def _has_tool_result(messages):
+    """Vero se l'ultimo turno utente contiene risultati di strumenti"""
+    if not messages or messages[-1].get("role") != "user":
+        return False
+    content = messages[-1].get("content")
+    return isinstance(content, list) and any(
+        isinstance(b, dict) and b.get("type") == "tool_result" for b in content
+    )
+
+
+class StubState:
+    """Stato condiviso dello stub: configurazione, batch creati e contatori"""
+
+    def __init__(self, batch_delay=2.0, answer_words=60, batches=True, latency_ms=0.0, jitter_ms=0.0,
+                 chunk_delay_ms=0.0, rpm=0, overload_rate=0.0, retry_after=1.0, tool_calls=True, seed=None):
+        self.batch_delay = batch_delay
+        self.batches_enabled = batches
+        self.answer_words = answer_words
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.chunk_delay_ms = chunk_delay_ms
+        self.rpm = rpm
+        self.overload_rate = overload_rate
+        self.retry_after = retry_after
+        self.tool_calls = tool_calls
+        self.batches = {}
+        self.requests = 0
+        self.rate_limited = 0
+        self.overloaded = 0
+        self._recent = deque()
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self, prefix):
+        with self._lock:
+            return f"{prefix}_stub{next(self._ids):08d}"
+
+    def admit(self):
+        """
+        Decide se accettare una richiesta Messages: None se accettata,
+        altrimenti (status, tipo errore) da restituire al client.
+        """
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            if self.rpm:
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rpm:
+                    self.rate_limited += 1
+                    return 429, "rate_limit_error"
+                self._recent.append(now)
+            if self.overload_rate and self._random.random() < self.overload_rate:
+                self.overloaded += 1
+                return 529, "overloaded_error"
+        return None
+
+    def latency(self):
+        """Latenza simulata in secondi (media + jitter uniforme)"""
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def make_message(self, params):
+        """Messaggio simulato con usage plausibile (circa 4 caratteri per token)"""
+        messages = params.get("messages")
+        tools = params.get("tools") or []
+        if self.tool_calls and tools and not _has_tool_result(messages):
+            # Primo turno con strumenti: chiede il primo strumento senza argomenti
+            content = [{"type": "tool_use", "id": self.next_id("toolu"), "name": tools[0]["name"], "input": {}}]
+            stop_reason = "tool_use"
+            output_chars = 40
+        else:
+            question = _last_user_text(messages)
+            n_words = max(1, min(self.answer_words, params.get("max_tokens", 1024) // 2))
+            text = f"**{question[:80]}**\n\nRisposta simulata dallo stub locale: " + " ".join(["dati"] * n_words)
+            content = [{"type": "text", "text": text}]
+            stop_reason = "end_turn"
+            output_chars = len(text)
+        return {
+            "id": self.next_id("msg"),
+            "type": "message",
+            "role": "assistant",
+            "model": params.get("model", "stub"),
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": _prompt_chars(params) // 4 + 1,
+                "output_tokens": output_chars // 4 + 1,
+                "cache_creation_input_tokens": 0,
+                "cache_read_input_tokens": 0
+            }
+        }
+
+    def batch_object(self, batch, base_url):
+        ended = time.time() >= batch["created"] + self.batch_delay
+        count = len(batch["requests"])
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0
+            },
+            "created_at": _iso(batch["created"]),
+            "expires_at": _iso(batch["created"] + timedelta(days=1).total_seconds()),
+            "ended_at": _iso(batch["created"] + self.batch_delay) if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{base_url}/v1/messages/batches/{batch['id']}/results" if ended else None
+        }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "AnthropicStub/1.0"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _read_json(self):
+        length = int(self.headers.get("content-length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.send_header("request-id", self.state.next_id("req"))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, error_type, message, headers=None):
+        self._send_json({"type": "error", "error": {"type": error_type, "message": message}}, status, headers)
+
+    def _send_event(self, event, data):
+        payload = json.dumps({"type": event, **data}, ensure_ascii=False)
+        self.wfile.write(f"event: {event}\ndata: {payload}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _path(self):
+        return self.path.split("?", 1)[0].rstrip("/")
+
+    def do_POST(self):
+        path = self._path()
+        params = self._read_json()
+        if path == "/v1/messages":
+            self.handle_message(params)
+        elif path == "/v1/messages/batches" and self.state.batches_enabled:
+            batch = {"id": self.state.next_id("msgbatch"), "created": time.time(), "requests": params.get("requests", [])}
+            self.state.batches[batch["id"]] = batch
+            self._send_json(self.state.batch_object(batch, self.server.base_url))
+        else:
+            self._send_error(404, "not_found_error", f"Endpoint non simulato: {path}")
+
+    def do_GET(self):
+        parts = self._path().split("/")
+        # /v1/messages/batches/{id}[/results]
+        if len(parts) >= 5 and parts[1:4] == ["v1", "messages", "batches"]:
+            batch = self.state.batches.get(parts[4])
+            if batch is None:
+                return self._send_error(404, "not_found_error", f"Batch {parts[4]} inesistente")
+            if len(parts) == 5:
+                return self._send_json(self.state.batch_object(batch, self.server.base_url))
+            if len(parts) == 6 and parts[5] == "results":
+                return self.send_batch_results(batch)
+        self._send_error(404, "not_found_error", f"Endpoint non simulato: {self.path}")
+
+    def handle_message(self, params):
+        rejected = self.state.admit()
+        if rejected is not None:
+            status, error_type = rejected
+            headers = {"retry-after": str(self.state.retry_after)} if status == 429 else None
+            return self._send_error(status, error_type, "Errore simulato dallo stub", headers)
+        message = self.state.make_message(params)
+        time.sleep(self.state.latency())
+        if params.get("stream"):
+            self.stream_message(message)
+        else:
+            self._send_json(message)
+
+    def stream_message(self, message):
+        """Invia il messaggio come eventi SSE, il testo a frammenti come l'API reale"""
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("cache-control", "no-cache")
+        self.send_header("connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        usage = message["usage"]
+        start = {**message, "content": [], "stop_reason": None, "usage": {**usage, "output_tokens": 1}}
+        self._send_event("message_start", {"message": start})
+        for index, block in enumerate(message["content"]):
+            if block["type"] == "text":
+                self._send_event("content_block_start", {"index": index, "content_block": {"type": "text", "text": ""}})
+                words = block["text"].split(" ")
+                for i in range(0, len(words), 8):
+                    fragment = " ".join(words[i:i + 8]) + (" " if i + 8 < len(words) else "")
+                    self._send_event("content_block_delta", {
+                        "index": index, "delta": {"type": "text_delta", "text": fragment}
+                    })
+                    if self.state.chunk_delay_ms:
+                        time.sleep(self.state.chunk_delay_ms / 1000)
+            else:
+                self._send_event("content_block_start", {"index": index, "content_block": {**block, "input": {}}})
+                self._send_event("content_block_delta", {
+                    "index": index, "delta": {"type": "input_json_delta", "partial_json": json.dumps(block["input"])}
+                })
+            self._send_event("content_block_stop", {"index": index})
+        self._send_event("message_delta", {
+            "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+            "usage": {"output_tokens": usage["output_tokens"]}
+        })
+        self._send_event("message_stop", {})
+
+    def send_batch_results(self, batch):
+        lines = [
+            json.dumps({
+                "custom_id": request["custom_id"],
+                "result": {"type": "succeeded", "message": self.state.make_message(request["params"])}
+            }, ensure_ascii=False)
+            for request in batch["requests"]
+        ]
+        body = ("\n".join(lines) + "\n").encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", "application/binary")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, state, handler=StubHandler, verbose=False):
+        super().__init__(address, handler)
+        self.state = state
+        self.verbose = verbose
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start_in_thread(self):
+        """Avvia il server in un thread daemon (per test e script); ritorna il thread"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stub locale dell'API Anthropic")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="secondi prima che un batch risulti concluso")
+    parser.add_argument("--no-batches", action="store_true", help="simula un endpoint senza Message Batches (404)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latenza media di ogni risposta")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="variazione casuale (±) della latenza")
+    parser.add_argument("--chunk-delay-ms", type=float, default=0.0, help="pausa tra i frammenti in streaming")
+    parser.add_argument("--rpm", type=int, default=0, help="richieste al minuto oltre cui rispondere 429 (0 = nessun limite)")
+    parser.add_argument("--overload-rate", type=float, default=0.0, help="frazione di richieste con errore 529")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="secondi indicati nell'header retry-after")
+    parser.add_argument("--no-tools", action="store_true", help="rispondi sempre con testo, senza chiamare strumenti")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    state = StubState(
+        batch_delay=args.batch_delay,
+        batches=not args.no_batches,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        chunk_delay_ms=args.chunk_delay_ms,
+        rpm=args.rpm,
+        overload_rate=args.overload_rate,
+        retry_after=args.retry_after,
+        tool_calls=not args.no_tools
+    )
+    server = StubServer((args.host, args.port), state, verbose=args.verbose)
+    print(f"Stub API Anthropic in ascolto su {server.base_url} (Ctrl+C per uscire)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Domande in batch sulla chat
+Un elenco di domande viene risolto in parallelo (concorrenza limitata) con il client
+asincrono. Il contesto dati è lo stesso system prompt per tutte, marcato per il
+prompt caching: la prima domanda lo scrive in cache, le altre lo rileggono.
+Le domande già risolvibili localmente o presenti in cache non chiamano l'API.
+"""
+
+import asyncio
+from datetime import datetime
+
+import pandas as pd
+
+from eventi.metrics import RequestMetrics
+
+DEFAULT_BATCH_CONCURRENCY = 4
+MAX_BATCH_QUESTIONS = 50
+
+SOURCE_LABELS = {
+    "locale": "⚡ Calcolata localmente",
+    "cache": "⚡ Dalla cache",
+    "claude": "🤖 Claude",
+    "errore": "❌ Errore",
+}
+
+
+def parse_questions(text, limit=MAX_BATCH_QUESTIONS):
+    """Una domanda per riga: righe vuote e duplicati ignorati"""
+    questions = []
+    seen = set()
+    for line in (text or "").splitlines():
+        question = line.strip().lstrip("-*•").strip()
+        if question and question.lower() not in seen:
+            seen.add(question.lower())
+            questions.append(question)
+    return questions[:limit]
+
+
+class BatchResult:
+    """Esito di una domanda del batch"""
+
+    def __init__(self, index, question, answer="", source="claude", charts=None, metrics=None, error=None):
+        self.index = index
+        self.question = question
+        self.answer = answer
+        self.source = source
+        self.charts = charts or []
+        self.metrics = metrics
+        self.error = error
+
+    @property
+    def latency_ms(self):
+        return self.metrics.as_record()["latency_ms"] if self.metrics is not None else 0.0
+
+    def as_dict(self):
+        return {
+            "n": self.index + 1,
+            "domanda": self.question,
+            "risposta": self.answer,
+            "origine": self.source,
+            "latenza_ms": self.latency_ms,
+            "errore": self.error
+        }
+
+
+async def _ask(async_client, index, question, model, system, max_tokens, context_rows, scheduler):
+    metrics = RequestMetrics("batch", model=model, context_rows=context_rows)
+    request = dict(
+        model=model,
+        max_tokens=max_tokens,
+        temperature=0,
+        system=system,
+        messages=[{"role": "user", "content": question}]
+    )
+    metrics.observe_prompt(request["system"], request["messages"])
+    try:
+        if scheduler is not None:
+            response = await scheduler.run_async(async_client.messages.create, request)
+        else:
+            response = await async_client.messages.create(**request)
+    except Exception as e:
+        return BatchResult(index, question, source="errore", metrics=metrics.finish(error=e), error=str(e))
+    metrics.mark_first_token()
+    metrics.observe_response(response)
+    answer = "".join(block.text for block in response.content if block.type == "text")
+    return BatchResult(index, question, answer, metrics=metrics.finish())
+
+
+async def _run_batch(async_client, pending, model, system, max_tokens, concurrency, context_rows,
+                     on_result, scheduler):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def ask(index, question):
+        async with semaphore:
+            result = await _ask(async_client, index, question, model, system, max_tokens, context_rows, scheduler)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    if not pending:
+        return []
+    # La prima domanda da sola: scrive il contesto nella prompt cache per tutte le altre
+    first = await ask(*pending[0])
+    rest = await asyncio.gather(*(ask(index, question) for index, question in pending[1:]))
+    return [first, *rest]
+
+
+def run_batch(async_client, questions, model, system, max_tokens=4096, concurrency=DEFAULT_BATCH_CONCURRENCY,
+              context_rows=0, resolve=None, on_result=None, scheduler=None):
+    """
+    Risponde a tutte le domande; ritorna i BatchResult nell'ordine delle domande.
+    `resolve(domanda)` può fornire una risposta senza API ({"answer", "charts", "source"}),
+    `on_result(result)` è chiamato appena ogni domanda è completata.
+    """
+    results = {}
+    pending = []
+    for index, question in enumerate(questions):
+        resolved = resolve(question) if resolve is not None else None
+        if resolved is None:
+            pending.append((index, question))
+            continue
+        result = BatchResult(
+            index, question, resolved["answer"], source=resolved["source"], charts=resolved.get("charts")
+        )
+        results[index] = result
+        if on_result is not None:
+            on_result(result)
+
+    answered = asyncio.run(_run_batch(
+        async_client, pending, model, system, max_tokens, concurrency, context_rows, on_result, scheduler
+    ))
+    results.update((result.index, result) for result in answered)
+    return [results[index] for index in sorted(results)]
+
+
+def results_dataframe(results):
+    return pd.DataFrame([result.as_dict() for result in results])
+
+
+def report_markdown(results, title="Report domande in batch", details=None):
+    """Report Markdown con tutte le domande e risposte del batch"""
+    lines = [f"# {title}", "", f"_Generato il {datetime.now():%d/%m/%Y %H:%M}_", ""]
+    lines.extend(f"- {detail}" for detail in details or [])
+    lines.append("")
+    for result in results:
+        lines.append(f"## {result.index + 1}. {result.question}")
+        lines.append("")
+        lines.append(f"_{SOURCE_LABELS.get(result.source, result.source)}_")
+        lines.append("")
+        lines.append(result.answer if result.source != "errore" else f"Errore: {result.error}")
+        lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,280 @@
+"""
+Benchmark delle operazioni su dati delle pagine (eventi.core, usato da pagine e report)
+Misura, sui dataset sintetici di eventi.synthetic, caricamento per formato, da
+snapshot Arrow e per finestra di date (partizioni annuali), filtri della Timeline,
+combinazioni di Cerca & Filtra (anche semantica), aggregazioni di Insights e sommario
+del dataframe per Claude. I risultati sono accodati in un file JSONL per confrontare
+le esecuzioni e segnalare le regressioni.
+
+Esempio (dalla cartella del progetto):
+    python -m eventi.synthetic --sizes 1k 10k 100k
+    python -m eventi.benchmark --sizes 1k 10k 100k --compare
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from eventi.core import (
+    PERIODI,
+    category_growth,
+    category_synergies,
+    contact_category_matrix,
+    filter_events,
+    load_events,
+    low_activity_contacts,
+    monthly_trend,
+    top_tags,
+    underrepresented_categories,
+    weekday_counts,
+)
+from eventi.encoding import dataframe_summary
+from eventi.filters import FilterSpec
+from eventi.partitions import load_events_window
+from eventi.response_cache import CACHE_DIR
+from eventi.schema import CATEGORIE
+from eventi.similarity import ContactSimilarity
+from eventi.snapshot import SnapshotStore
+from eventi.synthetic import (
+    FORMATS,
+    SYNTHETIC_DIR,
+    dataset_path,
+    generate_events,
+    parse_size,
+    size_label,
+    write_dataset,
+)
+from eventi.vector_index import EventIndex
+
+BENCHMARK_DIR = os.path.join(CACHE_DIR, "benchmark")
+RESULTS_FILE = os.path.join(BENCHMARK_DIR, "risultati.jsonl")
+DEFAULT_REPEATS = 5
+# Tempo massimo per caso: sui dataset grandi le ripetizioni si riducono
+MAX_CASE_SECONDS = 10.0
+REGRESSION_THRESHOLD = 1.2
+# Sotto questa differenza assoluta il rapporto è rumore di misura
+REGRESSION_MIN_DELTA_MS = 1.0
+
+
+# ==================== CASI ====================
+
+def search_cases(df):
+    """Combinazioni di filtri di Cerca & Filtra, con valori presi dal dataset"""
+    top_contacts = list(df['A CHI CHIEDERE'].value_counts().index[:3])
+    today = pd.Timestamp.now().normalize()
+    year_ago = today - pd.Timedelta(days=365)
+    return {
+        "testo": dict(testo="summit"),
+        "testo_note": dict(testo="budget"),
+        "categoria": dict(categorie=CATEGORIE[:2]),
+        "contatti": dict(contatti=top_contacts),
+        "tag": dict(tag=["innovazione", "partnership"]),
+        "intervallo_date": dict(data_da=year_ago, data_a=today),
+        "combinato": dict(testo="2025", categorie=CATEGORIE[:3], contatti=top_contacts,
+                          tag=["cliente-vip", "tech"], data_da=year_ago, data_a=today),
+    }
+
+
+INSIGHTS = {
+    "trend_mese": monthly_trend,
+    "giorni_settimana": weekday_counts,
+    "affinita": contact_category_matrix,
+    "sinergie": category_synergies,
+    "crescita": category_growth,
+    "opportunita": lambda df: (low_activity_contacts(df), underrepresented_categories(df)),
+    "tag": top_tags,
+    "contatti_simili": ContactSimilarity.build,
+}
+
+
+# ==================== MISURA ====================
+
+def time_case(fn, repeats=DEFAULT_REPEATS, max_seconds=MAX_CASE_SECONDS):
+    """Un giro di riscaldamento, poi fino a `repeats` misure (entro `max_seconds`)"""
+    start = time.perf_counter()
+    fn()
+    warmup = time.perf_counter() - start
+    times = [warmup] if warmup * repeats > max_seconds else []
+    while len(times) < repeats and sum(times) + warmup <= max_seconds:
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times_ms = np.array(times) * 1000
+    return {
+        "ripetizioni": len(times),
+        "min_ms": round(float(times_ms.min()), 3),
+        "mediana_ms": round(float(np.median(times_ms)), 3),
+        "p95_ms": round(float(np.percentile(times_ms, 95)), 3),
+    }
+
+
+def benchmark_cases(df, paths):
+    """Casi del benchmark per un dataset: (gruppo, nome, funzione)"""
+    cases = [("load", fmt, lambda p=path: load_events(p)) for fmt, path in paths.items()]
+    # Caricamento delle sole partizioni annuali che intersecano la finestra della vista
+    source = next(iter(paths.values()))
+    # Apertura dello snapshot Arrow mappato (pubblicato al primo giro) da un processo "nuovo"
+    cases.append(("load", "snapshot_arrow", lambda: SnapshotStore(source).load()))
+    windows = {periodo: FilterSpec(periodo=periodo).date_window() for periodo in PERIODI if periodo != "Tutti"}
+    cases += [("finestre", periodo, lambda w=window: load_events_window(source, *w)) for periodo, window in windows.items()]
+    cases += [("timeline", periodo, lambda p=periodo: filter_events(df, {"periodo": p})) for periodo in PERIODI]
+    cases.append(("timeline", "categoria+Futuri",
+                  lambda: filter_events(df, {"periodo": "Futuri", "categorie": CATEGORIE[:2]})))
+    cases += [("cerca", name, lambda f=filtri: filter_events(df, f)) for name, filtri in search_cases(df).items()]
+    # Ricerca semantica sull'indice dei testi (costruito una volta, come nelle pagine)
+    index = EventIndex()
+    index.sync(df, "benchmark")
+    cases.append(("cerca", "semantica", lambda: index.search(df, "summit innovazione tecnologia", version="benchmark")))
+    cases += [("insights", name, lambda f=fn: f(df)) for name, fn in INSIGHTS.items()]
+    cases.append(("summary", "dataframe_summary", lambda: dataframe_summary(df)))
+    return cases
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_metadata(label=None):
+    return {
+        "etichetta": label,
+        "eseguito": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "macchina": platform.node(),
+    }
+
+
+def ensure_datasets(n, formats, directory=SYNTHETIC_DIR, seed=0):
+    """Percorsi dei file sintetici per dimensione e formato, generandoli se mancano"""
+    paths = {fmt: dataset_path(n, fmt, directory) for fmt in formats}
+    missing = [fmt for fmt, path in paths.items() if not os.path.exists(path)]
+    if missing:
+        df = generate_events(n, seed=seed)
+        for fmt in missing:
+            try:
+                write_dataset(df, paths[fmt])
+            except ValueError:
+                paths.pop(fmt)  # es. xlsx oltre il limite di righe
+    return paths
+
+
+def run_benchmark(sizes, formats=FORMATS, repeats=DEFAULT_REPEATS, groups=None, label=None,
+                  directory=SYNTHETIC_DIR, on_result=None):
+    """Esegue il benchmark e ritorna l'esecuzione (metadati + risultati)"""
+    run = run_metadata(label)
+    results = []
+    for n in sizes:
+        paths = ensure_datasets(n, formats, directory)
+        # Il dataframe di lavoro è quello di un formato colonnare, identico a quello da Excel
+        df = load_events(paths.get("parquet") or next(iter(paths.values())))
+        for group, name, fn in benchmark_cases(df, paths):
+            if groups and group not in groups:
+                continue
+            result = {"dimensione": size_label(n), "righe": len(df), "gruppo": group, "caso": name,
+                      **time_case(fn, repeats)}
+            results.append(result)
+            if on_result:
+                on_result(result)
+    run["risultati"] = results
+    return run
+
+
+# ==================== ARCHIVIO E CONFRONTO ====================
+
+def save_run(run, path=RESULTS_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run, ensure_ascii=False) + "\n")
+
+
+def load_runs(path=RESULTS_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare_runs(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Confronto per caso sulle mediane; ritorna le righe con rapporto e regressione"""
+    base = {(r["dimensione"], r["gruppo"], r["caso"]): r for r in baseline["risultati"]}
+    rows = []
+    for r in current["risultati"]:
+        key = (r["dimensione"], r["gruppo"], r["caso"])
+        if key not in base or not base[key]["mediana_ms"]:
+            continue
+        ratio = r["mediana_ms"] / base[key]["mediana_ms"]
+        rows.append({
+            "dimensione": r["dimensione"], "gruppo": r["gruppo"], "caso": r["caso"],
+            "prima_ms": base[key]["mediana_ms"], "dopo_ms": r["mediana_ms"],
+            "rapporto": round(ratio, 2),
+            "regressione": ratio > threshold and r["mediana_ms"] - base[key]["mediana_ms"] > REGRESSION_MIN_DELTA_MS
+        })
+    return rows
+
+
+def _find_baseline(runs, label):
+    if label:
+        matching = [run for run in runs if run.get("etichetta") == label or run.get("commit") == label]
+        return matching[-1] if matching else None
+    return runs[-1] if runs else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark delle operazioni su dati delle pagine eventi")
+    parser.add_argument("--sizes", nargs="+", default=["1k", "10k", "100k"], help="es. 1k 10k 100k 1M")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--groups", nargs="+", choices=["load", "finestre", "timeline", "cerca", "insights", "summary"])
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--data-dir", default=SYNTHETIC_DIR)
+    parser.add_argument("--label", default=None, help="etichetta dell'esecuzione (es. nome del branch)")
+    parser.add_argument("--results", default=RESULTS_FILE)
+    parser.add_argument("--compare", nargs="?", const="", default=None,
+                        help="confronta con l'esecuzione precedente (o con quella di questa etichetta/commit)")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+    # Le date testuali del CSV producono un avviso di dayfirst a ogni caricamento
+    warnings.filterwarnings("ignore", message="Parsing dates", category=UserWarning)
+
+    baseline = _find_baseline(load_runs(args.results), args.compare) if args.compare is not None else None
+
+    def show(r):
+        print(f"{r['dimensione']:>5} {r['gruppo']:<9} {r['caso']:<18} "
+              f"mediana {r['mediana_ms']:>10.2f} ms  p95 {r['p95_ms']:>10.2f} ms  ({r['ripetizioni']}x)")
+
+    run = run_benchmark([parse_size(s) for s in args.sizes], args.formats, args.repeats,
+                        args.groups, args.label, args.data_dir, on_result=show)
+    if not args.no_save:
+        save_run(run, args.results)
+
+    if args.compare is not None:
+        if baseline is None:
+            print("\nNessuna esecuzione precedente con cui confrontare")
+            return 0
+        rows = compare_runs(baseline, run, args.threshold)
+        regressions = [row for row in rows if row["regressione"]]
+        print(f"\nConfronto con {baseline.get('etichetta') or baseline['eseguito']} "
+              f"(commit {baseline.get('commit')}): {len(regressions)} regressioni oltre {args.threshold}x")
+        for row in regressions:
+            print(f"  ⚠️ {row['dimensione']} {row['gruppo']}/{row['caso']}: "
+                  f"{row['prima_ms']:.2f} → {row['dopo_ms']:.2f} ms ({row['rapporto']}x)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,255 @@
+"""
+Storico delle modifiche agli eventi, riga per riga (SQLite accanto al workbook)
+Il workbook contiene sempre lo stato attuale; ogni inserimento, modifica o
+eliminazione aggiunge qui una versione della riga (identificata da ID EVENTO)
+con autore e istante di validità. Le domande "com'era il giorno X" si risolvono
+sul log prendendo, per ogni evento, l'ultima versione valida a quella data,
+senza conservare copie complete del file.
+
+Le modifiche fatte a mano nel workbook sono riconciliate alla scrittura successiva
+(`sync`): righe nuove, cambiate o sparite diventano versioni dell'utente "esterno".
+La compattazione periodica fonde le versioni più vecchie di RETENTION_DAYS nella
+sola versione valida al limite: prima di quella data il log risponde con lo
+stato al limite, dopo è esatto.
+
+Esempio (dalla cartella del progetto):
+    python -m eventi.changelog --as-of 2025-06-30 --out eventi_giugno.csv
+    python -m eventi.changelog --storico 3f2a9c1b7e4d
+    python -m eventi.changelog --compatta
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from eventi.schema import DATE_COLUMNS, ID_COLUMN
+
+CHANGELOG_SUFFIX = ".changelog.sqlite3"
+RETENTION_DAYS = 365
+COMPACTION_INTERVAL_DAYS = 7
+EXTERNAL_USER = "esterno"
+
+OP_BASE = "base"
+OP_INSERT = "inserimento"
+OP_UPDATE = "modifica"
+OP_DELETE = "eliminazione"
+
+
+def changelog_path(path):
+    return f"{path}{CHANGELOG_SUFFIX}"
+
+
+def _json_value(value):
+    # Stessa forma prima e dopo il giro nel workbook: celle vuote come None,
+    # orari al secondo (Excel non conserva i microsecondi)
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)) or value == "":
+        return None
+    if hasattr(value, "isoformat"):  # Timestamp, datetime e date del form
+        return pd.Timestamp(value).round("ms").floor("s").isoformat()
+    if hasattr(value, "item"):  # scalari numpy
+        return value.item()
+    return value
+
+
+def row_record(row):
+    """Riga (Series o dict) come dizionario serializzabile JSON, senza ID"""
+    return {str(col): _json_value(value) for col, value in dict(row).items() if col != ID_COLUMN}
+
+
+def _iso(when):
+    return pd.Timestamp(when).isoformat()
+
+
+class ChangeLog:
+    """Versioni delle righe del file eventi `path`"""
+
+    def __init__(self, path, log_path=None):
+        self.path = path
+        self.log_path = log_path or changelog_path(path)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS versioni (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    evento TEXT NOT NULL,
+                    operazione TEXT NOT NULL,
+                    valido_da TEXT NOT NULL,
+                    utente TEXT,
+                    dati TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_evento ON versioni(evento, valido_da, id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (chiave TEXT PRIMARY KEY, valore TEXT)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.log_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ---------- scrittura ----------
+
+    def _append(self, conn, event_id, operation, when, user, record):
+        conn.execute(
+            "INSERT INTO versioni (evento, operazione, valido_da, utente, dati) VALUES (?, ?, ?, ?, ?)",
+            (event_id, operation, _iso(when), user,
+             json.dumps(record, ensure_ascii=False) if record is not None else None)
+        )
+
+    def record(self, event_id, operation, record, user, when=None):
+        """Aggiunge una versione (record None per le eliminazioni)"""
+        with self._lock, self._connect() as conn:
+            self._append(conn, event_id, operation, when or datetime.now(), user, record)
+        self.maybe_compact()
+
+    def _latest(self, conn):
+        """Ultima versione di ogni evento: {id: (operazione, dati JSON)}"""
+        rows = conn.execute("""
+            SELECT evento, operazione, dati FROM versioni v
+            WHERE id = (SELECT MAX(id) FROM versioni WHERE evento = v.evento)
+        """).fetchall()
+        return {event_id: (operation, data) for event_id, operation, data in rows}
+
+    def sync(self, df, when=None):
+        """Allinea il log allo stato di `df` (contenuto attuale del workbook, con ID)
+        Al primo uso registra tutte le righe come versione base, datata all'inserimento."""
+        when = when or datetime.now()
+        with self._lock, self._connect() as conn:
+            latest = self._latest(conn)
+            first_sync = not latest
+            seen = set()
+            for row in df.to_dict(orient="records"):
+                event_id = row[ID_COLUMN]
+                seen.add(event_id)
+                record = row_record(row)
+                data = json.dumps(record, ensure_ascii=False)
+                previous = latest.get(event_id)
+                if previous is None:
+                    inserted = row.get('TIMESTAMP INSERIMENTO')
+                    valid_from = inserted if first_sync and pd.notna(inserted) else when
+                    operation = OP_BASE if first_sync else OP_INSERT
+                    user = row.get('USER INSERIMENTO') if first_sync else EXTERNAL_USER
+                    self._append(conn, event_id, operation, valid_from, user, record)
+                elif previous[0] == OP_DELETE or previous[1] != data:
+                    self._append(conn, event_id, OP_UPDATE, when, EXTERNAL_USER, record)
+            for event_id, (operation, _) in latest.items():
+                if event_id not in seen and operation != OP_DELETE:
+                    self._append(conn, event_id, OP_DELETE, when, EXTERNAL_USER, None)
+
+    # ---------- lettura ----------
+
+    def as_of(self, when):
+        """Eventi com'erano all'istante `when` (ultima versione valida, eliminati esclusi)"""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute("""
+                SELECT evento, operazione, dati FROM versioni v
+                WHERE id = (SELECT MAX(id) FROM versioni
+                            WHERE evento = v.evento AND valido_da <= ?)
+            """, (_iso(when),)).fetchall()
+        records = [{ID_COLUMN: event_id, **json.loads(data)} for event_id, operation, data in rows
+                   if operation != OP_DELETE and data is not None]
+        df = pd.DataFrame.from_records(records)
+        for col in DATE_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+        return df
+
+    def history(self, event_id):
+        """Versioni di un evento, dalla più recente"""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute("""
+                SELECT id, operazione, valido_da, utente, dati FROM versioni
+                WHERE evento = ? ORDER BY id DESC
+            """, (event_id,)).fetchall()
+        return [
+            {"versione": version_id, "operazione": operation, "valido_da": valid_from, "utente": user,
+             "dati": json.loads(data) if data else None}
+            for version_id, operation, valid_from, user, data in rows
+        ]
+
+    def stats(self):
+        with self._lock, self._connect() as conn:
+            versions, events = conn.execute("SELECT COUNT(*), COUNT(DISTINCT evento) FROM versioni").fetchone()
+            compacted = conn.execute("SELECT valore FROM meta WHERE chiave = 'ultima_compattazione'").fetchone()
+        return {"versioni": versions, "eventi": events, "ultima_compattazione": compacted[0] if compacted else None}
+
+    # ---------- compattazione ----------
+
+    def compact(self, before=None):
+        """Fonde le versioni valide prima di `before` nell'ultima di ciascun evento
+        (eliminata del tutto se l'evento a quella data era già eliminato); ritorna le righe rimosse"""
+        before = before or datetime.now() - timedelta(days=RETENTION_DAYS)
+        cutoff = _iso(before)
+        with self._lock, self._connect() as conn:
+            # La versione che resta vale dalla prima versione dell'evento: prima del limite
+            # l'evento compare (con lo stato al limite) da quando esisteva
+            conn.execute("""
+                UPDATE versioni SET valido_da = (SELECT MIN(v.valido_da) FROM versioni v WHERE v.evento = versioni.evento)
+                WHERE id = (SELECT MAX(id) FROM versioni v WHERE v.evento = versioni.evento AND v.valido_da <= :cutoff)
+            """, {"cutoff": cutoff})
+            removed = conn.execute("""
+                DELETE FROM versioni WHERE valido_da <= :cutoff AND id < (
+                    SELECT MAX(id) FROM versioni v WHERE v.evento = versioni.evento AND v.valido_da <= :cutoff
+                )
+            """, {"cutoff": cutoff}).rowcount
+            removed += conn.execute("""
+                DELETE FROM versioni WHERE valido_da <= :cutoff AND operazione = :delete
+            """, {"cutoff": cutoff, "delete": OP_DELETE}).rowcount
+            conn.execute("UPDATE versioni SET operazione = ? WHERE valido_da <= ? AND operazione != ?",
+                         (OP_BASE, cutoff, OP_BASE))
+            conn.execute("INSERT OR REPLACE INTO meta (chiave, valore) VALUES ('ultima_compattazione', ?)",
+                         (datetime.now().isoformat(timespec="seconds"),))
+        return removed
+
+    def maybe_compact(self):
+        """Compattazione al più ogni COMPACTION_INTERVAL_DAYS, chiamata dopo le scritture"""
+        last = self.stats()["ultima_compattazione"]
+        if last is None or datetime.fromisoformat(last) < datetime.now() - timedelta(days=COMPACTION_INTERVAL_DAYS):
+            return self.compact()
+        return 0
+
+
+def main(argv=None):
+    from eventi.core import EXCEL_FILE
+
+    parser = argparse.ArgumentParser(description="Storico delle modifiche agli eventi")
+    parser.add_argument("--file", default=EXCEL_FILE)
+    parser.add_argument("--as-of", default=None, help="YYYY-MM-DD[THH:MM]: eventi com'erano a quella data")
+    parser.add_argument("--out", default=None, help="CSV di destinazione per --as-of (default: stdout)")
+    parser.add_argument("--storico", default=None, metavar="ID", help="versioni di un evento")
+    parser.add_argument("--compatta", action="store_true", help=f"fonde le versioni più vecchie di {RETENTION_DAYS} giorni")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(changelog_path(args.file)):
+        parser.error(f"Nessuno storico per {args.file}")
+    log = ChangeLog(args.file)
+    if args.compatta:
+        print(f"Versioni rimosse: {log.compact()}")
+    if args.storico:
+        for version in log.history(args.storico):
+            print(f"{version['valido_da']}  {version['operazione']:<12} {version['utente'] or ''}")
+    if args.as_of:
+        when = pd.Timestamp(args.as_of)
+        if when == when.normalize() and "T" not in args.as_of:
+            when += pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)  # tutto il giorno indicato
+        df = log.as_of(when)
+        if args.out:
+            df.to_csv(args.out, index=False)
+            print(f"{len(df)} eventi al {when:%d/%m/%Y %H:%M} -> {args.out}")
+        else:
+            print(df.to_csv(index=False))
+    if not (args.compatta or args.storico or args.as_of):
+        print(log.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Grafici predefiniti sugli eventi
+Ogni grafico è identificato da un intent (SICURO - no code execution)
+"""
+
+import pandas as pd
+
+# Intent disponibili con etichetta per l'interfaccia
+CHART_INTENTS = {
+    "categorie_distribuzione": "📊 Distribuzione Categorie",
+    "contatti_top10": "👥 Top 10 Contatti",
+    "timeline_eventi": "📅 Timeline Eventi",
+    "heatmap_contatti_categorie": "🔥 Heatmap Contatti×Categorie"
+}
+
+
+def create_chart_from_intent(df, intent_type, x_col=None, y_col=None, color_col=None):
+    """
+    Crea grafici basati su intent predefiniti (SICURO - no code execution)
+    """
+    import plotly.express as px  # import pesante: caricato al primo grafico richiesto
+
+    try:
+        if intent_type == "categorie_distribuzione":
+            if 'CATEGORIA' in df.columns:
+                cat_counts = df['CATEGORIA'].value_counts()
+                fig = px.pie(
+                    values=cat_counts.values,
+                    names=cat_counts.index,
+                    title="Distribuzione Eventi per Categoria",
+                    hole=0.4
+                )
+                return fig, "✅ Grafico creato"
+            return None, "❌ Colonna CATEGORIA non trovata"
+        
+        elif intent_type == "contatti_top10":
+            if 'A CHI CHIEDERE' in df.columns:
+                top_contacts = df['A CHI CHIEDERE'].value_counts().head(10)
+                fig = px.bar(
+                    x=top_contacts.values,
+                    y=top_contacts.index,
+                    orientation='h',
+                    title="Top 10 Contatti per Numero Eventi",
+                    labels={'x': 'Numero Eventi', 'y': 'Contatto'},
+                    color=top_contacts.values,
+                    color_continuous_scale='Blues'
+                )
+                fig.update_layout(showlegend=False)
+                return fig, "✅ Grafico creato"
+            return None, "❌ Colonna A CHI CHIEDERE non trovata"
+        
+        elif intent_type == "timeline_eventi":
+            if 'DATA EVENTO' in df.columns:
+                df_time = df[df['DATA EVENTO'].notna()].copy()
+                df_time['Mese'] = df_time['DATA EVENTO'].dt.to_period('M').astype(str)
+                eventi_mese = df_time.groupby('Mese').size().reset_index(name='Numero Eventi')
+                
+                fig = px.line(
+                    eventi_mese,
+                    x='Mese',
+                    y='Numero Eventi',
+                    title='Trend Eventi nel Tempo',
+                    markers=True
+                )
+                fig.update_traces(line_color='#3498db', line_width=3, marker_size=8)
+                return fig, "✅ Grafico creato"
+            return None, "❌ Colonna DATA EVENTO non trovata"
+        
+        elif intent_type == "heatmap_contatti_categorie":
+            if 'A CHI CHIEDERE' in df.columns and 'CATEGORIA' in df.columns:
+                pivot = pd.crosstab(df['A CHI CHIEDERE'], df['CATEGORIA'])
+                top_contacts = df['A CHI CHIEDERE'].value_counts().head(10).index
+                pivot_top = pivot.loc[top_contacts]
+                
+                fig = px.imshow(
+                    pivot_top,
+                    labels=dict(x="Categoria", y="Contatto", color="Eventi"),
+                    x=pivot_top.columns,
+                    y=pivot_top.index,
+                    color_continuous_scale='Blues',
+                    text_auto=True,
+                    aspect='auto',
+                    title="Matrice Contatti × Categorie (Top 10 Contatti)"
+                )
+                return fig, "✅ Grafico creato"
+            return None, "❌ Colonne necessarie non trovate"
+        
+        elif intent_type == "custom_bar" and x_col and y_col:
+            fig = px.bar(
+                df,
+                x=x_col,
+                y=y_col,
+                color=color_col,
+                title=f"{y_col} per {x_col}"
+            )
+            return fig, "✅ Grafico personalizzato creato"
+        
+        elif intent_type == "custom_scatter" and x_col and y_col:
+            fig = px.scatter(
+                df,
+                x=x_col,
+                y=y_col,
+                color=color_col,
+                title=f"{y_col} vs {x_col}"
+            )
+            return fig, "✅ Grafico personalizzato creato"
+        
+        else:
+            return None, "❌ Tipo di grafico non riconosciuto"
+            
+    except Exception as e:
+        return None, f"❌ Errore creazione grafico: {str(e)}"
@@ -0,0 +1,131 @@
+"""
+Cronologia della chat leggera e limitata
+- i grafici sono salvati come spec compatte (intent + filtri + versione dati) e
+  ricostruiti al bisogno, mai come figure Plotly nella sessione
+- in sessione restano solo gli ultimi messaggi; i più vecchi vengono spostati in
+  un archivio compresso su disco, uno per sessione, cancellato dopo `ttl_seconds`
+  senza nuovi messaggi
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+
+from eventi.response_cache import CACHE_DIR, compress_blob, decompress_blob
+
+ARCHIVE_DIR = os.path.join(CACHE_DIR, "archivio_chat")
+MAX_SESSION_MESSAGES = 40
+ARCHIVE_TTL_SECONDS = 7 * 24 * 3600
+
+# Ogni blocco archiviato: lunghezza (4 byte, big-endian) + JSON compresso
+_BLOCK_HEADER = struct.Struct(">I")
+
+
+def chart_spec(intent, filtri=None, version=None):
+    """Spec di un grafico ricostruibile con query_tools.build_chart"""
+    return {"intent": intent, "filtri": filtri or {}, "versione": version}
+
+
+def chart_spec_key(spec):
+    """Chiave stabile della spec (per la cache dei grafici)"""
+    return json.dumps(
+        {"intent": spec["intent"], "filtri": spec.get("filtri") or {}},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+
+
+def with_version(specs, version):
+    """Aggiunge la versione dei dati alle spec che non ce l'hanno"""
+    return [{**spec, "versione": spec.get("versione") or version} for spec in specs]
+
+
+class ChatArchive:
+    """Archivio su disco dei messaggi usciti dalla sessione (blocchi JSON compressi)"""
+
+    def __init__(self, session_id, directory=ARCHIVE_DIR, ttl_seconds=ARCHIVE_TTL_SECONDS):
+        self.path = os.path.join(directory, f"{session_id}.bin")
+        self._lock = threading.Lock()
+        self._count = None
+        os.makedirs(directory, exist_ok=True)
+        if ttl_seconds:
+            self.evict_expired(directory, ttl_seconds)
+
+    @staticmethod
+    def evict_expired(directory=ARCHIVE_DIR, ttl_seconds=ARCHIVE_TTL_SECONDS):
+        """Cancella gli archivi non modificati da più di `ttl_seconds` (sessioni chiuse)
+        Ritorna quanti file sono stati rimossi."""
+        cutoff = time.time() - ttl_seconds
+        removed = 0
+        for entry in os.scandir(directory):
+            try:
+                if entry.name.endswith(".bin") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass  # già rimosso da un'altra sessione
+        return removed
+
+    def append(self, messages):
+        if not messages:
+            return
+        blob = compress_blob(json.dumps(messages, ensure_ascii=False, default=str).encode("utf-8"))
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(_BLOCK_HEADER.pack(len(blob)))
+                f.write(blob)
+            if self._count is not None:
+                self._count += len(messages)
+
+    def load(self):
+        """Tutti i messaggi archiviati, dal più vecchio"""
+        messages = []
+        with self._lock:
+            if not os.path.exists(self.path):
+                return messages
+            with open(self.path, "rb") as f:
+                data = f.read()
+        offset = 0
+        while offset + _BLOCK_HEADER.size <= len(data):
+            (size,) = _BLOCK_HEADER.unpack_from(data, offset)
+            offset += _BLOCK_HEADER.size
+            messages.extend(json.loads(decompress_blob(data[offset:offset + size]).decode("utf-8")))
+            offset += size
+        return messages
+
+    def count(self):
+        if not os.path.exists(self.path):
+            self._count = 0  # anche se scaduto e rimosso da un'altra sessione
+        if self._count is None:
+            self._count = len(self.load())
+        return self._count
+
+    def size_bytes(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def clear(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._count = 0
+
+
+def cap_history(messages, archive, max_messages=MAX_SESSION_MESSAGES):
+    """
+    Sposta nell'archivio i messaggi più vecchi finché in sessione ne restano al massimo
+    `max_messages`. Il taglio avviene prima di una domanda, così le coppie restano intere.
+    Modifica `messages` sul posto e ritorna quanti messaggi sono stati archiviati.
+    """
+    excess = len(messages) - max_messages
+    if excess <= 0:
+        return 0
+    cut = excess
+    while cut < len(messages) and messages[cut]["role"] != "user":
+        cut += 1
+    if cut == len(messages):
+        cut = excess
+    archive.append(messages[:cut])
+    del messages[:cut]
+    return cut
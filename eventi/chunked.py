@@ -0,0 +1,159 @@
+"""
+Analisi a blocchi (map-reduce) per dataset più grandi della finestra di contesto
+Le righe vengono divise in partizioni limitate in token; ogni partizione è analizzata
+in parallelo (con concorrenza limitata) tramite il client asincrono e i risultati
+parziali vengono uniti in una chiamata finale di riduzione.
+"""
+
+import asyncio
+
+import pandas as pd
+
+from eventi.claude_client import stream_message
+from eventi.encoding import encode_events_compact
+from eventi.history import estimate_tokens
+
+# Oltre questa stima il dataset non viene più inviato in un unico prompt
+MAX_CONTEXT_TOKENS = 120_000
+CHUNK_TOKENS = 60_000
+DEFAULT_CONCURRENCY = 4
+MAP_MAX_TOKENS = 2048
+MIN_CHUNK_TOKENS = 1_000
+
+MAP_SYSTEM_PROMPT = """Sei un analista di dati eventi. Ricevi UNA PARTE di un dataset più grande
+e una domanda dell'utente. Non rispondere direttamente all'utente: estrai dalla tua parte
+tutto ciò che serve per rispondere, in modo che i risultati di tutte le parti possano essere sommati.
+
+**Regole:**
+- Riporta conteggi ESATTI per la tua parte (per categoria, contatto, mese... se pertinenti)
+- Elenca gli eventi rilevanti con data e nome (massimo 30, indicando quanti altri ce ne sono)
+- Usa sempre i nomi completi, non i codici della legenda
+- Niente introduzioni né conclusioni: solo dati strutturati e sintetici
+"""
+
+REDUCE_INSTRUCTIONS = """Di seguito trovi i risultati parziali dell'analisi di ciascuna parte del dataset
+(le parti sono disgiunte e insieme coprono tutti gli eventi) e le statistiche globali esatte.
+Unisci i risultati parziali sommando i conteggi e rispondi alla domanda dell'utente."""
+
+
+def row_token_estimates(df):
+    """Stima dei token per riga (lunghezza della riga serializzata)"""
+    lengths = df.astype(str).apply(lambda col: col.str.len()).sum(axis=1) + len(df.columns)
+    return lengths // 4 + 1
+
+
+def needs_chunking(context_text, limit=MAX_CONTEXT_TOKENS):
+    return estimate_tokens(context_text) > limit
+
+
+def split_into_chunks(df, max_tokens=CHUNK_TOKENS, total_tokens=None):
+    """
+    Divide il dataframe in partizioni contigue di al massimo `max_tokens` stimati.
+    Se noto, `total_tokens` (stima del testo codificato davvero inviato) calibra
+    le stime per riga, che sulla riga grezza sono pessimistiche.
+    """
+    if len(df) == 0:
+        return []
+    # Ordinate per data: ogni blocco copre un intervallo temporale compatto
+    if 'DATA EVENTO' in df.columns:
+        df = df.sort_values('DATA EVENTO', kind='stable')
+    estimates = row_token_estimates(df)
+    if total_tokens:
+        estimates = estimates * (total_tokens / estimates.sum())
+    cumulative = estimates.cumsum().to_numpy()
+    chunk_ids = (cumulative // max_tokens).astype(int)
+    return [part for _, part in df.groupby(chunk_ids, sort=True)]
+
+
+def global_stats(df):
+    """Statistiche globali esatte calcolate localmente, d'aiuto per la riduzione"""
+    lines = [f"Eventi totali: {len(df):,}"]
+    if 'CATEGORIA' in df.columns:
+        lines.append("Eventi per categoria: " + "; ".join(
+            f"{cat}: {count}" for cat, count in df['CATEGORIA'].value_counts().items()
+        ))
+    if 'A CHI CHIEDERE' in df.columns:
+        lines.append(f"Contatti distinti: {df['A CHI CHIEDERE'].nunique():,}")
+    if 'DATA EVENTO' in df.columns and df['DATA EVENTO'].notna().any():
+        now = pd.Timestamp.now()
+        lines.append(
+            f"Date: dal {df['DATA EVENTO'].min():%Y-%m-%d} al {df['DATA EVENTO'].max():%Y-%m-%d}; "
+            f"passati {(df['DATA EVENTO'] < now).sum():,}, futuri {(df['DATA EVENTO'] >= now).sum():,}; "
+            f"oggi {now:%Y-%m-%d}"
+        )
+    return "\n".join(lines)
+
+
+async def _map_chunks(async_client, model, question, chunks, concurrency, on_progress, metrics, scheduler):
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+    total = len(chunks)
+
+    async def analyze(i, chunk):
+        nonlocal done
+        content = (
+            f"**Parte {i + 1} di {total}** ({len(chunk):,} eventi)\n\n"
+            f"```\n{encode_events_compact(chunk)}```\n\n"
+            f"**Domanda dell'utente:** {question}"
+        )
+        request = dict(
+            model=model,
+            max_tokens=MAP_MAX_TOKENS,
+            temperature=0,
+            system=MAP_SYSTEM_PROMPT,
+            messages=[{"role": "user", "content": content}]
+        )
+        async with semaphore:
+            if metrics is not None:
+                metrics.observe_prompt(request["system"], request["messages"])
+            if scheduler is not None:
+                response = await scheduler.run_async(async_client.messages.create, request)
+            else:
+                response = await async_client.messages.create(**request)
+        if metrics is not None:
+            metrics.observe_response(response)
+        done += 1
+        if on_progress is not None:
+            on_progress(done, total)
+        return "".join(block.text for block in response.content if block.type == "text")
+
+    return await asyncio.gather(*(analyze(i, chunk) for i, chunk in enumerate(chunks)))
+
+
+def run_map_reduce(client, async_client, df, model, system, messages, max_tokens=4096,
+                   chunk_tokens=CHUNK_TOKENS, concurrency=DEFAULT_CONCURRENCY, context_tokens=None,
+                   on_progress=None, on_text=None, metrics=None, scheduler=None, on_retry=None):
+    """
+    Analisi map-reduce: `messages` è la conversazione già compattata che termina con la domanda.
+    Con lo scheduler i blocchi stanno nel limite di token per richiesta (rate limit).
+    Ritorna (testo_risposta, numero_blocchi).
+    """
+    question = messages[-1]["content"]
+    if scheduler is not None:
+        overhead = estimate_tokens(MAP_SYSTEM_PROMPT + question)
+        chunk_tokens = max(MIN_CHUNK_TOKENS, min(chunk_tokens, scheduler.request_token_limit() - overhead))
+    chunks = split_into_chunks(df, chunk_tokens, total_tokens=context_tokens)
+    partials = asyncio.run(
+        _map_chunks(async_client, model, question, chunks, concurrency, on_progress, metrics, scheduler)
+    )
+
+    sections = [f"### Parte {i + 1} di {len(chunks)}\n{text}" for i, text in enumerate(partials)]
+    reduce_content = (
+        f"{REDUCE_INSTRUCTIONS}\n\n**Statistiche globali esatte:**\n{global_stats(df)}\n\n"
+        + "\n\n".join(sections)
+        + f"\n\n---\n\n**Domanda dell'utente:** {question}"
+    )
+    response = stream_message(
+        client,
+        on_text=on_text,
+        metrics=metrics,
+        scheduler=scheduler,
+        on_retry=on_retry,
+        model=model,
+        max_tokens=max_tokens,
+        temperature=0,
+        system=system,
+        messages=messages[:-1] + [{"role": "user", "content": reduce_content}]
+    )
+    answer = "".join(block.text for block in response.content if block.type == "text")
+    return answer, len(chunks)
@@ -0,0 +1,35 @@
+"""
+Chiamate all'API Claude condivise dalle modalità della chat
+"""
+
+
+def stream_message(client, on_text=None, metrics=None, scheduler=None, on_retry=None, **kwargs):
+    """
+    Esegue una chiamata Messages in streaming e ritorna il messaggio finale.
+    `on_text` riceve i frammenti di testo man mano che arrivano,
+    `metrics` (RequestMetrics) registra time-to-first-token, prompt e usage,
+    `scheduler` (SessionScheduler) applica rate limit e retry; `on_retry` è
+    chiamato prima di ogni nuovo tentativo (es. per azzerare il testo parziale).
+    """
+    if metrics is not None:
+        metrics.observe_prompt(kwargs.get("system"), kwargs.get("messages", []))
+
+    def call(**request):
+        with client.messages.stream(**request) as stream:
+            for text in stream.text_stream:
+                if metrics is not None:
+                    metrics.mark_first_token()
+                if on_text is not None:
+                    on_text(text)
+            return stream.get_final_message()
+
+    if scheduler is not None:
+        response = scheduler.run(call, kwargs, on_retry=on_retry)
+    else:
+        response = call(**kwargs)
+
+    if metrics is not None:
+        # Anche una risposta con soli tool_use conta come primo token ricevuto
+        metrics.mark_first_token()
+        metrics.observe_response(response)
+    return response
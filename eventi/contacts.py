@@ -0,0 +1,238 @@
+"""
+Nomi canonici dei contatti (A CHI CHIEDERE)
+Il contatto è testo libero: "Mario Rossi", "rossi mario", "M. Rossi" o "Mario Rosi"
+sono la stessa persona ma finivano in barre, conteggi e heatmap separati. Qui i
+nomi distinti vengono raggruppati per persona e ogni gruppo prende il nome scritto
+più spesso, senza toccare il workbook: le pagine applicano la mappatura ai dati
+letti, le scritture conservano il testo originale.
+
+Per non confrontare tutte le coppie di nomi, i confronti avvengono solo dentro
+blocchi con una chiave in comune (parole ordinate del nome, una parola con le
+iniziali delle altre, scheletro fonetico di una parola con le altre). Due nomi
+sono la stessa persona se le parole si corrispondono una a una: uguali, a una
+lettera di distanza per inserimento, omissione o scambio (non per sostituzione:
+Mario e Marco restano distinti) o iniziale puntata. Un nome con iniziali si unisce
+solo se nel blocco c'è una sola persona compatibile ("M. Rossi" con Mario e Marco
+Rossi resta com'è).
+"""
+
+import unicodedata
+from collections import defaultdict
+
+import pandas as pd
+
+# Blocchi più grandi non si confrontano a coppie (chiave troppo generica)
+MAX_BLOCK_SIZE = 1000
+PHONETIC_LENGTH = 4
+MAX_SUGGESTIONS = 3
+
+_VOWELS = set("aeiouy")
+
+
+def name_tokens(name):
+    """Parole del nome: minuscole, senza accenti né punteggiatura"""
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', errors='ignore').decode('ascii').lower()
+    return tuple(t for t in "".join(c if c.isalnum() else " " for c in text).split() if t)
+
+
+def _phonetic(token):
+    # Prima lettera + consonanti senza h e doppie: rossi/rosi -> rs, fontana/fontanna -> fntn
+    skeleton = token[0]
+    for c in token[1:]:
+        if c not in _VOWELS and c != "h" and c != skeleton[-1]:
+            skeleton += c
+    return skeleton[:PHONETIC_LENGTH]
+
+
+def blocking_keys(tokens):
+    """Chiavi di blocco di un nome: parole ordinate, e per ogni parola lunga la parola
+    stessa con le iniziali delle altre e il suo scheletro fonetico con le altre parole
+    Due nomi della stessa persona hanno almeno una parola identica (le altre uguali,
+    con un refuso o iniziali): condividono la chiave di quella parola, o quella
+    fonetica del refuso. Un nome comune ("Mario") non crea quindi blocchi enormi."""
+    keys = {"parole:" + " ".join(sorted(tokens))}
+    for i, token in enumerate(tokens):
+        if len(token) < 3 or token.isdigit():
+            continue
+        others = tokens[:i] + tokens[i + 1:]
+        keys.add(f"parola:{token}|" + " ".join(sorted(t[0] for t in others)))
+        if all(len(t) > 1 for t in others):
+            keys.add(f"fonetica:{_phonetic(token)}|" + " ".join(sorted(others)))
+    return keys
+
+
+def _one_edit_apart(a, b):
+    """Una lettera inserita, omessa o due lettere vicine scambiate"""
+    if abs(len(a) - len(b)) > 1 or min(len(a), len(b)) < 4:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    short, long_ = (a, b) if len(a) < len(b) else (b, a)
+    i = 0
+    while i < len(short) and short[i] == long_[i]:
+        i += 1
+    return short[i:] == long_[i + 1:]
+
+
+def _token_match(a, b):
+    """'esatta', 'iniziale', 'refuso' o None"""
+    if a == b:
+        return "esatta"
+    if (len(a) == 1 and b.startswith(a)) or (len(b) == 1 and a.startswith(b)):
+        return "iniziale" if not (a.isdigit() or b.isdigit()) else None
+    if _one_edit_apart(a, b) and not (a.isdigit() or b.isdigit()):
+        return "refuso"
+    return None
+
+
+def same_person(a, b):
+    """True se i nomi (tuple di parole) indicano la stessa persona: parole in
+    corrispondenza una a una, in qualsiasi ordine, almeno una esatta e lunga"""
+    if len(a) != len(b) or not a:
+        return False
+    remaining = list(b)
+    exact = False
+    for token in sorted(a, key=len, reverse=True):
+        for kind in ("esatta", "refuso", "iniziale"):
+            match = next((other for other in remaining if _token_match(token, other) == kind), None)
+            if match is not None:
+                remaining.remove(match)
+                exact = exact or (kind == "esatta" and len(token) >= 3)
+                break
+        else:
+            return False
+    return exact
+
+
+def _has_initials(tokens):
+    return any(len(t) == 1 and not t.isdigit() for t in tokens)
+
+
+class ContactDirectory:
+    """Contatti distinti con nome canonico, blocchi per i confronti e suggerimenti"""
+
+    def __init__(self, counts):
+        """`counts`: eventi per nome così come scritto (Series nome -> conteggio)"""
+        counts = counts[counts.index.map(lambda n: isinstance(n, str) and n.strip() != "")]
+        self.counts = counts.groupby(counts.index.map(str.strip)).sum()
+        self.tokens = {name: name_tokens(name) for name in self.counts.index}
+        self.blocks = defaultdict(list)
+        for name, tokens in self.tokens.items():
+            if tokens:
+                for key in blocking_keys(tokens):
+                    self.blocks[key].append(name)
+        self.mapping = self._canonicalize()
+        # Anche gli spazi ai lati sono una grafia diversa
+        self.mapping.update({raw: self.canonical(raw) for raw in counts.index if raw != raw.strip()})
+        # Eventi per persona (tutte le grafie)
+        self.totals = self.counts.groupby(self.counts.index.map(self.canonical)).sum()
+
+    @classmethod
+    def from_stats(cls, stats):
+        """Dai conteggi per contatto del sidecar (eventi.sidecar), senza leggere gli eventi"""
+        return cls(pd.Series((stats or {}).get("conteggi_contatti") or {}, dtype='int64'))
+
+    @classmethod
+    def from_events(cls, df):
+        if 'A CHI CHIEDERE' not in df.columns or len(df) == 0:
+            return cls(pd.Series(dtype='int64'))
+        return cls(df['A CHI CHIEDERE'].value_counts())
+
+    # ---------- raggruppamento ----------
+
+    def _candidate_pairs(self):
+        pairs = set()
+        for names in self.blocks.values():
+            if 1 < len(names) <= MAX_BLOCK_SIZE:
+                for i, a in enumerate(names):
+                    for b in names[i + 1:]:
+                        pairs.add((a, b) if a < b else (b, a))
+        return pairs
+
+    def _canonicalize(self):
+        parent = {name: name for name in self.counts.index}
+
+        def find(name):
+            while parent[name] != name:
+                parent[name] = parent[parent[name]]
+                name = parent[name]
+            return name
+
+        # Prima i nomi completi, poi quelli con iniziali se il gruppo compatibile è uno solo
+        initials = defaultdict(set)
+        for a, b in self._candidate_pairs():
+            ta, tb = self.tokens[a], self.tokens[b]
+            if not same_person(ta, tb):
+                continue
+            if _has_initials(ta) or _has_initials(tb):
+                short, full = (a, b) if _has_initials(ta) else (b, a)
+                initials[short].add(full)
+            else:
+                parent[find(a)] = find(b)
+        for short, candidates in initials.items():
+            groups = {find(full) for full in candidates}
+            if len(groups) == 1:
+                parent[find(short)] = groups.pop()
+
+        members = defaultdict(list)
+        for name in parent:
+            members[find(name)].append(name)
+        mapping = {}
+        for names in members.values():
+            if len(names) == 1:
+                continue
+            canonical = min(names, key=lambda n: (_has_initials(self.tokens[n]), -self.counts[n], -len(n), n))
+            mapping.update({name: canonical for name in names if name != canonical})
+        return mapping
+
+    def canonical(self, name):
+        name = str(name).strip()
+        return self.mapping.get(name, name)
+
+    def groups(self):
+        """{nome canonico: [varianti]} dei soli contatti con più grafie"""
+        groups = defaultdict(list)
+        for name, canonical in self.mapping.items():
+            groups[canonical].append(name)
+        return dict(groups)
+
+    # ---------- suggerimenti ----------
+
+    def suggest(self, text, limit=MAX_SUGGESTIONS):
+        """Contatti già registrati che sembrano la stessa persona di `text` scritta
+        diversamente: [(nome canonico, eventi)], vuota se `text` è già il nome canonico"""
+        text = str(text).strip()
+        tokens = name_tokens(text)
+        if not tokens:
+            return []
+        if text in self.counts.index:
+            canonical = self.canonical(text)
+            return [] if canonical == text else [(canonical, int(self.totals[canonical]))]
+        candidates = set()
+        for key in blocking_keys(tokens):
+            candidates.update(self.blocks.get(key, ()))
+        found = set()
+        for name in candidates:
+            if _has_initials(self.tokens[name]) and not _has_initials(tokens):
+                continue  # chi scrive il nome completo non va riportato a un'iniziale
+            if same_person(tokens, self.tokens[name]):
+                found.add(self.canonical(name))
+        if len(found) > 1 and _has_initials(tokens):
+            return []  # iniziali ambigue: nessun suggerimento sicuro
+        return sorted(((name, int(self.totals[name])) for name in found), key=lambda item: -item[1])[:limit]
+
+
+def canonicalize_contacts(df, directory):
+    """`df` con A CHI CHIEDERE sostituito dal nome canonico (stesso df se non cambia nulla)
+    Copia superficiale: le altre colonne restano condivise con `df`."""
+    if not directory.mapping or 'A CHI CHIEDERE' not in df.columns:
+        return df
+    codes, uniques = pd.factorize(df['A CHI CHIEDERE'])
+    canonical = pd.Index(uniques).map(lambda name: directory.canonical(name) if isinstance(name, str) else name)
+    values = pd.Series(canonical.take(codes), index=df.index) if len(codes) else df['A CHI CHIEDERE']
+    if (codes < 0).any():
+        values = values.where(codes >= 0, None)
+    out = df.copy(deep=False)
+    out['A CHI CHIEDERE'] = values.astype(df['A CHI CHIEDERE'].dtype)
+    return out
@@ -0,0 +1,318 @@
+"""
+Logica dati degli eventi, indipendente da Streamlit
+Caricamento e salvataggio, filtri (spec dichiarativa `filtri`), aggregazioni di
+Insights ed export: le pagine le chiamano per mostrare i risultati, benchmark e
+report da riga di comando (eventi.report) le usano senza avviare l'interfaccia.
+Tutte le operazioni sono vettoriali, anche su milioni di righe.
+
+La spec dei filtri (chiavi e semantica) è definita in eventi.filters.
+"""
+
+import io
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from eventi.changelog import OP_DELETE, OP_INSERT, OP_UPDATE, ChangeLog, row_record
+from eventi.fingerprint import file_fingerprint, file_signature
+from eventi.filters import PERIODI, compile_mask, period_mask  # noqa: F401 (riesportati)
+from eventi.schema import CATEGORIE, COLUMNS, DATE_COLUMNS, ID_COLUMN
+from eventi.sidecar import write_sidecar
+
+EXCEL_FILE = "gestione_eventi.xlsx"
+# Letture ripetute se il file cambia mentre lo si legge (vedi load_events_consistent)
+LOAD_ATTEMPTS = 3
+
+GIORNI_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+GIORNI_IT = {'Monday': 'Lunedì', 'Tuesday': 'Martedì', 'Wednesday': 'Mercoledì',
+             'Thursday': 'Giovedì', 'Friday': 'Venerdì', 'Saturday': 'Sabato', 'Sunday': 'Domenica'}
+
+
+# ==================== CARICAMENTO E SALVATAGGIO ====================
+
+def read_table(path):
+    """Legge il file nel formato indicato dall'estensione (xlsx, csv, parquet, feather)"""
+    ext = os.path.splitext(path)[1].lstrip(".").lower()
+    if ext in ("xlsx", "xls"):
+        return pd.read_excel(path)
+    if ext == "csv":
+        return pd.read_csv(path)
+    if ext == "parquet":
+        return pd.read_parquet(path)
+    if ext == "feather":
+        return pd.read_feather(path)
+    raise ValueError(f"Formato non supportato: {ext}")
+
+
+def parse_dates(df):
+    """Conversione delle colonne data (DATA EVENTO scritta a mano, quindi giorno/mese)"""
+    if 'DATA EVENTO' in df.columns:
+        df['DATA EVENTO'] = pd.to_datetime(df['DATA EVENTO'], errors='coerce', dayfirst=True)
+    for col in DATE_COLUMNS[1:]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+
+def parse_text(df):
+    """Colonne di testo come stringhe pandas: una cella con un numero (es. 2025 nelle NOTE)
+    resta testo invece di rendere la colonna mista, che Arrow e Parquet non convertono"""
+    for col in [c for c in COLUMNS + [ID_COLUMN] if c not in DATE_COLUMNS and c in df.columns]:
+        values = df[col]
+        if isinstance(values.dtype, pd.StringDtype):
+            continue
+        if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+            values = values.astype('Int64')  # 2025.0 (colonna numerica con vuoti) -> "2025"
+        df[col] = values.astype('string')
+    return df
+
+
+def load_events(path=EXCEL_FILE):
+    """Carica il file eventi con date convertite e colonne di testo come stringhe"""
+    return parse_text(parse_dates(read_table(path)))
+
+
+def load_events_consistent(path=EXCEL_FILE, attempts=LOAD_ATTEMPTS):
+    """(dataframe, firma, impronta) dello stesso contenuto del file: firma presa prima della
+    lettura e verificata dopo l'impronta, rileggendo se nel frattempo il file è cambiato
+    (es. un salvataggio da un altro processo). Per chi pubblica copie indicizzate per versione."""
+    for _ in range(attempts):
+        signature = file_signature(path)
+        df = load_events(path)
+        version = file_fingerprint(path)
+        if file_signature(path) == signature:
+            return df, signature, version
+    raise RuntimeError(f"{path} è cambiato a ogni lettura ({attempts} tentativi)")
+
+
+def save_events(df, path=EXCEL_FILE):
+    """Salva il workbook e aggiorna il sidecar delle statistiche"""
+    df.to_excel(path, index=False)
+    write_sidecar(df, path)
+
+
+# ==================== FILTRI ====================
+
+def filter_mask(df, filtri=None, now=None, version=None, cache=None):
+    """Combina i filtri in un'unica maschera booleana (vedi eventi.filters)"""
+    return compile_mask(df, filtri, now, version, cache)
+
+
+def filter_events(df, filtri=None, now=None, sort_by='DATA EVENTO', version=None, cache=None):
+    """Eventi che soddisfano i filtri, ordinati (un solo dataframe risultante)
+    Con `version` e `cache` le maschere delle clausole sono riusate tra chiamate."""
+    result = df[compile_mask(df, filtri, now, version, cache)]
+    return result.sort_values(sort_by) if sort_by else result
+
+
+def upcoming_count(df, days, now=None):
+    """Eventi nei prossimi `days` giorni"""
+    now = now or datetime.now()
+    dates = df['DATA EVENTO']
+    return int(((dates >= now) & (dates <= now + timedelta(days=days))).sum())
+
+
+def tag_counts(tags):
+    """Frequenza di ogni tag: gli elenchi distinti si dividono una volta sola, pesati per occorrenze"""
+    lists = tags.dropna().astype(str).value_counts()
+    exploded = lists.index.to_series().str.split(',').explode().str.strip()
+    weights = lists.reindex(exploded.index).set_axis(exploded.values)
+    weights = weights[weights.index != '']
+    return weights.groupby(level=0).sum().sort_values(ascending=False, kind='stable')
+
+
+def unique_tags(df):
+    """Tag distinti (la colonna TAG contiene elenchi separati da virgola)"""
+    if 'TAG' not in df.columns:
+        return []
+    return sorted(tag_counts(df['TAG']).index)
+
+
+# ==================== AGGREGAZIONI (INSIGHTS) ====================
+
+def monthly_trend(df):
+    """Numero di eventi per mese (YYYY-MM)"""
+    mesi = df['DATA EVENTO'].dt.to_period('M').astype(str)
+    return df.groupby(mesi).size().rename_axis('Mese').reset_index(name='Numero Eventi')
+
+
+def weekday_counts(df):
+    """Eventi per giorno della settimana, in ordine da lunedì"""
+    counts = df['DATA EVENTO'].dt.day_name().value_counts()
+    giorni = [g for g in GIORNI_ORDER if g in counts.index]
+    return pd.DataFrame({'Giorno': [GIORNI_IT[g] for g in giorni], 'Numero Eventi': [int(counts[g]) for g in giorni]})
+
+
+def contact_category_matrix(df, top=10):
+    """Matrice contatti × categorie per i `top` contatti più attivi"""
+    pivot = pd.crosstab(df['A CHI CHIEDERE'], df['CATEGORIA'])
+    top_contatti = df['A CHI CHIEDERE'].value_counts().head(top).index
+    return pivot.loc[top_contatti]
+
+
+def category_synergies(df, limit=10):
+    """Per categoria, i contatti che vi operano (solo categorie con più di un contatto)"""
+    contacts = df.groupby('CATEGORIA', sort=False)['A CHI CHIEDERE'].unique()
+    return {
+        cat: list(contacts[cat][:limit])
+        for cat in CATEGORIE
+        if cat in contacts.index and len(contacts[cat]) > 1
+    }
+
+
+def category_growth(df, now=None, window_days=90):
+    """Eventi per categoria negli ultimi `window_days` giorni rispetto ai `window_days` precedenti"""
+    now = now or datetime.now()
+    inizio_recenti = now - timedelta(days=window_days)
+    inizio_precedenti = now - timedelta(days=2 * window_days)
+    dates = df['DATA EVENTO']
+    recenti = df.loc[(dates >= inizio_recenti) & (dates <= now), 'CATEGORIA'].value_counts()
+    precedenti = df.loc[(dates >= inizio_precedenti) & (dates < inizio_recenti), 'CATEGORIA'].value_counts()
+    growth = pd.DataFrame({
+        'Categoria': CATEGORIE,
+        'Recenti': [int(recenti.get(cat, 0)) for cat in CATEGORIE],
+        'Precedenti': [int(precedenti.get(cat, 0)) for cat in CATEGORIE]
+    })
+    prev = growth['Precedenti'].where(growth['Precedenti'] > 0)
+    growth['Crescita %'] = ((growth['Recenti'] - prev) / prev * 100).round(1)
+    return growth
+
+
+def low_activity_contacts(df, max_events=2):
+    """Contatti con al più `max_events` eventi"""
+    counts = df['A CHI CHIEDERE'].value_counts()
+    return counts[counts <= max_events]
+
+
+def underrepresented_categories(df):
+    """Categorie con meno eventi della media, e la media"""
+    counts = df['CATEGORIA'].value_counts()
+    media = counts.mean()
+    return counts[counts < media], media
+
+
+def top_tags(df, n=10):
+    """Tag più usati"""
+    if 'TAG' not in df.columns:
+        return pd.DataFrame(columns=['Tag', 'Frequenza'])
+    counts = tag_counts(df['TAG']).head(n)
+    return counts.rename_axis('Tag').reset_index(name='Frequenza')
+
+
+def insights_report(df, now=None):
+    """Tutte le tabelle di Insights (trend, affinità, crescita, opportunità, tag)"""
+    now = now or datetime.now()
+    sotto, media = underrepresented_categories(df)
+    poco_attivi = low_activity_contacts(df)
+    return {
+        "trend_mensile": monthly_trend(df),
+        "giorni_settimana": weekday_counts(df),
+        "affinita": contact_category_matrix(df).reset_index(),
+        "crescita_categorie": category_growth(df, now),
+        "contatti_poco_attivi": poco_attivi.rename_axis('Contatto').reset_index(name='Eventi'),
+        "categorie_sotto_media": sotto.rename_axis('Categoria').reset_index(name='Eventi').assign(Media=round(media, 1)),
+        "tag": top_tags(df),
+    }
+
+
+# ==================== MODIFICHE (CON STORICO) ====================
+
+def new_event_id():
+    return uuid.uuid4().hex[:12]
+
+
+def ensure_event_ids(df):
+    """Assegna un ID EVENTO alle righe che non lo hanno (su una copia, se serve)"""
+    if ID_COLUMN in df.columns and not (df[ID_COLUMN].isna() | (df[ID_COLUMN].astype(str).str.strip() == '')).any():
+        return df
+    df = df.copy()
+    ids = df[ID_COLUMN].astype(object) if ID_COLUMN in df.columns else pd.Series(None, index=df.index, dtype=object)
+    missing = ids.isna() | (ids.astype(str).str.strip() == '')
+    ids[missing] = [new_event_id() for _ in range(int(missing.sum()))]
+    df[ID_COLUMN] = ids
+    return df
+
+
+def _event_mask(df, event_id):
+    mask = df[ID_COLUMN] == event_id
+    if not mask.any():
+        raise KeyError(f"Evento non trovato: {event_id}")
+    return mask
+
+
+def insert_event(df, nuovo, user, path=EXCEL_FILE, log=None, now=None):
+    """Aggiunge un evento, salva il workbook e registra la versione; ritorna il nuovo dataframe"""
+    now = now or datetime.now()
+    log = log or ChangeLog(path)
+    df = ensure_event_ids(df)
+    log.sync(df, now)
+    row = {**nuovo, ID_COLUMN: new_event_id()}
+    df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+    save_events(df, path)
+    log.record(row[ID_COLUMN], OP_INSERT, row_record(df.iloc[-1]), user, now)
+    return df
+
+
+def _can_hold(values, value):
+    """True se la colonna può ricevere `value` senza cambiare tipo"""
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return True
+    dtype = values.dtype
+    if pd.api.types.is_object_dtype(dtype):
+        return True
+    if isinstance(dtype, pd.StringDtype):
+        return isinstance(value, str)
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return isinstance(value, datetime)  # anche pd.Timestamp, non le date senza ora
+    if pd.api.types.is_bool_dtype(dtype):
+        return isinstance(value, bool)
+    if pd.api.types.is_integer_dtype(dtype):
+        return pd.api.types.is_integer(value)
+    if pd.api.types.is_float_dtype(dtype):
+        return pd.api.types.is_number(value) and not isinstance(value, bool)
+    return False
+
+
+def update_event(df, event_id, changes, user, path=EXCEL_FILE, log=None, now=None):
+    """Modifica i campi `changes` di un evento (con USER/TIMESTAMP MODIFICA) e registra la versione"""
+    now = now or datetime.now()
+    log = log or ChangeLog(path)
+    df = ensure_event_ids(df)
+    log.sync(df, now)
+    mask = _event_mask(df, event_id)
+    df = df.copy()
+    for col, value in {**changes, 'USER MODIFICA': user, 'TIMESTAMP MODIFICA': now}.items():
+        if col in df.columns and not _can_hold(df[col], value):
+            # Es. testo in una colonna vuota letta come float64: pandas non cambia più tipo da solo
+            df[col] = df[col].astype(object)
+        df.loc[mask, col] = value
+    save_events(df, path)
+    log.record(event_id, OP_UPDATE, row_record(df.loc[mask].iloc[0]), user, now)
+    return df
+
+
+def delete_event(df, event_id, user, path=EXCEL_FILE, log=None, now=None):
+    """Elimina un evento dal workbook; il log ne conserva le versioni precedenti"""
+    now = now or datetime.now()
+    log = log or ChangeLog(path)
+    df = ensure_event_ids(df)
+    log.sync(df, now)
+    mask = _event_mask(df, event_id)
+    df = df[~mask].reset_index(drop=True)
+    save_events(df, path)
+    log.record(event_id, OP_DELETE, None, user, now)
+    return df
+
+
+# ==================== EXPORT ====================
+
+def to_csv(df):
+    return df.to_csv(index=False)
+
+
+def to_excel_bytes(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
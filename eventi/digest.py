@@ -0,0 +1,350 @@
+"""
+Digest AI precalcolato (offline) sugli eventi
+Quando cambia la versione dei dati (impronta del file Excel) un job in background
+esegue un insieme fisso di domande di insight, tramite Message Batches quando
+disponibili (più economici, senza occupare il rate limit interattivo) o con
+chiamate singole in alternativa, e salva le risposte per versione dei dati.
+Chat e tab Insights mostrano così subito il "digest di oggi".
+
+Job da riga di comando (usa ANTHROPIC_API_KEY e, per i test, ANTHROPIC_BASE_URL):
+    python -m eventi.digest --watch
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from eventi.chunked import global_stats
+from eventi.core import EXCEL_FILE, load_events
+from eventi.encoding import encode_events_compact
+from eventi.fingerprint import file_fingerprint
+from eventi.response_cache import CACHE_DIR
+from eventi.router import DEFAULT_LARGE_MODEL
+from eventi.snapshot import SnapshotStore
+
+DIGEST_DIR = os.path.join(CACHE_DIR, "digest")
+DIGEST_MAX_TOKENS = 1024
+POLL_INTERVAL_SECONDS = 10
+BATCH_TIMEOUT_SECONDS = 3600
+WATCH_INTERVAL_SECONDS = 30
+# Sessione dello scheduler condiviso usata dal job (in coda con le sessioni della chat)
+DIGEST_SESSION = "digest"
+
+STATUS_RUNNING = "in_corso"
+STATUS_DONE = "completato"
+STATUS_FAILED = "errore"
+
+# Domande fisse del digest: (chiave, titolo, domanda)
+DIGEST_PROMPTS = [
+    ("panoramica", "📊 Panoramica",
+     "Riassumi in 4-5 punti lo stato attuale degli eventi: volumi, periodo coperto, categorie principali."),
+    ("prossimi", "📅 Prossimi eventi",
+     "Quali sono i prossimi eventi in calendario (dopo la data di oggi)? Se non ce ne sono, "
+     "indica gli ultimi eventi passati e da quanto tempo non ci sono eventi."),
+    ("contatti", "👥 Contatti chiave",
+     "Quali contatti sono i più attivi e su quali categorie? Segnala i contatti poco coinvolti."),
+    ("trend", "📈 Trend",
+     "Descrivi l'andamento degli eventi nel tempo (mesi e anni), evidenziando picchi e cali."),
+    ("opportunita", "💡 Opportunità",
+     "Suggerisci 3 azioni concrete: contatti da coinvolgere, categorie da sviluppare, periodi scoperti."),
+]
+
+DIGEST_SYSTEM_PROMPT = """Sei un analista di dati eventi per aziende. Ricevi il dataset completo in forma
+compatta (legende con codici + tabella) e una domanda. Usa sempre i nomi completi, non i codici.
+Rispondi in italiano, in modo conciso (massimo 150 parole), con elenchi puntati ed emoji appropriate.
+Basati SOLO sui dati forniti, con conteggi esatti."""
+
+
+def build_system(df):
+    """System prompt del digest: istruzioni + dati, il blocco dati in prompt cache"""
+    context = f"{global_stats(df)}\n\n```\n{encode_events_compact(df)}```"
+    return [
+        {"type": "text", "text": DIGEST_SYSTEM_PROMPT},
+        {"type": "text", "text": context, "cache_control": {"type": "ephemeral"}}
+    ]
+
+
+def build_requests(df, model, prompts=DIGEST_PROMPTS, max_tokens=DIGEST_MAX_TOKENS):
+    """Richieste nel formato Message Batches (custom_id = chiave della domanda)"""
+    system = build_system(df)
+    return [
+        {
+            "custom_id": key,
+            "params": {
+                "model": model,
+                "max_tokens": max_tokens,
+                "temperature": 0,
+                "system": system,
+                "messages": [{"role": "user", "content": question}]
+            }
+        }
+        for key, _, question in prompts
+    ]
+
+
+def _text(message):
+    return "".join(block.text for block in message.content if block.type == "text")
+
+
+def _batches_unavailable(exc):
+    """L'endpoint batch non esiste (es. proxy o gateway che non lo supporta)"""
+    import anthropic  # import pesante: le pagine usano solo DigestStore, il client serve al job
+
+    return isinstance(exc, (anthropic.NotFoundError, AttributeError)) or (
+        isinstance(exc, anthropic.APIStatusError) and exc.status_code in (404, 405, 501)
+    )
+
+
+class DigestStore:
+    """Digest salvati su disco, un file JSON per versione dei dati"""
+
+    def __init__(self, directory=DIGEST_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, version):
+        return os.path.join(self.directory, f"{version}.json")
+
+    def load(self, version):
+        if not version:
+            return None
+        try:
+            with open(self._path(version), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save(self, digest):
+        # Scrittura atomica: chi legge non vede mai un file a metà
+        path = self._path(digest["versione"])
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(digest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+
+    def delete(self, version):
+        try:
+            os.remove(self._path(version))
+        except FileNotFoundError:
+            pass
+
+    def latest(self):
+        """Ultimo digest completato (anche di una versione precedente dei dati)"""
+        digests = [self.load(name[:-5]) for name in os.listdir(self.directory) if name.endswith(".json")]
+        digests = [d for d in digests if d and d.get("stato") == STATUS_DONE]
+        return max(digests, key=lambda d: d["completato"], default=None)
+
+
+def _new_digest(version, model, mode):
+    return {
+        "versione": version,
+        "modello": model,
+        "modalita": mode,
+        "stato": STATUS_RUNNING,
+        "avviato": datetime.now().isoformat(timespec="seconds"),
+        "completato": None,
+        "batch_id": None,
+        "errore": None,
+        "voci": []
+    }
+
+
+def _items(answers, prompts=DIGEST_PROMPTS):
+    return [
+        {"chiave": key, "titolo": title, "domanda": question, "risposta": answers.get(key)}
+        for key, title, question in prompts
+        if answers.get(key)
+    ]
+
+
+def _run_batch(client, digest, requests, store, poll_interval, timeout):
+    if digest["batch_id"] is None:
+        batch = client.messages.batches.create(requests=requests)
+        digest["batch_id"] = batch.id
+        store.save(digest)
+    deadline = time.monotonic() + timeout
+    while True:
+        batch = client.messages.batches.retrieve(digest["batch_id"])
+        if batch.processing_status == "ended":
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Batch {digest['batch_id']} non concluso entro {timeout}s")
+        time.sleep(poll_interval)
+    answers = {}
+    for entry in client.messages.batches.results(digest["batch_id"]):
+        if entry.result.type == "succeeded":
+            answers[entry.custom_id] = _text(entry.result.message)
+    return answers
+
+
+def _run_sequential(client, requests, scheduler=None):
+    # Con lo scheduler condiviso le domande rispettano rate limit ed equità come la chat
+    def create(params):
+        if scheduler is not None:
+            return scheduler.run(client.messages.create, params)
+        return client.messages.create(**params)
+
+    return {request["custom_id"]: _text(create(request["params"])) for request in requests}
+
+
+def compute_digest(client, df, version, model=DEFAULT_LARGE_MODEL, store=None, use_batches=True,
+                   poll_interval=POLL_INTERVAL_SECONDS, timeout=BATCH_TIMEOUT_SECONDS, scheduler=None):
+    """
+    Calcola (o riprende) il digest per la versione dei dati e lo salva.
+    Un digest rimasto "in corso" con un batch_id riprende il polling dello stesso batch.
+    `scheduler` (SessionScheduler) regola le chiamate singole; i Message Batches hanno
+    limiti propri e non passano dallo scheduler.
+    """
+    store = store or DigestStore()
+    digest = store.load(version)
+    mode = "batch" if use_batches else "singole"
+    if digest is None or digest["stato"] != STATUS_RUNNING or digest["modello"] != model:
+        digest = _new_digest(version, model, mode)
+        store.save(digest)
+    digest["modalita"] = mode
+
+    try:
+        requests = build_requests(df, model)
+        answers = None
+        if use_batches:
+            try:
+                answers = _run_batch(client, digest, requests, store, poll_interval, timeout)
+            except Exception as e:
+                if not _batches_unavailable(e):
+                    raise
+                digest["modalita"] = "singole"
+        if answers is None:
+            answers = _run_sequential(client, requests, scheduler)
+    except Exception as e:
+        digest.update(stato=STATUS_FAILED, errore=str(e))
+        store.save(digest)
+        raise
+
+    digest.update(
+        stato=STATUS_DONE,
+        completato=datetime.now().isoformat(timespec="seconds"),
+        voci=_items(answers)
+    )
+    store.save(digest)
+    return digest
+
+
+class DigestWorker:
+    """
+    Avvia il calcolo del digest in un thread quando la versione dei dati cambia.
+    Un'istanza per processo (es. st.cache_resource): un solo job per versione.
+    `loader` ritorna (dataframe, versione) letti insieme, di default dallo snapshot
+    del file: il job calcola solo la versione per cui è stato avviato.
+    `scheduler` (RequestScheduler condiviso con la chat) regola le chiamate singole.
+    """
+
+    def __init__(self, store=None, path=EXCEL_FILE, loader=None, scheduler=None):
+        self.store = store or DigestStore()
+        self.path = path
+        self.loader = loader or SnapshotStore(path).load
+        self.scheduler = scheduler
+        self._lock = threading.Lock()
+        self._running = {}
+
+    def is_running(self, version):
+        thread = self._running.get(version)
+        return thread is not None and thread.is_alive()
+
+    def ensure(self, api_key, model=DEFAULT_LARGE_MODEL, base_url=None, use_batches=True, version=None):
+        """
+        Se per la versione attuale del file non esiste un digest completato, avvia il job.
+        `version`: versione già nota (es. dal watcher), altrimenti impronta del file.
+        Ritorna (versione, digest salvato o None).
+        """
+        version = version or file_fingerprint(self.path)
+        digest = self.store.load(version)
+        if version is None or (digest and digest["stato"] in (STATUS_DONE, STATUS_FAILED)):
+            return version, digest
+        with self._lock:
+            if not self.is_running(version):
+                thread = threading.Thread(
+                    target=self._run,
+                    args=(version, api_key, model, base_url, use_batches),
+                    name=f"digest-{version[:8]}",
+                    daemon=True
+                )
+                self._running[version] = thread
+                thread.start()
+        return version, self.store.load(version)
+
+    def retry(self, version):
+        """Scarta un digest fallito, così il prossimo ensure lo ricalcola"""
+        digest = self.store.load(version)
+        if digest and digest["stato"] == STATUS_FAILED:
+            self.store.delete(version)
+
+    def _run(self, version, api_key, model, base_url, use_batches):
+        try:
+            import anthropic
+
+            df, loaded_version = self.loader()
+            if loaded_version != version:
+                raise RuntimeError(f"Dati cambiati prima del calcolo (versione {str(loaded_version)[:12]} "
+                                   f"invece di {version[:12]})")
+            if self.scheduler is not None:
+                # I retry li gestisce lo scheduler, non il client (come nella chat)
+                client = anthropic.Anthropic(api_key=api_key, base_url=base_url, max_retries=0)
+                scheduler = self.scheduler.session(DIGEST_SESSION)
+            else:
+                client, scheduler = anthropic.Anthropic(api_key=api_key, base_url=base_url), None
+            compute_digest(client, df, version, model, self.store, use_batches, scheduler=scheduler)
+        except Exception as e:
+            # compute_digest salva già i propri errori; qui quelli di lettura dati e client,
+            # altrimenti il digest resterebbe "in corso" e ogni ensure riavvierebbe il job
+            digest = self.store.load(version)
+            if digest is None or digest["stato"] != STATUS_FAILED:
+                digest = digest or _new_digest(version, model, "batch" if use_batches else "singole")
+                digest.update(stato=STATUS_FAILED, errore=str(e))
+                self.store.save(digest)
+        finally:
+            with self._lock:
+                self._running.pop(version, None)
+
+
+def digest_markdown(digest):
+    """Testo Markdown del digest, una sezione per domanda"""
+    sections = [f"#### {item['titolo']}\n{item['risposta']}" for item in digest["voci"]]
+    return "\n\n".join(sections)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calcola il digest AI degli eventi quando i dati cambiano")
+    parser.add_argument("--file", default=EXCEL_FILE)
+    parser.add_argument("--model", default=os.environ.get("CLAUDE_LARGE_MODEL", DEFAULT_LARGE_MODEL))
+    parser.add_argument("--base-url", default=None, help="es. http://127.0.0.1:8765 per lo stub locale")
+    parser.add_argument("--no-batches", action="store_true", help="usa chiamate singole invece dei Message Batches")
+    parser.add_argument("--watch", action="store_true", help="resta attivo e ricalcola a ogni modifica del file")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL_SECONDS)
+    args = parser.parse_args(argv)
+
+    import anthropic
+
+    client = anthropic.Anthropic(base_url=args.base_url)
+    store = DigestStore()
+    while True:
+        version = file_fingerprint(args.file)
+        digest = store.load(version)
+        if version and (digest is None or digest["stato"] == STATUS_RUNNING):
+            print(f"[{datetime.now():%H:%M:%S}] Nuova versione dati {version[:12]}: calcolo digest...")
+            try:
+                digest = compute_digest(client, load_events(args.file), version, args.model, store,
+                                        use_batches=not args.no_batches)
+                print(f"[{datetime.now():%H:%M:%S}] Digest completato ({digest['modalita']}, "
+                      f"{len(digest['voci'])} voci)")
+            except Exception as e:
+                print(f"[{datetime.now():%H:%M:%S}] Errore: {e}")
+        if not args.watch:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
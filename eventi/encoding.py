@@ -0,0 +1,175 @@
+"""
+Codifica compatta del dataset eventi per il prompt di Claude
+Rispetto al CSV completo riduce i token senza perdere informazione:
+- categorie e contatti sostituiti da codici brevi con tabella di legenda (e conteggi)
+- note, tag e nomi ripetuti codificati allo stesso modo quando conviene
+- colonne vuote o costanti rimosse (il valore costante è dichiarato una volta)
+- date senza orario quando l'ora è mezzanotte, formato ISO
+- prefisso più frequente dei link dichiarato una sola volta
+- colonne di audit escluse (salvo richiesta esplicita)
+"""
+
+import csv
+import io
+
+import pandas as pd
+
+from eventi.schema import ID_COLUMN
+
+AUDIT_COLUMNS = ['USER INSERIMENTO', 'TIMESTAMP INSERIMENTO', 'USER MODIFICA', 'TIMESTAMP MODIFICA']
+
+# Colonne codificate a dizionario: colonna -> (prefisso codice, titolo legenda)
+DICTIONARY_COLUMNS = {
+    'CATEGORIA': ('C', 'Categorie'),
+    'A CHI CHIEDERE': ('P', 'Contatti'),
+}
+
+# Colonne codificate a dizionario solo se riduce davvero la lunghezza
+AUTO_DICTIONARY_COLUMNS = {
+    'NOTE': ('N', 'Note'),
+    'TAG': ('T', 'Tag'),
+    'NOME EVENTO': ('E', 'Nomi evento'),
+}
+
+LINK_MARKER = '~'
+MIN_LINK_PREFIX = 8
+MIN_LINK_PREFIX_SHARE = 0.5
+
+
+def _format_datetime_column(series):
+    """Date ISO, con orario solo per i valori che non sono a mezzanotte"""
+    midnight = series.dt.normalize() == series
+    out = series.dt.strftime('%Y-%m-%d %H:%M')
+    out = out.where(~midnight, series.dt.strftime('%Y-%m-%d'))
+    return out.fillna('')
+
+
+def _dictionary_encode(series, prefix):
+    """Ritorna (codici, righe di legenda) ordinando i valori per frequenza"""
+    counts = series.value_counts()
+    mapping = {value: f"{prefix}{i}" for i, value in enumerate(counts.index, 1)}
+    legend = [f"{mapping[value]}={value} ({count})" for value, count in counts.items()]
+    return series.map(mapping).fillna(''), legend
+
+
+def _dictionary_saves_space(series, prefix):
+    """Vero se legenda + codici occupano meno dei valori ripetuti per esteso"""
+    values = series.dropna().astype(str)
+    values = values[values != '']
+    if len(values) == 0:
+        return False
+    counts = values.value_counts()
+    if len(counts) > len(values) / 2:
+        return False
+    code_len = len(prefix) + len(str(len(counts)))
+    encoded = len(values) * code_len + sum(len(v) + code_len + 8 for v in counts.index)
+    return encoded < values.str.len().sum()
+
+
+def _link_prefix(links):
+    """Cartella più frequente dei link (es. 'https://sito/event/') se condivisa dalla maggioranza"""
+    links = links[links != '']
+    if len(links) < 2:
+        return ''
+    dirs = links.str.rsplit('/', n=1).str[0] + '/'
+    top = dirs.value_counts()
+    prefix = top.index[0]
+    if len(prefix) < MIN_LINK_PREFIX or top.iloc[0] < len(links) * MIN_LINK_PREFIX_SHARE:
+        return ''
+    return prefix
+
+
+def encode_events_compact(df, include_audit=False):
+    """Codifica il dataframe in una tabella compatta con legende; ritorna il testo"""
+    out = df.copy()
+    header_lines = []
+
+    out = out.drop(columns=[ID_COLUMN], errors='ignore')
+    if not include_audit:
+        out = out.drop(columns=[c for c in AUDIT_COLUMNS if c in out.columns])
+
+    # Colonne vuote o costanti: rimosse dalla tabella
+    for col in list(out.columns):
+        non_null = out[col].dropna()
+        if pd.api.types.is_object_dtype(out[col]) or pd.api.types.is_string_dtype(out[col]):
+            non_null = non_null[non_null.astype(str).str.strip() != '']
+        if len(non_null) == 0:
+            out = out.drop(columns=col)
+            header_lines.append(f"Colonna {col}: sempre vuota")
+        elif len(out) > 1 and non_null.nunique() == 1 and len(non_null) == len(out):
+            header_lines.append(f"Colonna {col}: sempre '{non_null.iloc[0]}'")
+            out = out.drop(columns=col)
+
+    # Dizionari per colonne ripetitive
+    auto = {
+        col: spec for col, spec in AUTO_DICTIONARY_COLUMNS.items()
+        if col in out.columns and _dictionary_saves_space(out[col], spec[0])
+    }
+    for col, (prefix, title) in {**DICTIONARY_COLUMNS, **auto}.items():
+        if col in out.columns:
+            out[col], legend = _dictionary_encode(out[col], prefix)
+            header_lines.append(f"{title} [{col}] (codice=valore (eventi)):")
+            header_lines.extend(f"  {line}" for line in legend)
+
+    # Date
+    for col in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            out[col] = _format_datetime_column(out[col])
+
+    # Prefisso più frequente dei link
+    if 'LINK EVENTO' in out.columns:
+        links = out['LINK EVENTO'].fillna('').astype(str)
+        prefix = _link_prefix(links)
+        if prefix:
+            header_lines.append(f"LINK EVENTO: '{LINK_MARKER}' iniziale sta per '{prefix}'")
+            has_prefix = links.str.startswith(prefix)
+            out['LINK EVENTO'] = links.where(~has_prefix, LINK_MARKER + links.str[len(prefix):])
+
+    buffer = io.StringIO()
+    out.fillna('').to_csv(buffer, index=False, sep='|', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+
+    text = ""
+    if header_lines:
+        text += "Legenda:\n" + "\n".join(header_lines) + "\n\n"
+    text += f"Tabella (separatore '|', {len(out):,} righe):\n"
+    text += buffer.getvalue()
+    return text
+
+
+def dataframe_summary(df):
+    """Crea un sommario del dataframe per Claude includendo TUTTI i dati in forma compatta"""
+    
+    # Informazioni base
+    summary = f"""📊 **DATASET EVENTI - Informazioni Complete**
+
+**Dimensioni:** {len(df):,} eventi
+"""
+    
+    # Statistiche temporali
+    if 'DATA EVENTO' in df.columns:
+        df_valid_dates = df[df['DATA EVENTO'].notna()]
+        if len(df_valid_dates) > 0:
+            min_date = df_valid_dates['DATA EVENTO'].min()
+            max_date = df_valid_dates['DATA EVENTO'].max()
+            summary += f"\n**📅 Range Temporale:**"
+            summary += f"\n- Dal: {min_date.strftime('%d/%m/%Y')}"
+            summary += f"\n- Al: {max_date.strftime('%d/%m/%Y')}"
+            summary += f"\n- Durata: {(max_date - min_date).days} giorni"
+            
+            # Eventi passati vs futuri
+            now = pd.Timestamp.now()
+            past = len(df_valid_dates[df_valid_dates['DATA EVENTO'] < now])
+            future = len(df_valid_dates[df_valid_dates['DATA EVENTO'] >= now])
+            summary += f"\n- Eventi passati: {past}"
+            summary += f"\n- Eventi futuri: {future}"
+            summary += f"\n- Oggi: {now.strftime('%Y-%m-%d')}"
+    
+    # DATI COMPLETI in formato compatto (legende + tabella)
+    summary += f"\n\n**📋 DATASET COMPLETO (tutti i {len(df)} eventi):**\n"
+    summary += "\n```\n"
+    summary += encode_events_compact(df)
+    summary += "```\n"
+    
+    summary += f"\n**💡 Nota:** Tutti i {len(df):,} eventi sono inclusi sopra. Analizza l'intero dataset per rispondere alle domande."
+    
+    return summary
@@ -0,0 +1,153 @@
+"""
+Risposte locali immediate per le domande analitiche più comuni
+Un matcher di intent (italiano e inglese) riconosce domande semplici come totali,
+categorie più popolari, contatti più attivi o eventi dei prossimi N giorni e le
+calcola direttamente sul dataframe, senza chiamare l'API.
+Le domande aperte non vengono riconosciute e passano a Claude.
+"""
+
+import re
+
+import pandas as pd
+
+from eventi.response_cache import normalize_question
+
+MAX_LISTED_EVENTS = 20
+
+# Ogni pattern deve coprire l'INTERA domanda normalizzata: niente match parziali
+# su domande più articolate ("quanti eventi ha organizzato Anna nel 2025?")
+_INTENT_PATTERNS = {
+    "totale": [
+        r"(quanti|numero( totale)? di|totale) eventi( (abbiamo|ci sono|sono presenti|sono registrati|registrati))?( in totale)?",
+        r"(how many|total( number of)?|number of) events( (are there|do we have|are registered))?( in total)?",
+    ],
+    "top_categorie": [
+        r"(quali sono )?(le )?categorie (più|piu) (popolari|frequenti|comuni|usate)",
+        r"(quali sono )?(le )?top categorie",
+        r"(what are )?(the )?(most (popular|common|frequent)|top) categories",
+    ],
+    "top_contatti": [
+        r"(chi sono )?(i )?contatti (più|piu) attivi",
+        r"(quali sono )?(i )?top contatti",
+        r"(who are )?(the )?(most active|top) contacts",
+    ],
+    "prossimi_giorni": [
+        r"(quali )?eventi (sono )?(previsti|in programma|programmati)? ?(per|nei|nei prossimi|entro) (i )?(prossimi )?(?P<giorni>\d+) giorni",
+        r"(quali sono )?(i )?prossimi eventi",
+        r"(what are the |show me the )?(upcoming|next) events( in the next (?P<days>\d+) days)?",
+        r"(which )?events (are )?(scheduled |planned )?(in|for|within) the next (?P<days2>\d+) days",
+    ],
+    "trend": [
+        r"(mostra(mi)? )?(il )?(trend|andamento) (mensile )?degli eventi( nel tempo)?",
+        r"(mostra(mi)? )?eventi per mese",
+        r"(show( me)? )?(the )?(monthly )?(event trend|events per month|trend of events( over time)?)",
+    ],
+}
+
+_COMPILED = {
+    intent: [re.compile(p) for p in patterns]
+    for intent, patterns in _INTENT_PATTERNS.items()
+}
+
+
+def match_intent(question):
+    """Ritorna (intent, parametri) se la domanda è riconosciuta, altrimenti None"""
+    text = normalize_question(question)
+    for intent, patterns in _COMPILED.items():
+        for pattern in patterns:
+            m = pattern.fullmatch(text)
+            if m:
+                params = {k: int(v) for k, v in m.groupdict().items() if v}
+                if intent == "prossimi_giorni":
+                    params = {"giorni": next(iter(params.values()), 30)}
+                return intent, params
+    return None
+
+
+def _answer_totale(df, params):
+    now = pd.Timestamp.now()
+    future = int((df['DATA EVENTO'] >= now).sum())
+    past = int((df['DATA EVENTO'] < now).sum())
+    answer = f"📊 In totale ci sono **{len(df):,} eventi**: {past} passati e {future} futuri."
+    undated = len(df) - past - future
+    if undated:
+        answer += f" ({undated} senza data)"
+    return answer, []
+
+
+def _answer_top_categorie(df, params):
+    counts = df['CATEGORIA'].value_counts()
+    lines = [f"🏷️ **Categorie per numero di eventi** ({len(counts)} categorie):", ""]
+    for i, (cat, count) in enumerate(counts.items(), 1):
+        lines.append(f"{i}. **{cat}**: {count} eventi ({count / len(df):.0%})")
+    return "\n".join(lines), [{"intent": "categorie_distribuzione", "filtri": {}}]
+
+
+def _answer_top_contatti(df, params):
+    counts = df['A CHI CHIEDERE'].value_counts().head(10)
+    lines = [f"👥 **Contatti più attivi** (top {len(counts)} su {df['A CHI CHIEDERE'].nunique()}):", ""]
+    for i, (contact, count) in enumerate(counts.items(), 1):
+        lines.append(f"{i}. **{contact}**: {count} eventi")
+    return "\n".join(lines), [{"intent": "contatti_top10", "filtri": {}}]
+
+
+def _answer_prossimi_giorni(df, params):
+    giorni = params.get("giorni", 30)
+    now = pd.Timestamp.now()
+    mask = (df['DATA EVENTO'] >= now) & (df['DATA EVENTO'] <= now + pd.Timedelta(days=giorni))
+    df_sel = df[mask].sort_values('DATA EVENTO')
+    if len(df_sel) == 0:
+        return f"📅 Nessun evento previsto nei prossimi {giorni} giorni.", []
+    lines = [f"📅 **{len(df_sel)} eventi** previsti nei prossimi {giorni} giorni:", ""]
+    for _, evento in df_sel.head(MAX_LISTED_EVENTS).iterrows():
+        lines.append(
+            f"- **{evento['DATA EVENTO']:%d/%m/%Y}** · {evento['NOME EVENTO']} "
+            f"({evento['CATEGORIA']}, 👤 {evento['A CHI CHIEDERE']})"
+        )
+    if len(df_sel) > MAX_LISTED_EVENTS:
+        lines.append(f"- … e altri {len(df_sel) - MAX_LISTED_EVENTS} eventi")
+    return "\n".join(lines), []
+
+
+def _answer_trend(df, params):
+    per_mese = df['DATA EVENTO'].dropna().dt.to_period('M').value_counts().sort_index()
+    if len(per_mese) == 0:
+        return "📈 Nessun evento con data valida.", []
+    lines = [f"📈 **Eventi per mese** (media {per_mese.mean():.1f} al mese):", ""]
+    for mese, count in per_mese.items():
+        lines.append(f"- {mese}: {count} eventi")
+    lines.append("")
+    lines.append(f"🔝 Mese più intenso: **{per_mese.idxmax()}** ({per_mese.max()} eventi)")
+    return "\n".join(lines), [{"intent": "timeline_eventi", "filtri": {}}]
+
+
+_ANSWERS = {
+    "totale": _answer_totale,
+    "top_categorie": _answer_top_categorie,
+    "top_contatti": _answer_top_contatti,
+    "prossimi_giorni": _answer_prossimi_giorni,
+    "trend": _answer_trend,
+}
+
+_REQUIRED_COLUMNS = {
+    "totale": ['DATA EVENTO'],
+    "top_categorie": ['CATEGORIA'],
+    "top_contatti": ['A CHI CHIEDERE'],
+    "prossimi_giorni": ['DATA EVENTO', 'NOME EVENTO', 'CATEGORIA', 'A CHI CHIEDERE'],
+    "trend": ['DATA EVENTO'],
+}
+
+
+def answer_locally(df, question):
+    """
+    Risponde localmente se la domanda è un intent noto.
+    Ritorna {"answer", "charts", "intent"} oppure None per passare a Claude.
+    """
+    matched = match_intent(question)
+    if matched is None or df is None or len(df) == 0:
+        return None
+    intent, params = matched
+    if any(col not in df.columns for col in _REQUIRED_COLUMNS[intent]):
+        return None
+    answer, charts = _ANSWERS[intent](df, params)
+    return {"answer": answer, "charts": charts, "intent": intent}
@@ -0,0 +1,225 @@
+"""
+Filtri degli eventi come spec dichiarativa, compilata in un'unica maschera
+Ogni filtro attivo è una clausola con una chiave stabile (es. ("categorie", (...)))
+e una maschera booleana numpy; la maschera finale è l'AND di tutte le clausole,
+senza dataframe intermedi. Con una versione dei dati (impronta del file) le
+maschere delle singole clausole sono memorizzate in MaskCache: cambiando un solo
+widget si ricalcola solo la sua clausola, le altre arrivano dalla cache.
+
+Semantica unica per pagine, strumenti della chat, report e benchmark:
+    periodo     una voce di PERIODI ("Tutti", "Passati", ...)
+    categorie   categorie ammesse (match esatto)
+    contatti    contatti ammessi (senza distinzione di maiuscole e spazi ai lati)
+    testo       testo cercato in NOME EVENTO e NOTE (senza distinzione di maiuscole)
+    tag         almeno uno di questi tag (elemento esatto dell'elenco, senza maiuscole)
+    data_da     data minima inclusa
+    data_a      data massima inclusa (tutto il giorno indicato)
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+PERIODI = ["Tutti", "Passati", "Futuri", "Questo Mese", "Prossimi 3 Mesi"]
+
+FILTER_KEYS = ("periodo", "categorie", "contatti", "testo", "tag", "data_da", "data_a")
+
+MAX_CACHED_MASKS = 64
+
+
+class FilterError(ValueError):
+    """Valore di filtro non valido (es. data non interpretabile)"""
+
+
+def _parse_date(value, name):
+    if value is None or value == "":
+        return None
+    parsed = pd.to_datetime(value, errors='coerce')
+    if pd.isna(parsed):
+        raise FilterError(f"Data non valida per '{name}': {value}")
+    return parsed
+
+
+def _normalize(value):
+    return str(value).strip().lower()
+
+
+def _match_distinct(values, predicate):
+    """Applica `predicate` ai valori distinti della colonna e propaga con isin
+    (contatti ed elenchi di tag si ripetono su moltissime righe)"""
+    distinct = pd.Series(values.dropna().unique())
+    matched = distinct[predicate(distinct.astype(str)).to_numpy(dtype=bool)]
+    return values.isin(matched).to_numpy()
+
+
+def period_mask(dates, periodo, now=None):
+    """Maschera delle date per una voce di PERIODI"""
+    now = now or datetime.now()
+    if periodo == "Passati":
+        return dates < now
+    if periodo == "Futuri":
+        return dates >= now
+    if periodo == "Questo Mese":
+        return (dates.dt.month == now.month) & (dates.dt.year == now.year)
+    if periodo == "Prossimi 3 Mesi":
+        return (dates >= now) & (dates <= now + timedelta(days=90))
+    return pd.Series(True, index=dates.index)
+
+
+class FilterSpec:
+    """Filtri attivi, normalizzati; le clausole vuote (o "Tutti") non contano"""
+
+    def __init__(self, periodo=None, categorie=None, contatti=None, testo=None, tag=None,
+                 data_da=None, data_a=None):
+        self.periodo = periodo if periodo and periodo != "Tutti" else None
+        self.categorie = tuple(sorted(set(categorie))) if categorie else None
+        self.contatti = tuple(sorted({_normalize(c) for c in contatti})) if contatti else None
+        self.testo = testo.strip().lower() if testo and testo.strip() else None
+        self.tag = tuple(sorted({_normalize(t) for t in tag} - {""})) if tag else None
+        self.data_da = _parse_date(data_da, "data_da")
+        data_a = _parse_date(data_a, "data_a")
+        self.data_a = data_a.normalize() + pd.Timedelta(days=1) if data_a is not None else None
+
+    @classmethod
+    def from_dict(cls, filtri):
+        """Dalla spec a dizionario (chiavi di FILTER_KEYS, le altre sono ignorate)"""
+        if isinstance(filtri, cls):
+            return filtri
+        filtri = filtri or {}
+        return cls(**{key: filtri.get(key) for key in FILTER_KEYS})
+
+    def clauses(self, now=None):
+        """Coppie (chiave, funzione df -> maschera numpy) dei filtri attivi"""
+        clauses = []
+        if self.periodo:
+            # Al minuto: le maschere dei periodi restano riusabili tra rerun ravvicinati
+            now = (now or datetime.now()).replace(second=0, microsecond=0)
+            clauses.append((("periodo", self.periodo, now),
+                            lambda df, p=self.periodo, n=now: period_mask(df['DATA EVENTO'], p, n).to_numpy()))
+        if self.categorie:
+            clauses.append((("categorie", self.categorie),
+                            lambda df, c=self.categorie: df['CATEGORIA'].isin(c).to_numpy()))
+        if self.contatti:
+            clauses.append((("contatti", self.contatti), self._contatti_mask))
+        if self.testo:
+            clauses.append((("testo", self.testo), self._testo_mask))
+        if self.tag:
+            clauses.append((("tag", self.tag), self._tag_mask))
+        if self.data_da is not None:
+            clauses.append((("data_da", self.data_da),
+                            lambda df, d=self.data_da: (df['DATA EVENTO'] >= d).to_numpy()))
+        if self.data_a is not None:
+            clauses.append((("data_a", self.data_a),
+                            lambda df, d=self.data_a: (df['DATA EVENTO'] < d).to_numpy()))
+        return clauses
+
+    def date_window(self, now=None):
+        """Intervallo [inizio, fine) di giorni interi che contiene tutte le date ammesse
+        da periodo, data_da e data_a (estremi None se aperti), None se non ci sono limiti.
+        Serve a leggere solo le partizioni necessarie; le clausole restano esatte."""
+        start = end = None
+        if self.periodo:
+            now = now or datetime.now()
+            today = pd.Timestamp(now).normalize()
+            if self.periodo == "Passati":
+                end = today + pd.Timedelta(days=1)
+            elif self.periodo == "Futuri":
+                start = today
+            elif self.periodo == "Questo Mese":
+                start = today.replace(day=1)
+                end = start + pd.offsets.MonthBegin(1)
+            elif self.periodo == "Prossimi 3 Mesi":
+                start = today
+                end = (pd.Timestamp(now) + timedelta(days=90)).normalize() + pd.Timedelta(days=1)
+        if self.data_da is not None:
+            start = max(start, self.data_da.normalize()) if start is not None else self.data_da.normalize()
+        if self.data_a is not None:
+            end = min(end, self.data_a) if end is not None else self.data_a
+        if start is None and end is None:
+            return None
+        return start, end
+
+    def _contatti_mask(self, df):
+        wanted = set(self.contatti)
+        return _match_distinct(df['A CHI CHIEDERE'], lambda values: values.str.strip().str.lower().isin(wanted))
+
+    def _testo_mask(self, df):
+        def contains(col):
+            return df[col].fillna('').astype(str).str.contains(self.testo, case=False, regex=False).to_numpy()
+
+        mask = contains('NOME EVENTO')
+        if 'NOTE' in df.columns:
+            mask |= contains('NOTE')
+        return mask
+
+    def _tag_mask(self, df):
+        if 'TAG' not in df.columns:
+            return np.zeros(len(df), dtype=bool)
+        wanted = set(self.tag)
+        return _match_distinct(df['TAG'], lambda values: values.str.lower().str.split(',').map(
+            lambda tags: any(t.strip() in wanted for t in tags)))
+
+
+class MaskCache:
+    """Maschere delle clausole per (versione dei dati, righe, chiave), LRU e thread-safe
+    Condivisa tra sessioni: una versione nuova dei dati rende irraggiungibili le
+    maschere precedenti, che escono per anzianità."""
+
+    def __init__(self, max_entries=MAX_CACHED_MASKS):
+        self.max_entries = max_entries
+        self._masks = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        with self._lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                self.hits += 1
+                return mask
+            self.misses += 1
+        mask = compute()
+        mask.flags.writeable = False  # condivisa: nessuno deve modificarla sul posto
+        with self._lock:
+            self._masks[key] = mask
+            self._masks.move_to_end(key)
+            while len(self._masks) > self.max_entries:
+                self._masks.popitem(last=False)
+        return mask
+
+    def discard_version(self, version):
+        """Libera subito le maschere di una versione dei dati superata"""
+        with self._lock:
+            for key in [key for key in self._masks if key[0] == version]:
+                del self._masks[key]
+
+    def clear(self):
+        with self._lock:
+            self._masks.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"maschere": len(self._masks), "hit": self.hits, "miss": self.misses}
+
+
+def compile_mask(df, filtri=None, now=None, version=None, cache=None):
+    """Maschera booleana numpy dei filtri (AND delle clausole)
+    `version` identifica il contenuto di `df` (es. file_fingerprint del file da cui
+    è stato caricato): solo allora le clausole passano dalla cache."""
+    spec = FilterSpec.from_dict(filtri)
+    masks = []
+    for key, compute in spec.clauses(now):
+        if cache is not None and version is not None:
+            masks.append(cache.get((version, len(df), key), lambda: np.asarray(compute(df), dtype=bool)))
+        else:
+            masks.append(np.asarray(compute(df), dtype=bool))
+    if not masks:
+        return np.ones(len(df), dtype=bool)
+    if len(masks) == 1:
+        return masks[0]
+    return np.logical_and.reduce(masks)
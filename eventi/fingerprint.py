@@ -0,0 +1,53 @@
+"""
+Impronta (fingerprint) del dataset eventi
+Identifica in modo stabile il contenuto del dataframe, usata come versione dei dati.
+Senza pandas all'import: la home usa solo la firma del file (vedi eventi.sidecar).
+"""
+
+import hashlib
+import os
+
+try:
+    import xxhash
+except ImportError:  # xxhash è opzionale, fallback su hashlib
+    xxhash = None
+
+
+def _hasher():
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def data_fingerprint(df):
+    """Calcola un'impronta del contenuto del dataframe (colonne, tipi e valori)"""
+    import pandas as pd
+
+    h = _hasher()
+    if df is None:
+        return "none"
+    h.update("|".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items()).encode("utf-8"))
+    if len(df) > 0:
+        row_hashes = pd.util.hash_pandas_object(df, index=False).values
+        h.update(row_hashes.tobytes())
+    return h.hexdigest()
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """Impronta del contenuto di un file (versione dei dati su disco), None se non esiste"""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    h = _hasher()
+    with f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_signature(path):
+    """Dimensione e data di modifica del file: verifica veloce, senza leggerlo, che il file
+    sia quello da cui sono stati scritti sidecar, snapshot o partizioni (OSError se manca)"""
+    stat = os.stat(path)
+    return {"dimensione": stat.st_size, "modificato_ns": stat.st_mtime_ns}
@@ -0,0 +1,123 @@
+"""
+Conversazione multi-turno con budget di token
+Trasforma la cronologia della chat (st.session_state.messages) nei messaggi per l'API:
+i turni recenti sono inclusi per intero, quelli più vecchi vengono riassunti
+localmente o scartati per restare nel budget. Il contesto dati NON fa parte della
+cronologia: va nel system prompt, una sola volta per richiesta.
+"""
+
+import hashlib
+
+DEFAULT_HISTORY_BUDGET = 4000
+SUMMARY_BUDGET_RATIO = 0.25
+SUMMARY_SNIPPET_CHARS = 160
+
+# I messaggi di errore non portano contesto utile alla conversazione
+_ERROR_PREFIXES = ("❌", "⚠️")
+
+
+def estimate_tokens(text):
+    """Stima veloce dei token (circa 4 caratteri per token per testo italiano/inglese)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _snippet(text, limit=SUMMARY_SNIPPET_CHARS):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def _turns(messages):
+    """Raggruppa la cronologia in coppie (domanda, risposta) valide"""
+    turns = []
+    question = None
+    for message in messages:
+        content = message.get("content") or ""
+        if message["role"] == "user":
+            question = content
+        elif question is not None and not content.startswith(_ERROR_PREFIXES):
+            turns.append((question, content))
+            question = None
+    return turns
+
+
+class HistoryStats:
+    """Resoconto di quanto della cronologia è stato inviato"""
+
+    def __init__(self):
+        self.included = 0
+        self.summarized = 0
+        self.dropped = 0
+        self.tokens = 0
+
+    def as_dict(self):
+        return {
+            "turni_inclusi": self.included,
+            "turni_riassunti": self.summarized,
+            "turni_scartati": self.dropped,
+            "token_cronologia": self.tokens
+        }
+
+
+def build_messages(history, question, budget_tokens=DEFAULT_HISTORY_BUDGET):
+    """
+    Costruisce la lista messages per l'API a partire dalla cronologia precedente
+    (senza la domanda corrente) e dalla nuova domanda.
+    Ritorna (messages, stats).
+    """
+    stats = HistoryStats()
+    turns = _turns(history)
+    question_tokens = estimate_tokens(question)
+    available = max(0, budget_tokens - question_tokens)
+
+    # Turni recenti per intero, dal più nuovo al più vecchio
+    kept = []
+    used = 0
+    for q, a in reversed(turns):
+        cost = estimate_tokens(q) + estimate_tokens(a)
+        if used + cost > available * (1 - SUMMARY_BUDGET_RATIO) and kept:
+            break
+        if used + cost > available:
+            break
+        kept.append((q, a))
+        used += cost
+    kept.reverse()
+
+    # Turni più vecchi: riassunto estrattivo, i più vecchi scartati se non c'è spazio
+    older = turns[:len(turns) - len(kept)]
+    summary_lines = []
+    summary_tokens = 0
+    for q, a in reversed(older):
+        line = f"- D: {_snippet(q)} → R: {_snippet(a)}"
+        cost = estimate_tokens(line)
+        if used + summary_tokens + cost > available:
+            break
+        summary_lines.append(line)
+        summary_tokens += cost
+    summary_lines.reverse()
+    stats.summarized = len(summary_lines)
+    stats.dropped = len(older) - len(summary_lines)
+    stats.included = len(kept)
+
+    messages = []
+    if summary_lines:
+        summary = "Riassunto della conversazione precedente:\n" + "\n".join(summary_lines)
+        messages.append({"role": "user", "content": summary})
+        messages.append({"role": "assistant", "content": "Ok, tengo conto di questo contesto."})
+    for q, a in kept:
+        messages.append({"role": "user", "content": q})
+        messages.append({"role": "assistant", "content": a})
+    messages.append({"role": "user", "content": question})
+
+    stats.tokens = used + summary_tokens + question_tokens
+    return messages, stats
+
+
+def conversation_key(messages):
+    """Impronta della cronologia inviata (per distinguere le risposte in cache)"""
+    if len(messages) <= 1:
+        return ""
+    h = hashlib.sha256()
+    for message in messages[:-1]:
+        h.update(message["role"].encode("utf-8"))
+        h.update(str(message["content"]).encode("utf-8"))
+    return h.hexdigest()[:16]
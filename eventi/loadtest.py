@@ -0,0 +1,251 @@
+"""
+Test di carico del percorso chat (pages/chat_eventi_ai.py)
+Simula N sessioni Streamlit concorrenti (AppTest, stesso processo come sul server reale,
+quindi scheduler e cache condivisi) che pongono domande contro lo stub locale dell'API.
+Riporta throughput, percentili di latenza per domanda (rerun completo della pagina)
+e memoria per sessione.
+
+Esempio (dalla cartella del progetto):
+    python -m eventi.loadtest --sessions 10 --questions 5 --latency-ms 800 --jitter-ms 300 --rpm 200
+"""
+
+import argparse
+import json
+import os
+import pickle
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from eventi.api_stub import StubServer, StubState
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHAT_PAGE = os.path.join(ROOT_DIR, "pages", "chat_eventi_ai.py")
+DEFAULT_TIMEOUT = 120
+
+# Domande aperte: non risolvibili dal percorso locale, quindi arrivano all'API
+DEFAULT_QUESTIONS = [
+    "Quali eventi riguardano l'intelligenza artificiale?",
+    "Chi contattare per gli eventi sulla sostenibilità?",
+    "Confronta le categorie degli ultimi due anni",
+    "Quali contatti seguono più categorie diverse?",
+    "Riassumi gli eventi di logotel dell'ultimo anno",
+]
+
+
+def _rss_bytes():
+    """Memoria residente del processo (Linux /proc, altrimenti picco da getrusage)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@contextmanager
+def shared_runtime():
+    """
+    Un solo runtime (simulato) per tutte le sessioni, come su un server reale.
+    AppTest installa e poi azzera un runtime globale a ogni run, e con più sessioni
+    in parallelo una azzererebbe quello delle altre: qui le sue assegnazioni vengono
+    dirottate su un segnaposto mentre il runtime vero resta fisso per tutto il test.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import app_test
+
+    class _RuntimePlaceholder:
+        _instance = None
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    saved_instance, saved_class = Runtime._instance, app_test.Runtime
+    Runtime._instance = runtime
+    app_test.Runtime = _RuntimePlaceholder
+    try:
+        yield runtime
+    finally:
+        Runtime._instance, app_test.Runtime = saved_instance, saved_class
+
+
+class SessionResult:
+    """Esito di una sessione simulata"""
+
+    def __init__(self, index):
+        self.index = index
+        self.latencies_ms = []
+        self.errors = []
+        self.session_state_bytes = 0
+        self.app = None
+
+
+def _new_session(use_tools, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(CHAT_PAGE, default_timeout=timeout)
+    state = {
+        "initialized": True,
+        "api_key": "stub",
+        "api_key_configured": True,
+        "messages": [],
+        "dataframe": None,
+        "show_data_preview": False,
+        "use_tools": use_tools,
+        "use_fast_path": False
+    }
+    for key, value in state.items():
+        app.session_state[key] = value
+    app.run()
+    return app
+
+
+def simulate_session(index, questions, use_tools=True, unique=True, timeout=DEFAULT_TIMEOUT):
+    """Apre una sessione e pone le domande in sequenza, misurando ogni rerun"""
+    result = SessionResult(index)
+    app = _new_session(use_tools, timeout)
+    for j, question in enumerate(questions):
+        if unique:
+            # Domande distinte per sessione: nessuna risposta servita dalla cache
+            question = f"{question} [sessione {index}, domanda {j}]"
+        start = time.perf_counter()
+        try:
+            app.chat_input[0].set_value(question).run()
+        except Exception as e:
+            result.errors.append(str(e))
+            continue
+        result.latencies_ms.append((time.perf_counter() - start) * 1000)
+        last = app.session_state["messages"][-1] if app.session_state["messages"] else {}
+        if app.exception:
+            result.errors.append(str(app.exception[0].value))
+        elif str(last.get("content", "")).startswith("❌"):
+            result.errors.append(last["content"].splitlines()[-1])
+    result.session_state_bytes = len(pickle.dumps(app.session_state["messages"]))
+    result.app = app  # tenuta in vita fino alla misura della memoria
+    return result
+
+
+def _percentiles(values):
+    if not values:
+        return {f"p{p}_ms": None for p in (50, 95, 99)}
+    return {f"p{p}_ms": round(float(np.percentile(values, p)), 1) for p in (50, 95, 99)}
+
+
+def run_load_test(sessions=5, questions=None, questions_per_session=3, use_tools=True, unique=True,
+                  ramp_seconds=0.0, timeout=DEFAULT_TIMEOUT, stub_state=None, base_url=None):
+    """
+    Esegue il test e ritorna il report (dict).
+    Senza `base_url` avvia lo stub in-process con `stub_state` (o la configurazione di default).
+    """
+    questions = list(questions or DEFAULT_QUESTIONS)
+    questions = (questions * (questions_per_session // len(questions) + 1))[:questions_per_session]
+
+    server = None
+    if base_url is None:
+        stub_state = stub_state or StubState()
+        server = StubServer(("127.0.0.1", 0), stub_state)
+        server.start_in_thread()
+        base_url = server.base_url
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    os.chdir(ROOT_DIR)
+
+    try:
+        with shared_runtime():
+            # Sessione di riscaldamento: import e cache di processo non pesano sulle sessioni misurate
+            _new_session(use_tools, timeout)
+            rss_before = _rss_bytes()
+
+            def run(index):
+                time.sleep(ramp_seconds * index / max(1, sessions))
+                return simulate_session(index, questions, use_tools, unique, timeout)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="sessione") as pool:
+                results = list(pool.map(run, range(sessions)))
+            wall = time.perf_counter() - start
+            rss_after = _rss_bytes()
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    latencies = [ms for r in results for ms in r.latencies_ms]
+    errors = [e for r in results for e in r.errors]
+    report = {
+        "sessioni": sessions,
+        "domande_per_sessione": len(questions),
+        "modalita": "strumenti" if use_tools else "csv",
+        "domande_totali": sessions * len(questions),
+        "errori": len(errors),
+        "durata_s": round(wall, 2),
+        "throughput_domande_s": round(len(latencies) / wall, 2) if wall else None,
+        "latenza_media_ms": round(float(np.mean(latencies)), 1) if latencies else None,
+        **_percentiles(latencies),
+        "memoria_per_sessione_mb": round((rss_after - rss_before) / sessions / 2**20, 2),
+        "cronologia_per_sessione_kb": round(np.mean([r.session_state_bytes for r in results]) / 1024, 1),
+        "thread_attivi": threading.active_count(),
+        "esempi_errori": errors[:5]
+    }
+    if stub_state is not None:
+        report.update(
+            richieste_api=stub_state.requests,
+            risposte_429=stub_state.rate_limited,
+            risposte_529=stub_state.overloaded
+        )
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test di carico della chat contro lo stub dell'API")
+    parser.add_argument("--sessions", type=int, default=5, help="sessioni concorrenti")
+    parser.add_argument("--questions", type=int, default=3, help="domande per sessione")
+    parser.add_argument("--mode", choices=["strumenti", "csv"], default="strumenti")
+    parser.add_argument("--allow-cache", action="store_true", help="domande identiche tra sessioni (cache attiva)")
+    parser.add_argument("--ramp-s", type=float, default=0.0, help="secondi per avviare gradualmente le sessioni")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="timeout di un rerun")
+    parser.add_argument("--base-url", default=None, help="stub esterno già avviato (altrimenti in-process)")
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--jitter-ms", type=float, default=200.0)
+    parser.add_argument("--chunk-delay-ms", type=float, default=5.0)
+    parser.add_argument("--rpm", type=int, default=0, help="limite richieste/minuto dello stub (429 oltre)")
+    parser.add_argument("--overload-rate", type=float, default=0.0, help="frazione di risposte 529")
+    parser.add_argument("--json", dest="json_path", default=None, help="salva il report in questo file")
+    args = parser.parse_args(argv)
+
+    stub_state = None
+    if args.base_url is None:
+        stub_state = StubState(
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            chunk_delay_ms=args.chunk_delay_ms,
+            rpm=args.rpm,
+            overload_rate=args.overload_rate
+        )
+    report = run_load_test(
+        sessions=args.sessions,
+        questions_per_session=args.questions,
+        use_tools=args.mode == "strumenti",
+        unique=not args.allow_cache,
+        ramp_seconds=args.ramp_s,
+        timeout=args.timeout,
+        stub_state=stub_state,
+        base_url=args.base_url
+    )
+
+    width = max(len(key) for key in report)
+    for key, value in report.items():
+        print(f"{key:<{width}}  {value}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Metriche delle richieste della chat
+Per ogni domanda registra token (input/output/cache), time-to-first-token,
+latenza totale, chiamate API, retry e dimensione del contesto in un log locale
+a rotazione (JSONL), da cui il pannello in sidebar calcola i percentili.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from eventi.response_cache import CACHE_DIR
+
+METRICS_FILE = os.path.join(CACHE_DIR, "metriche_chat.jsonl")
+MAX_RECORDS = 1000
+PERCENTILES = [0.5, 0.95, 0.99]
+
+_ANTHROPIC_MESSAGES_PATH = "/v1/messages"
+
+
+class RequestMetrics:
+    """Raccoglie le metriche di una singola domanda alla chat"""
+
+    def __init__(self, mode, model=None, context_rows=0):
+        self.mode = mode
+        self.model = model
+        self.context_rows = context_rows
+        self.prompt_chars = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_creation_tokens = 0
+        self.api_calls = 0
+        self.http_requests = 0
+        self.error = None
+        self._start = time.perf_counter()
+        self._first_token = None
+        self._end = None
+
+    def mark_first_token(self):
+        """Segna l'arrivo del primo token (solo la prima volta)"""
+        if self._first_token is None:
+            self._first_token = time.perf_counter()
+
+    def observe_prompt(self, system, messages):
+        """Dimensione del prompt inviato in caratteri (system + messaggi)"""
+        parts = [system] if isinstance(system, str) else [b.get("text", "") for b in system or []]
+        for message in messages:
+            content = message["content"]
+            parts.append(content if isinstance(content, str) else json.dumps(content, default=str))
+        self.prompt_chars += sum(len(p) for p in parts)
+
+    def observe_response(self, response):
+        """Accumula l'usage di una risposta dell'API"""
+        self.api_calls += 1
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        self.input_tokens += getattr(usage, "input_tokens", 0) or 0
+        self.output_tokens += getattr(usage, "output_tokens", 0) or 0
+        self.cache_read_tokens += getattr(usage, "cache_read_input_tokens", 0) or 0
+        self.cache_creation_tokens += getattr(usage, "cache_creation_input_tokens", 0) or 0
+
+    def http_event_hooks(self):
+        """Hook httpx che conta le richieste HTTP verso l'API (per ricavare i retry)"""
+        def on_request(request):
+            if request.url.path.endswith(_ANTHROPIC_MESSAGES_PATH):
+                self.http_requests += 1
+        return {"request": [on_request]}
+
+    def async_http_event_hooks(self):
+        """Come http_event_hooks, per il client asincrono (gli hook devono essere coroutine)"""
+        def on_request(request):
+            if request.url.path.endswith(_ANTHROPIC_MESSAGES_PATH):
+                self.http_requests += 1
+
+        async def on_request_async(request):
+            on_request(request)
+        return {"request": [on_request_async]}
+
+    @property
+    def retries(self):
+        return max(0, self.http_requests - self.api_calls)
+
+    def finish(self, error=None):
+        self._end = time.perf_counter()
+        self.error = str(error) if error else None
+        return self
+
+    def as_record(self):
+        end = self._end or time.perf_counter()
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "mode": self.mode,
+            "model": self.model,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_creation_tokens": self.cache_creation_tokens,
+            "ttft_ms": round((self._first_token - self._start) * 1000, 1) if self._first_token else None,
+            "latency_ms": round((end - self._start) * 1000, 1),
+            "api_calls": self.api_calls,
+            "retries": self.retries,
+            "context_rows": self.context_rows,
+            "prompt_chars": self.prompt_chars,
+            "error": self.error
+        }
+
+
+class MetricsLog:
+    """Log JSONL a rotazione: conserva solo gli ultimi `max_records` record"""
+
+    def __init__(self, path=METRICS_FILE, max_records=MAX_RECORDS):
+        self.path = path
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def append(self, metrics):
+        record = metrics.as_record() if isinstance(metrics, RequestMetrics) else metrics
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._rotate()
+
+    def _rotate(self):
+        # Riscrive il file solo quando supera del 20% il limite, per non farlo a ogni append
+        with open(self.path, encoding="utf-8") as f:
+            lines = f.readlines()
+        if len(lines) > self.max_records * 1.2:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(lines[-self.max_records:])
+            os.replace(tmp_path, self.path)
+
+    def load(self):
+        """Ritorna i record come DataFrame (vuoto se il log non esiste)"""
+        if not os.path.exists(self.path):
+            return pd.DataFrame()
+        records = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return pd.DataFrame(records).tail(self.max_records)
+
+    def clear(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def summarize(df):
+    """Percentili di latenza e TTFT e medie dei token, per modalità e modello"""
+    if df.empty:
+        return pd.DataFrame()
+    labels = df["mode"].where(df["model"].isna(), df["mode"] + " · " + df["model"].fillna(""))
+    rows = []
+    for mode, group in df.groupby(labels):
+        row = {"modalità": mode, "richieste": len(group)}
+        for col, label in [("latency_ms", "latenza"), ("ttft_ms", "ttft")]:
+            values = pd.to_numeric(group[col], errors="coerce").dropna()
+            for q in PERCENTILES:
+                row[f"{label} p{int(q * 100)} (ms)"] = round(values.quantile(q)) if len(values) else None
+        row["input medi"] = round(group["input_tokens"].mean())
+        row["output medi"] = round(group["output_tokens"].mean())
+        total_input = group[["input_tokens", "cache_read_tokens", "cache_creation_tokens"]].sum().sum()
+        row["% input da cache"] = round(100 * group["cache_read_tokens"].sum() / total_input) if total_input else 0
+        row["retry"] = int(group["retries"].sum())
+        row["errori"] = int(group["error"].notna().sum())
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("modalità")
@@ -0,0 +1,173 @@
+"""
+Copia degli eventi partizionata per anno (Parquet) con manifest
+Il workbook resta la fonte dei dati; accanto, in .eventi_cache/partizioni, una
+copia divisa per anno (o per mese) e un manifest con date minima e massima e
+numero di righe di ogni partizione. Le viste limitate nel tempo (Prossimi 3 Mesi,
+Questo Mese, crescita degli ultimi 180 giorni, Data Da/Data A) leggono solo le
+partizioni che intersecano l'intervallo: memoria e tempi dipendono dalla finestra,
+non dagli anni di storico.
+
+Come il sidecar, il manifest vale solo per il file da cui è stato scritto
+(dimensione e data di modifica): se il workbook cambia altrove le partizioni
+vengono riscritte al primo accesso. Ogni scrittura va in una cartella nuova e il
+manifest è sostituito in modo atomico, quindi chi legge non vede mai una copia a metà.
+"""
+
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+from eventi.fingerprint import file_fingerprint, file_signature
+from eventi.response_cache import CACHE_DIR
+
+PARTITIONS_DIR = os.path.join(CACHE_DIR, "partizioni")
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+GRANULARITA = {"anno": "Y", "mese": "M"}
+UNDATED_KEY = "senza_data"
+
+
+class PartitionStore:
+    """Partizioni di un file eventi, una cartella per file sorgente"""
+
+    def __init__(self, path, directory=PARTITIONS_DIR, granularity="anno"):
+        if granularity not in GRANULARITA:
+            raise ValueError(f"Granularità non supportata: {granularity}")
+        self.path = path
+        self.granularity = granularity
+        self.directory = os.path.join(directory, f"{os.path.basename(path)}.{granularity}")
+
+    # ---------- manifest ----------
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def manifest(self):
+        """Manifest valido per il file attuale, altrimenti None"""
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                manifest = json.load(f)
+            signature = file_signature(self.path)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if manifest.get("versione") != MANIFEST_VERSION:
+            return None
+        if any(manifest.get(key) != value for key, value in signature.items()):
+            return None
+        return manifest
+
+    def ensure(self):
+        """Manifest aggiornato, riscrivendo le partizioni dal file se serve"""
+        manifest = self.manifest()
+        if manifest is None:
+            from eventi.core import load_events_consistent
+
+            manifest = self.write(*load_events_consistent(self.path))
+        return manifest
+
+    # ---------- scrittura ----------
+
+    def write(self, df, signature=None, version=None):
+        """Scrive le partizioni di `df` e ne ritorna il manifest
+        `signature` e `version`: firma e impronta del contenuto da cui è stato letto `df`
+        (vedi core.load_events_consistent), di default quelle attuali di `path`."""
+        from eventi.core import parse_text
+
+        # Come lo snapshot: colonne di testo miste (numeri e stringhe) non vanno in Parquet
+        df = parse_text(df.copy(deep=False))
+        os.makedirs(self.directory, exist_ok=True)
+        build = f"build-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        build_dir = os.path.join(self.directory, build)
+        os.makedirs(build_dir)
+
+        # Schema vuoto: tipi delle colonne per le finestre senza partizioni
+        df.iloc[:0].to_parquet(os.path.join(build_dir, "_schema.parquet"), index=False)
+        dates = df['DATA EVENTO']
+        keys = dates.dt.to_period(GRANULARITA[self.granularity]).astype(str).where(dates.notna(), UNDATED_KEY)
+        partitions = []
+        for key, part in df.groupby(keys, sort=True):
+            file = f"{key}.parquet"
+            part.to_parquet(os.path.join(build_dir, file), index=False)
+            part_dates = part['DATA EVENTO']
+            partitions.append({
+                "chiave": key,
+                "file": file,
+                "min": part_dates.min().isoformat() if part_dates.notna().any() else None,
+                "max": part_dates.max().isoformat() if part_dates.notna().any() else None,
+                "righe": int(len(part))
+            })
+
+        manifest = {
+            "versione": MANIFEST_VERSION,
+            "file": os.path.basename(self.path),
+            **(signature or file_signature(self.path)),
+            "impronta": version or file_fingerprint(self.path),
+            "granularita": self.granularity,
+            "build": build,
+            "righe": int(len(df)),
+            "partizioni": partitions
+        }
+        tmp = f"{self._manifest_path()}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self._manifest_path())
+        self._cleanup(keep=build)
+        return manifest
+
+    def _cleanup(self, keep):
+        # Le build precedenti non sono più raggiungibili dal manifest
+        for name in os.listdir(self.directory):
+            if name.startswith("build-") and name != keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    # ---------- lettura ----------
+
+    @staticmethod
+    def overlapping(manifest, start=None, end=None):
+        """Partizioni con date in [start, end) (senza limiti: tutte, anche quella senza data)"""
+        if start is None and end is None:
+            return list(manifest["partizioni"])
+        selected = []
+        for part in manifest["partizioni"]:
+            if part["min"] is None:
+                continue
+            if start is not None and pd.Timestamp(part["max"]) < start:
+                continue
+            if end is not None and pd.Timestamp(part["min"]) >= end:
+                continue
+            selected.append(part)
+        return selected
+
+    def load(self, start=None, end=None):
+        """Eventi con DATA EVENTO in [start, end), leggendo solo le partizioni necessarie
+        Ritorna (dataframe, manifest); le partizioni interamente nella finestra sono
+        lette senza filtro di riga."""
+        try:
+            return self._load(self.ensure(), start, end)
+        except FileNotFoundError:
+            # Build sostituita da un altro processo tra lettura del manifest e delle partizioni
+            return self._load(self.ensure(), start, end)
+
+    def _load(self, manifest, start, end):
+        build_dir = os.path.join(self.directory, manifest["build"])
+        frames = []
+        for part in self.overlapping(manifest, start, end):
+            row_filters = []
+            if start is not None and pd.Timestamp(part["min"]) < start:
+                row_filters.append(('DATA EVENTO', '>=', start))
+            if end is not None and pd.Timestamp(part["max"]) >= end:
+                row_filters.append(('DATA EVENTO', '<', end))
+            frames.append(pd.read_parquet(os.path.join(build_dir, part["file"]), filters=row_filters or None))
+        if not frames:
+            return pd.read_parquet(os.path.join(build_dir, "_schema.parquet")), manifest
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0], manifest
+
+
+def load_events_window(path, start=None, end=None, granularity="anno"):
+    """Eventi di `path` con DATA EVENTO in [start, end) e la versione dei dati letti"""
+    df, manifest = PartitionStore(path, granularity=granularity).load(start, end)
+    return df, f"{manifest['impronta']}@{start}:{end}"
@@ -0,0 +1,243 @@
+"""
+Profiler dei rerun di Streamlit, per sezione
+Ogni rerun esegue l'intero script della pagina: il profiler misura quanto tempo
+va a caricamento, filtri, costruzione dei grafici ed emissione dei widget.
+- `checkpoint(nome)` chiude la sezione corrente e ne apre una nuova (sezioni
+  consecutive dello script, senza reindentare il codice)
+- `section(nome)` è un context manager per blocchi annidati (es. load_data)
+Le misure sono aggregate per vista (pagina + menu), mostrate in un pannello
+opzionale nella sidebar ed esportabili come trace JSON per chrome://tracing
+o Perfetto. Disattivato, ogni chiamata è un no-op su un oggetto condiviso.
+
+Attivazione: variabile d'ambiente EVENTI_PROFILER=1 oppure ?profiler=1 nell'URL.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+PROFILER_ENV = "EVENTI_PROFILER"
+SESSION_KEY = "profiler"
+MAX_TRACE_EVENTS = 20000
+RECENT_RUNS = 50
+
+_NULL_CONTEXT = nullcontext()
+
+
+def profiler_enabled(query_params=None):
+    """Attivo da variabile d'ambiente o dal parametro ?profiler=1 della pagina"""
+    if os.environ.get(PROFILER_ENV, "").lower() in ("1", "true", "yes"):
+        return True
+    if query_params is not None:
+        return str(query_params.get("profiler", "")).lower() in ("1", "true", "yes")
+    return False
+
+
+class _SectionStats:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+class NullProfiler:
+    """Profiler disattivato: stesse chiamate, nessun lavoro"""
+
+    enabled = False
+
+    def start_run(self, page):
+        pass
+
+    def set_view(self, view):
+        pass
+
+    def checkpoint(self, name):
+        pass
+
+    def section(self, name):
+        return _NULL_CONTEXT
+
+    def finish(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Profiler:
+    """Misure di una sessione utente, condivise tra le pagine dell'app"""
+
+    enabled = True
+
+    def __init__(self, max_trace_events=MAX_TRACE_EVENTS):
+        self.stats = {}  # (vista, sezione) -> _SectionStats
+        self.runs = {}  # vista -> durate degli ultimi rerun (s)
+        self.trace = deque(maxlen=max_trace_events)
+        self._origin = time.perf_counter()
+        self._view = None
+        self._run_start = None
+        self._lap = None  # (nome, inizio) della sezione aperta da checkpoint
+        self._last = None  # ultimo istante misurato, per chiudere run interrotti da st.stop/rerun
+        self._pending = []
+
+    @property
+    def current_view(self):
+        return self._view
+
+    # ---------- misure ----------
+
+    def _record(self, name, start, end, category):
+        seconds = end - start
+        if category != "rerun":
+            # Aggregate a fine rerun, sotto la vista definitiva (set_view arriva dopo le prime sezioni)
+            self._pending.append((name, seconds))
+        self.trace.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self._origin) * 1e6, 1),
+            "dur": round(seconds * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {"vista": self._view}
+        })
+        self._last = end
+
+    def start_run(self, page):
+        """Inizio dello script di una pagina (vista iniziale = nome della pagina)"""
+        if self._run_start is not None:
+            self.finish(at=self._last)
+        self._view = page
+        self._run_start = self._last = time.perf_counter()
+        self._lap = None
+        self._pending = []
+
+    def set_view(self, view):
+        """Raffina la vista corrente (es. voce del menu), usata per aggregare le sezioni successive"""
+        if self._view and not self._view.endswith(f" · {view}"):
+            self._view = f"{self._view.split(' · ')[0]} · {view}"
+
+    def checkpoint(self, name):
+        now = time.perf_counter()
+        if self._lap is not None:
+            self._record(self._lap[0], self._lap[1], now, "sezione")
+        self._lap = (name, now)
+        self._last = now
+
+    @contextmanager
+    def section(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, start, time.perf_counter(), "blocco")
+
+    def finish(self, at=None):
+        """Fine del rerun: chiude l'ultima sezione e registra la durata totale"""
+        if self._run_start is None:
+            return
+        end = at if at is not None else time.perf_counter()
+        if self._lap is not None:
+            self._record(self._lap[0], self._lap[1], max(end, self._lap[1]), "sezione")
+            self._lap = None
+        self._record("rerun", self._run_start, end, "rerun")
+        for name, seconds in self._pending:
+            self.stats.setdefault((self._view, name), _SectionStats()).add(seconds)
+        self._pending = []
+        self.runs.setdefault(self._view, deque(maxlen=RECENT_RUNS)).append(end - self._run_start)
+        self._run_start = None
+
+    # ---------- report ----------
+
+    def views(self):
+        return sorted(self.runs, key=lambda view: -sum(self.runs[view]) / len(self.runs[view]))
+
+    def summary(self, view):
+        """Righe per sezione della vista: chiamate, media, massimo, quota del rerun medio"""
+        runs = self.runs.get(view, ())
+        n_runs = len(runs) or 1
+        rerun_ms = sum(runs) * 1000 / n_runs
+        rows = []
+        for (stat_view, name), stats in self.stats.items():
+            if stat_view != view:
+                continue
+            per_run_ms = stats.total * 1000 / n_runs
+            rows.append({
+                "sezione": name,
+                "chiamate": stats.count,
+                "media_ms": round(stats.total * 1000 / stats.count, 2),
+                "max_ms": round(stats.max * 1000, 2),
+                "quota_%": round(100 * per_run_ms / rerun_ms, 1) if rerun_ms else None
+            })
+        return sorted(rows, key=lambda row: -row["media_ms"] * row["chiamate"])
+
+    def rerun_stats(self, view):
+        runs = list(self.runs.get(view, ()))
+        if not runs:
+            return None
+        return {
+            "rerun": len(runs),
+            "ultimo_ms": round(runs[-1] * 1000, 1),
+            "medio_ms": round(sum(runs) / len(runs) * 1000, 1),
+            "max_ms": round(max(runs) * 1000, 1)
+        }
+
+    def chrome_trace(self):
+        """Trace JSON (formato Trace Event) apribile in chrome://tracing o ui.perfetto.dev"""
+        return json.dumps({"traceEvents": list(self.trace), "displayTimeUnit": "ms"}, ensure_ascii=False)
+
+    def reset(self):
+        self.stats.clear()
+        self.runs.clear()
+        self.trace.clear()
+
+
+def session_profiler(session_state, enabled):
+    """Profiler della sessione (creato al primo uso) oppure il profiler nullo"""
+    if not enabled:
+        return NULL_PROFILER
+    profiler = session_state.get(SESSION_KEY)
+    if profiler is None:
+        profiler = Profiler()
+        session_state[SESSION_KEY] = profiler
+    return profiler
+
+
+def render_profiler_panel(profiler):
+    """Pannello della sidebar con i tempi per sezione della vista corrente (solo se attivo)"""
+    if not profiler.enabled:
+        return
+    import streamlit as st
+
+    with st.sidebar:
+        st.markdown("---")
+        if not st.toggle("⏱️ Profiler rerun", key="profiler_panel"):
+            return
+        views = profiler.views()
+        if not views:
+            st.caption("Nessun rerun misurato")
+            return
+        current = profiler.current_view if profiler.current_view in views else views[0]
+        view = st.selectbox("Vista", views, index=views.index(current), key="profiler_view")
+        stats = profiler.rerun_stats(view)
+        st.caption(f"{stats['rerun']} rerun · ultimo {stats['ultimo_ms']} ms · "
+                   f"medio {stats['medio_ms']} ms · max {stats['max_ms']} ms")
+        st.dataframe(profiler.summary(view), hide_index=True, use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("💾 Trace", profiler.chrome_trace(), file_name="trace_eventi.json",
+                               mime="application/json", use_container_width=True)
+        with col2:
+            if st.button("🔄 Azzera", key="profiler_reset", use_container_width=True):
+                profiler.reset()
@@ -0,0 +1,338 @@
+"""
+Strumenti di interrogazione locale per Claude (tool use)
+Claude non riceve più la tabella completa: chiama questi strumenti,
+che calcolano conteggi e aggregazioni in modo esatto e vettorizzato sul dataframe.
+Nessuna esecuzione di codice arbitrario: solo operazioni predefinite su colonne note.
+"""
+
+import json
+
+import pandas as pd
+
+from eventi.charts import CHART_INTENTS, create_chart_from_intent
+from eventi.claude_client import stream_message
+from eventi.filters import FilterError, compile_mask
+from eventi.vector_index import EventIndex
+
+MAX_ROWS = 50
+MAX_TOOL_TURNS = 8
+# Gruppo degli eventi senza data nelle dimensioni temporali (come partitions.UNDATED_KEY)
+UNDATED_LABEL = "senza data"
+
+# Colonne restituibili nei risultati (le colonne di audit restano escluse)
+RESULT_COLUMNS = ['DATA EVENTO', 'NOME EVENTO', 'CATEGORIA', 'A CHI CHIEDERE', 'LINK EVENTO', 'NOTE', 'TAG']
+
+# Dimensioni di raggruppamento ammesse -> funzione che produce la serie delle chiavi
+GROUP_DIMENSIONS = {
+    "categoria": lambda df: df['CATEGORIA'],
+    "contatto": lambda df: df['A CHI CHIEDERE'],
+    "tag": lambda df: _explode_tags(df['TAG']) if 'TAG' in df.columns else pd.Series(dtype=object),
+    "mese": lambda df: _date_key(df['DATA EVENTO'].dt.to_period('M').astype(str), df),
+    "anno": lambda df: _date_key(df['DATA EVENTO'].dt.year.astype('Int64').astype(str), df),
+    "giorno_settimana": lambda df: df['DATA EVENTO'].dt.day_name(),
+    "utente_inserimento": lambda df: df['USER INSERIMENTO'],
+}
+
+_FILTER_SCHEMA = {
+    "type": "object",
+    "description": "Filtri opzionali, combinati in AND",
+    "properties": {
+        "categorie": {"type": "array", "items": {"type": "string"}, "description": "Categorie ammesse (match esatto)"},
+        "contatti": {"type": "array", "items": {"type": "string"}, "description": "Contatti ammessi (case-insensitive)"},
+        "tag": {"type": "array", "items": {"type": "string"}, "description": "Almeno uno di questi tag"},
+        "testo": {"type": "string", "description": "Testo cercato in NOME EVENTO e NOTE"},
+        "data_da": {"type": "string", "description": "Data minima inclusa, formato YYYY-MM-DD"},
+        "data_a": {"type": "string", "description": "Data massima inclusa, formato YYYY-MM-DD"}
+    }
+}
+
+TOOL_DEFINITIONS = [
+    {
+        "name": "conta_eventi",
+        "description": "Conta gli eventi che soddisfano i filtri. Usalo per ogni domanda su totali o quantità.",
+        "input_schema": {
+            "type": "object",
+            "properties": {"filtri": _FILTER_SCHEMA}
+        }
+    },
+    {
+        "name": "filtra_eventi",
+        "description": f"Restituisce gli eventi che soddisfano i filtri (massimo {MAX_ROWS} righe) con il totale trovato.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "filtri": _FILTER_SCHEMA,
+                "ordina_per": {"type": "string", "enum": ['DATA EVENTO', 'NOME EVENTO', 'CATEGORIA', 'A CHI CHIEDERE']},
+                "decrescente": {"type": "boolean"},
+                "limite": {"type": "integer", "minimum": 1, "maximum": MAX_ROWS}
+            }
+        }
+    },
+    {
+        "name": "raggruppa_eventi",
+        "description": "Conta gli eventi raggruppati per una dimensione, ordinati per chiave (utile per trend e distribuzioni).",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "per": {"type": "string", "enum": list(GROUP_DIMENSIONS)},
+                "filtri": _FILTER_SCHEMA
+            },
+            "required": ["per"]
+        }
+    },
+    {
+        "name": "top_valori",
+        "description": "I k valori più frequenti di una dimensione (es. contatti più attivi, categorie più popolari).",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "per": {"type": "string", "enum": list(GROUP_DIMENSIONS)},
+                "k": {"type": "integer", "minimum": 1, "maximum": MAX_ROWS},
+                "filtri": _FILTER_SCHEMA
+            },
+            "required": ["per"]
+        }
+    },
+    {
+        "name": "eventi_in_finestra",
+        "description": "Eventi in una finestra di giorni rispetto a oggi: futuri (prossimi N giorni) o passati (ultimi N giorni).",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "giorni": {"type": "integer", "minimum": 1},
+                "direzione": {"type": "string", "enum": ["futuro", "passato"]},
+                "filtri": _FILTER_SCHEMA
+            },
+            "required": ["giorni", "direzione"]
+        }
+    },
+    {
+        "name": "ricerca_semantica",
+        "description": ("Eventi più pertinenti a un testo libero (argomento, tema, descrizione), ordinati per "
+                        "rilevanza: confronta il significato delle parole in nome, note e tag, non solo il testo "
+                        "esatto. Usalo per trovare eventi su un tema o eventi simili a uno dato."),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "testo": {"type": "string", "description": "Tema o descrizione da cercare"},
+                "k": {"type": "integer", "minimum": 1, "maximum": MAX_ROWS},
+                "filtri": _FILTER_SCHEMA
+            },
+            "required": ["testo"]
+        }
+    },
+    {
+        "name": "crea_grafico",
+        "description": "Mostra all'utente un grafico predefinito. Usalo quando l'utente chiede una visualizzazione.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "intent": {"type": "string", "enum": list(CHART_INTENTS)},
+                "filtri": _FILTER_SCHEMA
+            },
+            "required": ["intent"]
+        }
+    }
+]
+
+
+class ToolError(ValueError):
+    """Input non valido per uno strumento (restituito a Claude come errore)"""
+
+
+def _explode_tags(tags):
+    exploded = tags.dropna().astype(str).str.split(',').explode().str.strip()
+    return exploded[exploded != '']
+
+
+def _date_key(keys, df):
+    # "<NA>"/"NaT" non diventano un gruppo: gli eventi senza data hanno un'etichetta esplicita
+    return keys.where(df['DATA EVENTO'].notna(), UNDATED_LABEL)
+
+
+def build_filter_mask(df, filtri):
+    """Combina i filtri in un'unica maschera booleana (stessa semantica delle pagine, vedi eventi.filters)"""
+    try:
+        return pd.Series(compile_mask(df, filtri), index=df.index)
+    except FilterError as e:
+        raise ToolError(str(e)) from e
+
+
+def _records(df):
+    cols = [c for c in RESULT_COLUMNS if c in df.columns]
+    out = df[cols].copy()
+    if 'DATA EVENTO' in out.columns:
+        out['DATA EVENTO'] = out['DATA EVENTO'].dt.strftime('%Y-%m-%d')
+    return out.astype(object).where(out.notna(), None).to_dict(orient='records')
+
+
+def _group_keys(df, per):
+    if per not in GROUP_DIMENSIONS:
+        raise ToolError(f"Dimensione non supportata: {per}")
+    return GROUP_DIMENSIONS[per](df)
+
+
+def _tool_conta(df, args):
+    mask = build_filter_mask(df, args.get("filtri"))
+    return {"conteggio": int(mask.sum())}
+
+
+def _tool_filtra(df, args):
+    mask = build_filter_mask(df, args.get("filtri"))
+    limite = min(int(args.get("limite") or MAX_ROWS), MAX_ROWS)
+    ordina_per = args.get("ordina_per") or 'DATA EVENTO'
+    if ordina_per not in df.columns:
+        raise ToolError(f"Colonna di ordinamento non valida: {ordina_per}")
+    df_sel = df[mask].sort_values(ordina_per, ascending=not args.get("decrescente", False))
+    return {"totale": int(mask.sum()), "mostrati": min(limite, len(df_sel)), "eventi": _records(df_sel.head(limite))}
+
+
+def _tool_raggruppa(df, args):
+    df_sel = df[build_filter_mask(df, args.get("filtri"))]
+    counts = _group_keys(df_sel, args["per"]).value_counts().sort_index()
+    return {"per": args["per"], "gruppi": {str(k): int(v) for k, v in counts.items()}}
+
+
+def _tool_top(df, args):
+    df_sel = df[build_filter_mask(df, args.get("filtri"))]
+    k = min(int(args.get("k") or 10), MAX_ROWS)
+    counts = _group_keys(df_sel, args["per"]).value_counts().head(k)
+    return {"per": args["per"], "top": [{"valore": str(v), "eventi": int(c)} for v, c in counts.items()]}
+
+
+def _tool_finestra(df, args):
+    giorni = int(args["giorni"])
+    now = pd.Timestamp.now()
+    if args["direzione"] == "futuro":
+        window = (df['DATA EVENTO'] >= now) & (df['DATA EVENTO'] <= now + pd.Timedelta(days=giorni))
+    elif args["direzione"] == "passato":
+        window = (df['DATA EVENTO'] < now) & (df['DATA EVENTO'] >= now - pd.Timedelta(days=giorni))
+    else:
+        raise ToolError(f"Direzione non valida: {args['direzione']}")
+    mask = window & build_filter_mask(df, args.get("filtri"))
+    df_sel = df[mask].sort_values('DATA EVENTO')
+    return {
+        "da": (now if args["direzione"] == "futuro" else now - pd.Timedelta(days=giorni)).strftime('%Y-%m-%d'),
+        "a": (now + pd.Timedelta(days=giorni) if args["direzione"] == "futuro" else now).strftime('%Y-%m-%d'),
+        "totale": int(mask.sum()),
+        "eventi": _records(df_sel.head(MAX_ROWS))
+    }
+
+
+def _tool_semantica(df, args, index):
+    testo = (args.get("testo") or "").strip()
+    if not testo:
+        raise ToolError("Testo da cercare mancante")
+    if index is None:
+        # Senza indice condiviso (es. report, test): indice temporaneo sul dataframe
+        index = EventIndex()
+        index.sync(df)
+    df_sel = df[build_filter_mask(df, args.get("filtri"))]
+    k = min(int(args.get("k") or 10), MAX_ROWS)
+    results = index.search(df_sel, testo, k=k)
+    eventi = _records(results)
+    for record, score in zip(eventi, results['RILEVANZA']):
+        record['RILEVANZA'] = float(score)
+    return {"testo": testo, "trovati": len(eventi), "eventi": eventi}
+
+
+_EXECUTORS = {
+    "conta_eventi": _tool_conta,
+    "filtra_eventi": _tool_filtra,
+    "raggruppa_eventi": _tool_raggruppa,
+    "top_valori": _tool_top,
+    "eventi_in_finestra": _tool_finestra,
+}
+
+
+def execute_tool(df, name, args, charts, index=None):
+    """
+    Esegue uno strumento e ritorna (contenuto_json, is_error).
+    I grafici richiesti vengono aggiunti a `charts` come spec {intent, filtri}.
+    `index` è l'indice dei testi (EventIndex) allineato a `df`, per ricerca_semantica.
+    """
+    try:
+        if name == "ricerca_semantica":
+            result = _tool_semantica(df, args, index)
+        elif name == "crea_grafico":
+            intent = args.get("intent")
+            df_sel = df[build_filter_mask(df, args.get("filtri"))]
+            fig, msg = create_chart_from_intent(df_sel, intent)
+            if fig is None:
+                raise ToolError(msg)
+            charts.append({"intent": intent, "filtri": args.get("filtri") or {}})
+            result = {"esito": "Grafico mostrato all'utente", "intent": intent, "eventi_considerati": len(df_sel)}
+        elif name in _EXECUTORS:
+            result = _EXECUTORS[name](df, args)
+        else:
+            raise ToolError(f"Strumento sconosciuto: {name}")
+        return json.dumps(result, ensure_ascii=False, default=str), False
+    except (ToolError, KeyError, TypeError, ValueError) as e:
+        return json.dumps({"errore": str(e)}, ensure_ascii=False), True
+
+
+def build_chart(df, spec):
+    """Ricostruisce un grafico da una spec prodotta dallo strumento crea_grafico"""
+    df_sel = df[build_filter_mask(df, spec.get("filtri"))]
+    return create_chart_from_intent(df_sel, spec["intent"])
+
+
+def describe_dataset(df):
+    """Descrizione compatta dello schema da mettere nel prompt al posto della tabella"""
+    lines = [f"Eventi totali: {len(df):,}", f"Colonne: {', '.join(df.columns)}"]
+    if 'CATEGORIA' in df.columns:
+        lines.append("Categorie: " + "; ".join(sorted(df['CATEGORIA'].dropna().astype(str).unique())))
+    if 'DATA EVENTO' in df.columns and df['DATA EVENTO'].notna().any():
+        lines.append(
+            f"Date eventi: dal {df['DATA EVENTO'].min():%Y-%m-%d} al {df['DATA EVENTO'].max():%Y-%m-%d}"
+        )
+    lines.append(f"Oggi: {pd.Timestamp.now():%Y-%m-%d}")
+    return "\n".join(lines)
+
+
+def run_tool_conversation(client, df, model, system, messages, max_tokens=4096, max_turns=MAX_TOOL_TURNS,
+                          on_text=None, metrics=None, scheduler=None, on_retry=None, index=None):
+    """
+    Ciclo di tool use: chiama Claude, esegue gli strumenti richiesti e
+    ripete finché il modello non produce la risposta finale.
+    Ritorna (testo_risposta, spec_grafici, lista_response).
+    """
+    messages = list(messages)
+    charts = []
+    responses = []
+
+    for _ in range(max_turns):
+        response = stream_message(
+            client,
+            on_text=on_text,
+            metrics=metrics,
+            scheduler=scheduler,
+            on_retry=on_retry,
+            model=model,
+            max_tokens=max_tokens,
+            temperature=0,
+            system=system,
+            tools=TOOL_DEFINITIONS,
+            messages=messages
+        )
+        responses.append(response)
+
+        if response.stop_reason != "tool_use":
+            text = "".join(block.text for block in response.content if block.type == "text")
+            return text, charts, responses
+
+        messages.append({"role": "assistant", "content": response.content})
+        tool_results = []
+        for block in response.content:
+            if block.type != "tool_use":
+                continue
+            content, is_error = execute_tool(df, block.name, block.input or {}, charts, index=index)
+            tool_results.append({
+                "type": "tool_result",
+                "tool_use_id": block.id,
+                "content": content,
+                "is_error": is_error
+            })
+        messages.append({"role": "user", "content": tool_results})
+
+    return "⚠️ Analisi interrotta: troppe chiamate agli strumenti. Prova a riformulare la domanda.", charts, responses
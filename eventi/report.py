@@ -0,0 +1,127 @@
+"""
+Report Insights da riga di comando, senza Streamlit
+Calcola le stesse tabelle del tab Insights (trend, affinità, crescita, opportunità,
+tag) con eventi.core e le scrive in HTML (tabelle + grafici), CSV o Parquet.
+
+Esempio (dalla cartella del progetto):
+    python -m eventi.report --formats html csv --out report_eventi
+    python -m eventi.report --file .eventi_cache/dati_sintetici/eventi_1M.parquet --formats parquet
+"""
+
+import argparse
+import html
+import os
+import time
+from datetime import datetime
+
+from eventi.core import EXCEL_FILE, filter_events, insights_report, load_events
+
+REPORT_FORMATS = ("html", "csv", "parquet")
+
+TITOLI = {
+    "trend_mensile": "📈 Eventi per mese",
+    "giorni_settimana": "📅 Eventi per giorno della settimana",
+    "affinita": "🤝 Contatti più attivi per categoria",
+    "crescita_categorie": "🚀 Categorie: ultimi 3 mesi vs 3 mesi precedenti",
+    "contatti_poco_attivi": "🎯 Contatti con 1-2 eventi",
+    "categorie_sotto_media": "⚖️ Categorie sotto la media",
+    "tag": "🏷️ Top 10 tag",
+}
+
+
+def _figures(report):
+    """Grafici del report (stessi del tab Insights), per nome di tabella"""
+    import plotly.express as px
+
+    figures = {
+        "trend_mensile": px.line(report["trend_mensile"], x='Mese', y='Numero Eventi', markers=True),
+        "giorni_settimana": px.bar(report["giorni_settimana"], x='Giorno', y='Numero Eventi'),
+        "tag": px.bar(report["tag"], x='Frequenza', y='Tag', orientation='h'),
+    }
+    affinita = report["affinita"].set_index('A CHI CHIEDERE')
+    if not affinita.empty:
+        figures["affinita"] = px.imshow(affinita, color_continuous_scale='Blues', text_auto=True, aspect='auto')
+    return figures
+
+
+def write_html(report, path, title, subtitle=""):
+    figures = _figures(report)
+    parts = [
+        "<!DOCTYPE html><html lang='it'><head><meta charset='utf-8'>",
+        f"<title>{html.escape(title)}</title>",
+        "<style>body{font-family:sans-serif;max-width:1100px;margin:2rem auto;color:#2c3e50}"
+        "table{border-collapse:collapse;margin:0.5rem 0 1.5rem}td,th{border:1px solid #ddd;padding:4px 8px}"
+        "th{background:#f8f9fa}</style></head><body>",
+        f"<h1>{html.escape(title)}</h1><p>{html.escape(subtitle)}</p>",
+    ]
+    include_js = "cdn"
+    for name, table in report.items():
+        parts.append(f"<h2>{html.escape(TITOLI.get(name, name))}</h2>")
+        if name in figures:
+            parts.append(figures[name].to_html(full_html=False, include_plotlyjs=include_js))
+            include_js = False  # plotly.js una sola volta per pagina
+        parts.append(table.to_html(index=False, na_rep="", border=0))
+    parts.append("</body></html>")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+    return [path]
+
+
+def write_tables(report, directory, fmt):
+    """Una tabella per file (CSV o Parquet)"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, table in report.items():
+        path = os.path.join(directory, f"{name}.{fmt}")
+        if fmt == "csv":
+            table.to_csv(path, index=False)
+        else:
+            table.columns = [str(col) for col in table.columns]
+            table.to_parquet(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def generate_report(path=EXCEL_FILE, out="report_eventi", formats=("html",), filtri=None, now=None):
+    """Carica, filtra e scrive il report nei formati richiesti; ritorna i file scritti"""
+    df = load_events(path)
+    if filtri:
+        df = filter_events(df, filtri, now, sort_by=None)
+    report = insights_report(df, now)
+    os.makedirs(out, exist_ok=True)
+    subtitle = f"{len(df):,} eventi da {os.path.basename(path)} · generato il {datetime.now():%d/%m/%Y %H:%M}"
+    written = []
+    for fmt in formats:
+        if fmt == "html":
+            written += write_html(report, os.path.join(out, "insights.html"), "📊 Insights Eventi", subtitle)
+        else:
+            written += write_tables(report, os.path.join(out, fmt), fmt)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report Insights degli eventi (HTML, CSV, Parquet)")
+    parser.add_argument("--file", default=EXCEL_FILE, help="xlsx, csv, parquet o feather")
+    parser.add_argument("--out", default="report_eventi")
+    parser.add_argument("--formats", nargs="+", choices=REPORT_FORMATS, default=["html"])
+    parser.add_argument("--categorie", nargs="+", default=None)
+    parser.add_argument("--contatti", nargs="+", default=None)
+    parser.add_argument("--data-da", default=None, help="YYYY-MM-DD")
+    parser.add_argument("--data-a", default=None, help="YYYY-MM-DD")
+    args = parser.parse_args(argv)
+
+    filtri = {
+        "categorie": args.categorie,
+        "contatti": args.contatti,
+        "data_da": args.data_da,
+        "data_a": args.data_a,
+    }
+    start = time.perf_counter()
+    written = generate_report(args.file, args.out, args.formats, {k: v for k, v in filtri.items() if v})
+    for path in written:
+        print(path)
+    print(f"Report generato in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Cache persistente delle risposte della chat
+Evita chiamate API ripetute per la stessa domanda sugli stessi dati.
+Le risposte sono salvate compresse su disco (SQLite) con eviction LRU e TTL.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:  # zstandard è opzionale, fallback su zlib
+    zstandard = None
+
+CACHE_DIR = ".eventi_cache"
+CACHE_FILE = os.path.join(CACHE_DIR, "risposte_chat.sqlite3")
+
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+# Prefisso che identifica l'algoritmo di compressione del blob salvato
+_CODEC_ZSTD = b"Z"
+_CODEC_ZLIB = b"D"
+
+
+def normalize_question(question):
+    """Normalizza la domanda: minuscole, spazi compattati, punteggiatura finale rimossa"""
+    text = unicodedata.normalize("NFKC", question or "").lower().strip()
+    text = re.sub(r"\s+", " ", text)
+    return text.rstrip(" ?!.;:")
+
+
+def compress_blob(data):
+    """Comprime con zstandard (o zlib) anteponendo il codice del codec"""
+    if zstandard is not None:
+        return _CODEC_ZSTD + zstandard.ZstdCompressor(level=6).compress(data)
+    return _CODEC_ZLIB + zlib.compress(data, 6)
+
+
+def decompress_blob(blob):
+    """Inverso di compress_blob"""
+    codec, payload = blob[:1], blob[1:]
+    if codec == _CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Voce compressa con zstandard ma il modulo non è installato")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return zlib.decompress(payload)
+
+
+class ResponseCache:
+    """
+    Cache su disco delle risposte, chiave = (domanda normalizzata, fingerprint dati, modello).
+    Il parametro opzionale `context` distingue le domande fatte dentro una conversazione.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS risposte (
+                    chiave TEXT PRIMARY KEY,
+                    valore BLOB NOT NULL,
+                    creato REAL NOT NULL,
+                    ultimo_accesso REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_accesso ON risposte(ultimo_accesso)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(question, fingerprint, model, context=""):
+        """Costruisce la chiave di cache a partire dai suoi componenti"""
+        raw = "\x1f".join([normalize_question(question), fingerprint, model, context])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, question, fingerprint, model, context=""):
+        """Ritorna il valore salvato o None se assente/scaduto"""
+        key = self.make_key(question, fingerprint, model, context)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT valore, creato FROM risposte WHERE chiave = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            valore, creato = row
+            if self.ttl_seconds and now - creato > self.ttl_seconds:
+                conn.execute("DELETE FROM risposte WHERE chiave = ?", (key,))
+                self.misses += 1
+                return None
+            conn.execute("UPDATE risposte SET ultimo_accesso = ? WHERE chiave = ?", (now, key))
+        try:
+            value = json.loads(decompress_blob(valore).decode("utf-8"))
+        except (ValueError, zlib.error):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, question, fingerprint, model, value, context=""):
+        """Salva un valore serializzabile JSON e applica l'eviction"""
+        key = self.make_key(question, fingerprint, model, context)
+        blob = compress_blob(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO risposte (chiave, valore, creato, ultimo_accesso) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(blob), now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM risposte WHERE creato < ?", (now - self.ttl_seconds,))
+        if self.max_entries:
+            conn.execute("""
+                DELETE FROM risposte WHERE chiave IN (
+                    SELECT chiave FROM risposte ORDER BY ultimo_accesso DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def clear(self):
+        """Svuota completamente la cache"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM risposte")
+
+    def stats(self):
+        """Numero di voci, dimensione compressa e hit/miss della sessione"""
+        with self._lock, self._connect() as conn:
+            count, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(valore)), 0) FROM risposte"
+            ).fetchone()
+        return {"voci": count, "bytes": size, "hits": self.hits, "misses": self.misses}
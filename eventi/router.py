@@ -0,0 +1,108 @@
+"""
+Instradamento delle domande tra modelli (model tiering)
+Le domande di consultazione semplici vanno a un modello veloce con max_tokens ridotto,
+quelle di analisi (o con molto contesto) al modello più grande.
+"""
+
+import os
+import re
+
+from eventi.response_cache import normalize_question
+
+TIER_AUTO = "auto"
+TIER_FAST = "veloce"
+TIER_LARGE = "avanzato"
+
+DEFAULT_FAST_MODEL = "claude-3-5-haiku-20241022"
+DEFAULT_LARGE_MODEL = "claude-sonnet-4-20250514"
+DEFAULT_FAST_MAX_TOKENS = 1024
+DEFAULT_LARGE_MAX_TOKENS = 4096
+
+# Oltre queste soglie la domanda va comunque al modello grande
+MAX_FAST_CONTEXT_ROWS = 500
+MAX_FAST_WORDS = 20
+MAX_FAST_HISTORY_TURNS = 3
+
+# Parole che indicano ragionamento, confronto o sintesi (italiano e inglese)
+_ANALYSIS_WORDS = re.compile(
+    r"\b(analizz\w*|perch[eé]|confront\w*|correla\w*|affinit\w*|trend|andament\w*|"
+    r"suggeri\w*|consigli\w*|previs\w*|prevedi|strateg\w*|insight|opportunit\w*|pattern|"
+    r"spiega\w*|valuta\w*|sintetizz\w*|riassum\w*|relazion\w*|sinergi\w*|"
+    r"analy[sz]\w*|why|compare|comparison|correlat\w*|suggest\w*|recommend\w*|predict\w*|"
+    r"forecast\w*|explain\w*|summari[sz]\w*|evaluate|strategy|relationship\w*)\b"
+)
+
+# Domande di consultazione: chi/quando/quale/quanti/elenca...
+_LOOKUP_WORDS = re.compile(
+    r"^(chi|quando|quale|quali|quanti|quante|dove|elenca|mostra|dammi|trova|cerca|c'è|ci sono|"
+    r"who|when|which|what|how many|list|show|find|is there|are there)\b"
+)
+
+
+class ModelTier:
+    """Modello scelto per una richiesta e motivazione della scelta"""
+
+    def __init__(self, name, model, max_tokens, reason):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.reason = reason
+
+    def __repr__(self):
+        return f"ModelTier({self.name!r}, {self.model!r}, max_tokens={self.max_tokens})"
+
+
+class ModelRouter:
+    """Stima la complessità della domanda e sceglie il modello"""
+
+    def __init__(self, fast_model=DEFAULT_FAST_MODEL, large_model=DEFAULT_LARGE_MODEL,
+                 fast_max_tokens=DEFAULT_FAST_MAX_TOKENS, large_max_tokens=DEFAULT_LARGE_MAX_TOKENS):
+        self.fast_model = fast_model
+        self.large_model = large_model
+        self.fast_max_tokens = fast_max_tokens
+        self.large_max_tokens = large_max_tokens
+
+    @classmethod
+    def from_config(cls, config=None):
+        """Modelli e limiti da configurazione (es. st.secrets) o variabili d'ambiente"""
+        config = config or {}
+
+        def value(name, default):
+            return config.get(name) or os.environ.get(name) or default
+
+        return cls(
+            fast_model=value("CLAUDE_FAST_MODEL", DEFAULT_FAST_MODEL),
+            large_model=value("CLAUDE_LARGE_MODEL", DEFAULT_LARGE_MODEL),
+            fast_max_tokens=int(value("CLAUDE_FAST_MAX_TOKENS", DEFAULT_FAST_MAX_TOKENS)),
+            large_max_tokens=int(value("CLAUDE_LARGE_MAX_TOKENS", DEFAULT_LARGE_MAX_TOKENS))
+        )
+
+    def fast(self, reason):
+        return ModelTier(TIER_FAST, self.fast_model, self.fast_max_tokens, reason)
+
+    def large(self, reason):
+        return ModelTier(TIER_LARGE, self.large_model, self.large_max_tokens, reason)
+
+    def route(self, question, context_rows=0, history_turns=0, preference=TIER_AUTO):
+        """
+        Sceglie il modello per la domanda.
+        `context_rows` = righe del dataset inviate nel prompt (0 in modalità strumenti),
+        `history_turns` = turni di conversazione inclusi.
+        """
+        if preference == TIER_FAST:
+            return self.fast("scelto manualmente")
+        if preference == TIER_LARGE:
+            return self.large("scelto manualmente")
+
+        text = normalize_question(question)
+        if _ANALYSIS_WORDS.search(text):
+            return self.large("domanda di analisi")
+        if context_rows > MAX_FAST_CONTEXT_ROWS:
+            return self.large(f"contesto ampio ({context_rows:,} righe)")
+        if history_turns > MAX_FAST_HISTORY_TURNS:
+            return self.large("conversazione lunga")
+        if len(text.split()) > MAX_FAST_WORDS:
+            return self.large("domanda articolata")
+        if _LOOKUP_WORDS.search(text):
+            return self.fast("consultazione semplice")
+        return self.large("domanda non classificata")
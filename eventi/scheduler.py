@@ -0,0 +1,251 @@
+"""
+Scheduler condiviso delle richieste all'API Claude
+- token bucket dimensionati sui limiti dell'organizzazione (richieste/minuto e token/minuto)
+- retry con backoff esponenziale e jitter (tenacity), rispettando l'header retry-after
+- coda equa tra le sessioni: a parità di attesa passa la sessione servita meno di recente
+Così sotto carico le risposte rallentano gradualmente invece di fallire.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+DEFAULT_RPM = 50
+DEFAULT_TPM = 30_000
+DEFAULT_MAX_ATTEMPTS = 5
+MAX_BACKOFF_SECONDS = 60
+# Quota del bucket dei token per una singola richiesta: chi dimensiona i prompt (blocchi
+# della map-reduce, prompt unico) resta sotto, così attende solo il bucket parziale
+REQUEST_TOKEN_SHARE = 0.8
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `capacity` unità, ricaricate in un minuto"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.available = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        """Secondi da attendere prima di poter consumare `amount` (0 se subito)"""
+        self._refill(now)
+        # Richieste più grandi della capacità passano a bucket pieno (andando in debito)
+        needed = min(amount, self.capacity)
+        if self.available >= needed:
+            return 0.0
+        return (needed - self.available) / self.rate
+
+    def consume(self, amount):
+        self.available -= amount
+
+    def refund(self, amount):
+        self.available = min(self.capacity, self.available + amount)
+
+
+def is_retryable(exc):
+    """Errori temporanei: rate limit, sovraccarico, errori di rete e 5xx"""
+    import anthropic  # import pesante: caricato solo quando una richiesta fallisce
+
+    if isinstance(exc, (anthropic.APIConnectionError, anthropic.RateLimitError, anthropic.InternalServerError)):
+        return True
+    if isinstance(exc, anthropic.APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS
+    return False
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _WaitWithRetryAfter:
+    """Backoff esponenziale con jitter, mai inferiore al retry-after indicato dal server"""
+
+    def __init__(self, max_wait=MAX_BACKOFF_SECONDS):
+        self._exponential = wait_random_exponential(multiplier=1, max=max_wait)
+
+    def __call__(self, retry_state):
+        wait = self._exponential(retry_state)
+        retry_after = _retry_after(retry_state.outcome.exception())
+        return max(wait, retry_after) if retry_after else wait
+
+
+def estimate_request_tokens(kwargs):
+    """Stima dei token di input di una richiesta Messages (circa 4 caratteri per token)"""
+    system = kwargs.get("system") or ""
+    chars = len(system) if isinstance(system, str) else sum(len(b.get("text", "")) for b in system)
+    chars += len(json.dumps(kwargs.get("messages", []), default=str, ensure_ascii=False))
+    if kwargs.get("tools"):
+        chars += len(json.dumps(kwargs["tools"], ensure_ascii=False))
+    return chars // 4 + 1
+
+
+class RequestScheduler:
+    """Scheduler di processo condiviso da tutte le sessioni della chat"""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_attempts = max_attempts
+        self._cond = threading.Condition()
+        self._waiting = []  # (seq, session_id)
+        self._last_served = {}
+        self._seq = itertools.count()
+        self.total_waited = 0.0
+        self.total_retries = 0
+
+    @classmethod
+    def from_config(cls, config=None):
+        """Limiti da configurazione (es. st.secrets) o variabili d'ambiente"""
+        config = config or {}
+
+        def value(name, default):
+            return int(config.get(name) or os.environ.get(name) or default)
+
+        return cls(
+            rpm=value("ANTHROPIC_RPM", DEFAULT_RPM),
+            tpm=value("ANTHROPIC_TPM", DEFAULT_TPM),
+            max_attempts=value("ANTHROPIC_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+        )
+
+    def request_token_limit(self):
+        """Token di input massimi per richiesta senza mandare in debito il bucket"""
+        return int(self.tokens.capacity * REQUEST_TOKEN_SHARE)
+
+    def _next_ticket(self):
+        # Tra i ticket in attesa vince la sessione servita meno di recente (FIFO a parità)
+        return min(self._waiting, key=lambda t: (self._last_served.get(t[1], 0.0), t[0]))
+
+    def acquire(self, session_id, estimated_tokens):
+        """Blocca finché la richiesta può partire rispettando limiti ed equità"""
+        start = time.monotonic()
+        with self._cond:
+            ticket = (next(self._seq), session_id)
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    if self._next_ticket() == ticket:
+                        now = time.monotonic()
+                        wait = max(
+                            self.requests.wait_time(1, now),
+                            self.tokens.wait_time(estimated_tokens, now)
+                        )
+                        if wait <= 0:
+                            self.requests.consume(1)
+                            self.tokens.consume(estimated_tokens)
+                            self._last_served[session_id] = now
+                            break
+                        self._cond.wait(timeout=wait)
+                    else:
+                        self._cond.wait(timeout=1.0)
+            finally:
+                self._waiting.remove(ticket)
+                if not any(waiting[1] == session_id for waiting in self._waiting):
+                    # Nessun'altra richiesta della sessione in coda: al ritorno conta come mai servita
+                    self._last_served.pop(session_id, None)
+                self._cond.notify_all()
+        self.total_waited += time.monotonic() - start
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Corregge il bucket dei token con l'usage reale della risposta"""
+        with self._cond:
+            if actual_tokens < estimated_tokens:
+                self.tokens.refund(estimated_tokens - actual_tokens)
+            else:
+                self.tokens.consume(actual_tokens - estimated_tokens)
+            self._cond.notify_all()
+
+    def penalize(self, seconds):
+        """Dopo un 429 svuota i bucket per `seconds`, così anche le altre sessioni rallentano"""
+        with self._cond:
+            self.requests.available = min(self.requests.available, -self.requests.rate * seconds)
+            self.tokens.available = min(self.tokens.available, -self.tokens.rate * seconds)
+
+    def session(self, session_id):
+        return SessionScheduler(self, session_id)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "in_coda": len(self._waiting),
+                "richieste_disponibili": max(0, int(self.requests.available)),
+                "token_disponibili": max(0, int(self.tokens.available)),
+                "attesa_totale_s": round(self.total_waited, 1),
+                "retry_totali": self.total_retries
+            }
+
+
+class SessionScheduler:
+    """Vista dello scheduler per una sessione: esegue chiamate con coda e retry"""
+
+    def __init__(self, scheduler, session_id):
+        self.scheduler = scheduler
+        self.session_id = session_id
+
+    def request_token_limit(self):
+        return self.scheduler.request_token_limit()
+
+    def _before_attempt(self, kwargs):
+        estimated = estimate_request_tokens(kwargs)
+        self.scheduler.acquire(self.session_id, estimated)
+        return estimated
+
+    def _after_response(self, estimated, response):
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.scheduler.settle(estimated, getattr(usage, "input_tokens", 0) or 0)
+
+    def _on_retry(self, retry_state, on_retry):
+        self.scheduler.total_retries += 1
+        exc = retry_state.outcome.exception()
+        import anthropic
+
+        if isinstance(exc, anthropic.RateLimitError):
+            self.scheduler.penalize(_retry_after(exc) or 1.0)
+        if on_retry is not None:
+            on_retry(retry_state.attempt_number, exc)
+
+    def _retry_kwargs(self, on_retry):
+        return dict(
+            stop=stop_after_attempt(self.scheduler.max_attempts),
+            wait=_WaitWithRetryAfter(),
+            retry=retry_if_exception(is_retryable),
+            before_sleep=lambda state: self._on_retry(state, on_retry),
+            reraise=True
+        )
+
+    def run(self, fn, request_kwargs, on_retry=None):
+        """Esegue fn(**request_kwargs) passando dallo scheduler, con retry"""
+        for attempt in Retrying(**self._retry_kwargs(on_retry)):
+            with attempt:
+                estimated = self._before_attempt(request_kwargs)
+                response = fn(**request_kwargs)
+                self._after_response(estimated, response)
+        return response
+
+    async def run_async(self, fn, request_kwargs, on_retry=None):
+        """Come run, per coroutine (l'attesa in coda avviene in un thread)"""
+        async for attempt in AsyncRetrying(**self._retry_kwargs(on_retry)):
+            with attempt:
+                estimated = await asyncio.to_thread(self._before_attempt, request_kwargs)
+                response = await fn(**request_kwargs)
+                self._after_response(estimated, response)
+        return response
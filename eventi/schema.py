@@ -0,0 +1,21 @@
+"""
+Schema del dataset eventi (colonne e categorie) condiviso da pagine e moduli
+"""
+
+CATEGORIE = [
+    'EVENTI sociali/politici/economici',
+    'EVENTI delle organizzazioni',
+    'EVENTI che interessano a logotel',
+    'EVENTI di logotel che farà'
+]
+
+COLUMNS = [
+    'DATA EVENTO', 'NOME EVENTO', 'LINK EVENTO', 'A CHI CHIEDERE', 'CATEGORIA',
+    'USER INSERIMENTO', 'TIMESTAMP INSERIMENTO', 'USER MODIFICA', 'TIMESTAMP MODIFICA',
+    'NOTE', 'TAG'
+]
+
+DATE_COLUMNS = ['DATA EVENTO', 'TIMESTAMP INSERIMENTO', 'TIMESTAMP MODIFICA']
+
+# Identificativo stabile della riga, assegnato alla prima modifica (vedi eventi.changelog)
+ID_COLUMN = 'ID EVENTO'
@@ -0,0 +1,99 @@
+"""
+Statistiche del file dati in un piccolo JSON accanto al workbook (sidecar)
+Scritto a ogni salvataggio: la home mostra i suoi indicatori leggendo il sidecar,
+senza importare pandas né aprire il file Excel; le pagine ne ricavano anche i nomi
+canonici dei contatti senza caricare tutti gli eventi. Il sidecar vale solo per il file
+da cui è stato calcolato (dimensione e data di modifica): se il file è cambiato
+altrove la home lo ricalcola una volta.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+from eventi.fingerprint import file_signature
+
+SIDECAR_SUFFIX = ".stats.json"
+SIDECAR_VERSION = 2
+
+
+def sidecar_path(path):
+    return f"{path}{SIDECAR_SUFFIX}"
+
+
+def compute_stats(df):
+    """Indicatori della home; le date evento come conteggi per giorno (i "prossimi" cambiano ogni giorno)"""
+    stats = {
+        "totale": int(len(df)),
+        "categorie": int(df['CATEGORIA'].nunique()) if 'CATEGORIA' in df.columns else None,
+        "contatti": int(df['A CHI CHIEDERE'].nunique()) if 'A CHI CHIEDERE' in df.columns else None,
+        "date_evento": None,
+        # Eventi per contatto così come scritto: bastano per i nomi canonici (eventi.contacts)
+        "conteggi_contatti": (
+            {str(name): int(n) for name, n in df['A CHI CHIEDERE'].value_counts().items()}
+            if 'A CHI CHIEDERE' in df.columns else None
+        )
+    }
+    if 'DATA EVENTO' in df.columns:
+        import pandas as pd
+
+        # Dopo un inserimento la colonna mescola Timestamp e date del form
+        counts = pd.to_datetime(df['DATA EVENTO'], errors='coerce').dropna().value_counts()
+        stats["date_evento"] = {ts.isoformat(): int(n) for ts, n in sorted(counts.items())}
+    return stats
+
+
+def write_sidecar(df, path, signature=None):
+    """Da chiamare subito dopo aver scritto `path` con il contenuto di `df`
+    (o con la firma del file presa quando `df` è stato letto)"""
+    sidecar = {
+        "versione": SIDECAR_VERSION,
+        "file": os.path.basename(path),
+        **(signature or file_signature(path)),
+        "aggiornato": datetime.now().isoformat(timespec="seconds"),
+        **compute_stats(df)
+    }
+    target = sidecar_path(path)
+    tmp = f"{target}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(sidecar, f, ensure_ascii=False)
+    os.replace(tmp, target)
+    return sidecar
+
+
+def read_sidecar(path):
+    """Sidecar valido per il file attuale, altrimenti None"""
+    try:
+        with open(sidecar_path(path), encoding="utf-8") as f:
+            sidecar = json.load(f)
+        signature = file_signature(path)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if sidecar.get("versione") != SIDECAR_VERSION:
+        return None
+    if any(sidecar.get(key) != value for key, value in signature.items()):
+        return None
+    return sidecar
+
+
+def refresh_sidecar(path):
+    """Ricalcola il sidecar leggendo il file (unico caso in cui serve pandas)"""
+    from eventi.core import load_events_consistent
+
+    df, signature, _ = load_events_consistent(path)
+    return write_sidecar(df, path, signature)
+
+
+def load_stats(path):
+    """Statistiche del file: dal sidecar se aggiornato, altrimenti ricalcolate"""
+    return read_sidecar(path) or refresh_sidecar(path)
+
+
+def upcoming_events(stats, now=None, days=None):
+    """Eventi con data da `now` in poi (entro `days` giorni se indicato), dai conteggi per giorno del sidecar"""
+    if stats.get("date_evento") is None:
+        return None
+    now = now or datetime.now()
+    until = now + timedelta(days=days) if days is not None else None
+    return sum(n for day, n in stats["date_evento"].items()
+               if datetime.fromisoformat(day) >= now and (until is None or datetime.fromisoformat(day) <= until))
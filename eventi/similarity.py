@@ -0,0 +1,153 @@
+"""
+Similarità tra contatti (tab Affinità): chi lavora su temi simili
+Ogni contatto è un vettore sparso di caratteristiche (categorie, tag, mesi degli
+eventi), pesate TF-IDF: conta di più ciò che accomuna pochi contatti. Ogni gruppo
+di caratteristiche è normalizzato a parte, così categorie, tag e periodo pesano
+allo stesso modo. La similarità è il coseno tra i vettori; per ogni contatto si
+tengono i `top_k` più simili, calcolati a blocchi di righe (memoria limitata
+anche con migliaia di contatti). L'indice si costruisce una volta per versione
+dei dati, le richieste successive sono una lettura.
+
+Con scipy installato la matrice resta sparsa (CSR), altrimenti si usa numpy denso
+(le caratteristiche sono poche centinaia).
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy import sparse
+except ImportError:  # scipy è opzionale, fallback su numpy denso
+    sparse = None
+
+DEFAULT_TOP_K = 20
+BLOCK_ROWS = 1024
+
+
+def _has_contact(df):
+    # Senza contatto la riga non va a nessuno (astype(str) ne farebbe il contatto "<NA>" o "nan")
+    contatti = df['A CHI CHIEDERE']
+    return contatti.notna().to_numpy() & (contatti.astype(str).str.strip() != "").to_numpy()
+
+
+def _feature_triplets(df):
+    """(contatto, caratteristica, conteggio) per ogni gruppo di caratteristiche"""
+    df = df[_has_contact(df)]
+    contatti = df['A CHI CHIEDERE'].astype(str).str.strip()
+    dates = pd.to_datetime(df['DATA EVENTO'], errors='coerce')
+    groups = {
+        "categoria": df['CATEGORIA'].astype(str),
+        "mese": dates.dt.strftime('%Y-%m'),
+    }
+    frames = [
+        pd.DataFrame({"contatto": contatti, "caratteristica": values, "gruppo": group}).dropna()
+        for group, values in groups.items()
+    ]
+    if 'TAG' in df.columns:
+        tags = df['TAG'].dropna().astype(str).str.lower().str.split(',').explode().str.strip()
+        tags = tags[tags != '']
+        frames.append(pd.DataFrame({"contatto": contatti.loc[tags.index].values, "caratteristica": tags.values,
+                                    "gruppo": "tag"}))
+    triplets = pd.concat(frames, ignore_index=True)
+    triplets["caratteristica"] = triplets["gruppo"] + ":" + triplets["caratteristica"]
+    return triplets.groupby(["contatto", "caratteristica", "gruppo"], sort=False).size().reset_index(name="conteggio")
+
+
+class ContactSimilarity:
+    """Vettori dei contatti e, per ciascuno, i contatti più simili (indici e punteggi)"""
+
+    def __init__(self, contacts, features, matrix, top_index, top_score, events):
+        self.contacts = contacts
+        self.features = features
+        self.matrix = matrix
+        self.top_index = top_index
+        self.top_score = top_score
+        self.events = events
+        self._position = {name: i for i, name in enumerate(contacts)}
+
+    @classmethod
+    def build(cls, df, top_k=DEFAULT_TOP_K, block_rows=BLOCK_ROWS):
+        triplets = _feature_triplets(df)
+        contact_codes, contacts = pd.factorize(triplets["contatto"], sort=True)
+        feature_codes, features = pd.factorize(triplets["caratteristica"], sort=True)
+        n_contacts, n_features = len(contacts), len(features)
+
+        # TF-IDF: log dei conteggi per la rarità della caratteristica tra i contatti
+        doc_freq = np.bincount(feature_codes, minlength=n_features)
+        idf = np.log((1 + n_contacts) / (1 + doc_freq)) + 1
+        weights = np.log1p(triplets["conteggio"].to_numpy(dtype=np.float64)) * idf[feature_codes]
+
+        # Norma L2 per (contatto, gruppo): ogni gruppo contribuisce allo stesso modo
+        group_codes = pd.factorize(triplets["gruppo"])[0]
+        n_groups = group_codes.max() + 1 if len(group_codes) else 1
+        norms = np.zeros(n_contacts * n_groups)
+        np.add.at(norms, contact_codes * n_groups + group_codes, weights ** 2)
+        weights = weights / np.sqrt(norms[contact_codes * n_groups + group_codes]) / np.sqrt(n_groups)
+
+        if sparse is not None:
+            matrix = sparse.csr_matrix((weights.astype(np.float32), (contact_codes, feature_codes)),
+                                       shape=(n_contacts, n_features))
+        else:
+            matrix = np.zeros((n_contacts, n_features), dtype=np.float32)
+            np.add.at(matrix, (contact_codes, feature_codes), weights.astype(np.float32))
+
+        # Le righe non sono a norma 1 se un contatto non ha tutti i gruppi: coseno vero
+        row_norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()
+                            if sparse is not None else (matrix ** 2).sum(axis=1))
+        row_norms[row_norms == 0] = 1
+        if sparse is not None:
+            matrix = sparse.diags(1 / row_norms).dot(matrix).tocsr()
+        else:
+            matrix /= row_norms[:, None]
+
+        top_index, top_score = cls._top_k(matrix, min(top_k, max(n_contacts - 1, 0)), block_rows)
+        events = df.loc[_has_contact(df), 'A CHI CHIEDERE'].astype(str).str.strip().value_counts()
+        return cls(list(contacts), list(features), matrix, top_index, top_score, events)
+
+    @staticmethod
+    def _top_k(matrix, k, block_rows):
+        n = matrix.shape[0]
+        top_index = np.zeros((n, k), dtype=np.int32)
+        top_score = np.zeros((n, k), dtype=np.float32)
+        if k == 0:
+            return top_index, top_score
+        transposed = matrix.T
+        for start in range(0, n, block_rows):
+            stop = min(start + block_rows, n)
+            block = matrix[start:stop] @ transposed
+            block = block.toarray() if sparse is not None and sparse.issparse(block) else np.asarray(block)
+            block[np.arange(stop - start), np.arange(start, stop)] = -1  # se stesso escluso
+            part = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(block, part, axis=1)
+            order = np.argsort(-scores, axis=1, kind="stable")
+            top_index[start:stop] = np.take_along_axis(part, order, axis=1)
+            top_score[start:stop] = np.take_along_axis(scores, order, axis=1)
+        return top_index, top_score
+
+    def _row(self, position):
+        row = self.matrix[position]
+        return row.toarray().ravel() if sparse is not None else row
+
+    def shared_features(self, a, b, n=3):
+        """Caratteristiche che più contribuiscono alla similarità tra due contatti"""
+        contribution = self._row(self._position[a]) * self._row(self._position[b])
+        best = np.argsort(-contribution)[:n]
+        return [self.features[i].split(":", 1)[1] for i in best if contribution[i] > 0]
+
+    def similar(self, contact, k=10):
+        """Contatti più simili a `contact`: Contatto, Similarità (0-1), Eventi, In comune"""
+        position = self._position.get(str(contact).strip())
+        if position is None:
+            return pd.DataFrame(columns=['Contatto', 'Similarità', 'Eventi', 'In comune'])
+        rows = []
+        for index, score in zip(self.top_index[position][:k], self.top_score[position][:k]):
+            if score <= 0:
+                break
+            other = self.contacts[index]
+            rows.append({
+                'Contatto': other,
+                'Similarità': round(float(score), 3),
+                'Eventi': int(self.events.get(other, 0)),
+                'In comune': ", ".join(self.shared_features(self.contacts[position], other))
+            })
+        return pd.DataFrame(rows, columns=['Contatto', 'Similarità', 'Eventi', 'In comune'])
@@ -0,0 +1,131 @@
+"""
+Snapshot Arrow degli eventi, mappato in memoria e condiviso tra processi
+Con più processi Streamlit dietro un load balancer ognuno leggeva il workbook e
+teneva la propria copia della tabella. Il primo processo che trova il file
+cambiato pubblica uno snapshot Arrow IPC (non compresso) con nome per versione
+dei dati; tutti lo aprono con memory map in sola lettura: le pagine del file sono
+nella page cache del sistema, una volta sola per macchina, e le colonne arrivano
+a pandas senza copie (testo come string[pyarrow], date in datetime64 quando non
+ci sono valori mancanti).
+
+Il puntatore alla versione corrente (current.json) è sostituito in modo atomico
+dopo aver scritto lo snapshot: chi legge vede la versione precedente o la nuova,
+mai un file a metà. Come il sidecar, il puntatore vale solo per il workbook da
+cui è stato scritto (dimensione e data di modifica).
+"""
+
+import json
+import os
+import threading
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+
+from eventi.fingerprint import file_fingerprint, file_signature
+from eventi.response_cache import CACHE_DIR
+
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, "snapshot")
+POINTER_FILE = "current.json"
+SNAPSHOT_VERSION = 1
+# Snapshot precedenti conservati: un processo può ancora leggerli dopo lo swap
+KEEP_SNAPSHOTS = 2
+
+
+def _types_mapper(arrow_type):
+    # Testo come stringhe Arrow: pandas usa i buffer mappati invece di creare oggetti Python
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+class SnapshotStore:
+    """Snapshot del file `path` e dataframe della versione corrente, per processo"""
+
+    def __init__(self, path, directory=SNAPSHOT_DIR):
+        self.path = path
+        self.directory = os.path.join(directory, os.path.basename(path))
+        self._lock = threading.Lock()
+        self._current = None  # (versione, dataframe) aperti da questo processo
+
+    def _pointer_path(self):
+        return os.path.join(self.directory, POINTER_FILE)
+
+    def _snapshot_path(self, version):
+        return os.path.join(self.directory, f"{version}.arrow")
+
+    def pointer(self):
+        """Puntatore valido per il file attuale, altrimenti None"""
+        try:
+            with open(self._pointer_path(), encoding="utf-8") as f:
+                pointer = json.load(f)
+            signature = file_signature(self.path)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if pointer.get("versione_formato") != SNAPSHOT_VERSION:
+            return None
+        if any(pointer.get(key) != value for key, value in signature.items()):
+            return None
+        if not os.path.exists(self._snapshot_path(pointer["versione"])):
+            return None
+        return pointer
+
+    def publish(self, df, signature=None, version=None):
+        """Scrive lo snapshot di `df` e sposta il puntatore
+        `signature` e `version` sono firma e impronta del contenuto da cui è stato letto
+        `df` (vedi core.load_events_consistent); di default quelle attuali di `path`."""
+        os.makedirs(self.directory, exist_ok=True)
+        signature = signature or file_signature(self.path)
+        version = version or file_fingerprint(self.path)
+        target = self._snapshot_path(version)
+        if not os.path.exists(target):
+            from eventi.core import parse_text
+
+            # Testo libero con celle numeriche: Arrow non converte le colonne miste
+            table = pa.Table.from_pandas(parse_text(df.copy(deep=False)), preserve_index=False)
+            tmp = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+            with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp, target)
+        pointer = {"versione_formato": SNAPSHOT_VERSION, "versione": version,
+                   "file": os.path.basename(self.path), **signature}
+        tmp = f"{self._pointer_path()}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(pointer, f, ensure_ascii=False)
+        os.replace(tmp, self._pointer_path())
+        self._cleanup(keep=version)
+        return pointer
+
+    def _cleanup(self, keep):
+        # Su POSIX un file rimosso resta leggibile da chi lo ha già mappato
+        snapshots = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".arrow")),
+            key=lambda entry: entry.stat().st_mtime, reverse=True
+        )
+        for entry in snapshots[KEEP_SNAPSHOTS:]:
+            if entry.name != f"{keep}.arrow":
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def open(self, version):
+        """Dataframe dello snapshot `version`, mappato in memoria in sola lettura"""
+        source = pa.memory_map(self._snapshot_path(version), "r")
+        table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas(split_blocks=True, types_mapper=_types_mapper)
+
+    def load(self):
+        """(dataframe, versione) della versione corrente, pubblicando lo snapshot se manca
+        Lo stesso dataframe è condiviso da tutte le sessioni del processo: non va
+        modificato sul posto."""
+        pointer = self.pointer()
+        with self._lock:
+            if pointer is not None and self._current is not None and self._current[0] == pointer["versione"]:
+                return self._current[1], self._current[0]
+            if pointer is None:
+                from eventi.core import load_events_consistent
+
+                pointer = self.publish(*load_events_consistent(self.path))
+            self._current = (pointer["versione"], self.open(pointer["versione"]))
+            return self._current[1], self._current[0]
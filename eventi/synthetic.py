@@ -0,0 +1,247 @@
+"""
+Generatore di dataset eventi sintetici per i benchmark
+Ricava un profilo dal file Excel reale (contatti e loro affinità con le categorie,
+tag, note, utenti, nomi evento, anticipo di inserimento, stagionalità delle date)
+e genera N eventi con le stesse distribuzioni, in tutti i formati supportati.
+Oltre i ~1k eventi il numero di contatti cresce con N (distribuzione di Zipf) e
+l'intervallo di date si allarga, come accadrebbe a un archivio reale negli anni.
+
+Esempio (dalla cartella del progetto):
+    python -m eventi.synthetic --sizes 1k 10k 100k 1M --formats xlsx parquet
+"""
+
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from eventi.core import EXCEL_FILE, load_events
+from eventi.response_cache import CACHE_DIR
+from eventi.schema import CATEGORIE, COLUMNS
+
+SYNTHETIC_DIR = os.path.join(CACHE_DIR, "dati_sintetici")
+FORMATS = ("xlsx", "csv", "parquet", "feather")
+DEFAULT_SIZES = ("1k", "10k", "100k", "1M")
+# Limite di righe di un foglio Excel (oltre si scrive solo negli altri formati)
+EXCEL_MAX_ROWS = 1_048_575
+
+# Pool di nomi per i contatti aggiuntivi (i contatti reali restano i più frequenti)
+_FIRST_NAMES = [
+    "Alessandro", "Alessia", "Andrea", "Anna", "Beatrice", "Chiara", "Claudia", "Cristina",
+    "Daniele", "Davide", "Elena", "Elisa", "Emanuele", "Federica", "Federico", "Francesca",
+    "Francesco", "Gabriele", "Giacomo", "Giorgia", "Giovanni", "Giulia", "Giuseppe", "Ilaria",
+    "Laura", "Lorenzo", "Luca", "Marco", "Maria", "Martina", "Matteo", "Michele", "Paola",
+    "Paolo", "Riccardo", "Roberta", "Roberto", "Sara", "Silvia", "Simone", "Stefano", "Valentina"
+]
+_LAST_NAMES = [
+    "Barbieri", "Benedetti", "Bianchi", "Bruno", "Caruso", "Colombo", "Conti", "Costa",
+    "D'Angelo", "De Luca", "Esposito", "Fabbri", "Ferrari", "Ferri", "Fontana", "Galli",
+    "Gallo", "Giordano", "Greco", "Leone", "Lombardi", "Mancini", "Marchetti", "Marino",
+    "Martini", "Mariani", "Moretti", "Palumbo", "Pellegrini", "Rinaldi", "Ricci", "Rizzo",
+    "Romano", "Rossi", "Russo", "Santini", "Serra", "Testa", "Villa", "Vitale"
+]
+
+_NAME_SUFFIX = re.compile(r"\s*\d{4}(\s*-\s*Q\d)?\s*$")
+_QUARTER = re.compile(r"-\s*Q\d\s*$")
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1M' -> 1000000, '2500' -> 2500"""
+    text = str(text).strip().lower()
+    factor = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * factor)
+
+
+def size_label(n):
+    if n >= 1_000_000 and n % 1_000_000 == 0:
+        return f"{n // 1_000_000}M"
+    if n >= 1_000 and n % 1_000 == 0:
+        return f"{n // 1_000}k"
+    return str(n)
+
+
+def _frequencies(series):
+    """Valori distinti e probabilità (i mancanti come None)"""
+    counts = series.astype(object).where(series.notna(), None).value_counts(dropna=False)
+    return list(counts.index), (counts.values / counts.values.sum()).astype(float)
+
+
+def _days(delta):
+    values = delta.dt.total_seconds().dropna().values / 86400
+    return values[values >= 0]
+
+
+def profile_dataset(df):
+    """Profilo statistico del dataset reale, usato come base della generazione"""
+    df = df.dropna(subset=['DATA EVENTO', 'A CHI CHIEDERE', 'CATEGORIA'])
+    contacts = df['A CHI CHIEDERE'].value_counts()
+    affinity = pd.crosstab(df['A CHI CHIEDERE'], df['CATEGORIA']).reindex(columns=CATEGORIE, fill_value=0)
+
+    names = df['NOME EVENTO'].dropna().astype(str)
+    bases = names.str.replace(_NAME_SUFFIX, "", regex=True).str.strip()
+
+    dates = df['DATA EVENTO']
+    month_weights = np.bincount(dates.dt.month - 1, minlength=12) + 1.0  # +1: nessun mese vuoto
+    weekday_weights = np.bincount(dates.dt.weekday, minlength=7) + 1.0
+
+    return {
+        "contatti": list(contacts.index),
+        "pesi_contatti": (contacts.values / contacts.values.sum()).astype(float),
+        # Affinità contatto -> categoria, con smoothing per non escludere mai una categoria
+        "affinita": {name: (row.values + 0.5) / (row.values + 0.5).sum() for name, row in affinity.iterrows()},
+        "pesi_categorie": (affinity.sum().values + 1.0) / (affinity.sum().values + 1.0).sum(),
+        "nomi": _frequencies(bases),
+        "quota_trimestre": float(names.str.contains(_QUARTER).mean()) if len(names) else 0.0,
+        "tag": _frequencies(df['TAG']),
+        "note": _frequencies(df['NOTE']),
+        "utenti_inserimento": _frequencies(df['USER INSERIMENTO']),
+        "utenti_modifica": _frequencies(df['USER MODIFICA']),
+        "quota_link": float(df['LINK EVENTO'].notna().mean()),
+        "anticipo_giorni": _days(df['DATA EVENTO'] - df['TIMESTAMP INSERIMENTO']),
+        "ritardo_modifica_giorni": _days(df['TIMESTAMP MODIFICA'] - df['TIMESTAMP INSERIMENTO']),
+        "pesi_mesi": month_weights / month_weights.sum(),
+        "pesi_giorni_settimana": weekday_weights / weekday_weights.sum(),
+    }
+
+
+def _contact_pool(profile, n, rng):
+    """Contatti reali + contatti sintetici; il numero cresce come ~4·√N"""
+    real = list(profile["contatti"])
+    target = max(len(real), int(4 * np.sqrt(n)))
+    extra = [f"{first} {last}" for first in _FIRST_NAMES for last in _LAST_NAMES]
+    extra = [name for name in rng.permutation(extra) if name not in set(real)]
+    names = real + extra[:target - len(real)]
+    # Zipf sui contatti sintetici, accodati dopo quelli reali che mantengono il loro peso relativo
+    ranks = np.arange(1, len(names) + 1)
+    weights = 1.0 / ranks ** 1.1
+    weights[:len(real)] = profile["pesi_contatti"] * weights[:len(real)].sum()
+    affinity = [profile["affinita"].get(name) for name in names]
+    default = profile["pesi_categorie"]
+    affinity = np.array([
+        a if a is not None else rng.dirichlet(default * 4)  # ogni nuovo contatto ha le sue preferenze
+        for a in affinity
+    ])
+    return np.array(names, dtype=object), weights / weights.sum(), affinity
+
+
+def _pick(rng, values_probs, n):
+    values, probs = values_probs
+    idx = rng.choice(len(values), size=n, p=probs)
+    return np.array(values, dtype=object)[idx]
+
+
+def _event_dates(profile, n, rng, today):
+    """Date con la stagionalità mensile reale; l'archivio copre più anni al crescere di N"""
+    years_back = 1 + max(0, int(np.log10(max(n, 1) / 1_000)))
+    start = pd.Timestamp(today.year - years_back, 1, 1)
+    end = pd.Timestamp(today.year + 1, 12, 31)  # un anno di eventi futuri
+    days = pd.date_range(start, end, freq="D")
+    weights = profile["pesi_mesi"][days.month - 1] * profile["pesi_giorni_settimana"][days.weekday]
+    idx = rng.choice(len(days), size=n, p=weights / weights.sum())
+    return days.values[idx]
+
+
+def _bootstrap_days(rng, sample, n, default):
+    if len(sample) == 0:
+        return rng.uniform(0, default, size=n)
+    # Rimescolamento con piccolo rumore, per non replicare identici i valori reali
+    return np.clip(rng.choice(sample, size=n) * rng.uniform(0.8, 1.2, size=n), 0, None)
+
+
+def generate_events(n, seed=0, profile=None, today=None):
+    """Genera un DataFrame di n eventi con lo schema e le distribuzioni del dataset reale"""
+    rng = np.random.default_rng(seed)
+    profile = profile or profile_dataset(load_events())
+    today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+
+    contacts, contact_weights, affinity = _contact_pool(profile, n, rng)
+    contact_idx = rng.choice(len(contacts), size=n, p=contact_weights)
+
+    # Categoria dal profilo del contatto: campionamento vettoriale per riga via CDF cumulata
+    cdf = affinity.cumsum(axis=1)[contact_idx]
+    category_idx = (rng.random(n)[:, None] > cdf).sum(axis=1).clip(max=len(CATEGORIE) - 1)
+
+    event_dates = pd.DatetimeIndex(_event_dates(profile, n, rng, today))
+    lead = _bootstrap_days(rng, profile["anticipo_giorni"], n, 120)
+    inserted = event_dates - pd.to_timedelta(lead, unit="D")
+    edit_users = _pick(rng, profile["utenti_modifica"], n)
+    edit_delay = _bootstrap_days(rng, profile["ritardo_modifica_giorni"], n, 10)
+    edited = pd.Series(inserted + pd.to_timedelta(edit_delay, unit="D")).where(pd.notna(edit_users))
+
+    bases = _pick(rng, profile["nomi"], n)
+    quarters = np.where(rng.random(n) < profile["quota_trimestre"],
+                        pd.Series(rng.integers(1, 5, size=n)).map(lambda q: f" - Q{q}").values, "")
+    names = pd.Series(bases).astype(str) + " " + event_dates.year.astype(str) + quarters
+
+    link_ids = pd.Series(rng.integers(1000, 10000, size=n)).astype(str)
+    links = ("https://example.com/event/" + link_ids).where(rng.random(n) < profile["quota_link"])
+
+    df = pd.DataFrame({
+        'DATA EVENTO': event_dates,
+        'NOME EVENTO': names.values,
+        'LINK EVENTO': links.values,
+        'A CHI CHIEDERE': contacts[contact_idx],
+        'CATEGORIA': np.array(CATEGORIE, dtype=object)[category_idx],
+        'USER INSERIMENTO': _pick(rng, profile["utenti_inserimento"], n),
+        'TIMESTAMP INSERIMENTO': inserted.floor("s"),
+        'USER MODIFICA': edit_users,
+        'TIMESTAMP MODIFICA': pd.to_datetime(edited).dt.floor("s").values,
+        'NOTE': _pick(rng, profile["note"], n),
+        'TAG': _pick(rng, profile["tag"], n),
+    })
+    return df.sort_values('TIMESTAMP INSERIMENTO', ignore_index=True)[COLUMNS]
+
+
+def write_dataset(df, path):
+    """Scrive nel formato indicato dall'estensione (xlsx, csv, parquet, feather)"""
+    ext = os.path.splitext(path)[1].lstrip(".").lower()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if ext == "xlsx":
+        if len(df) > EXCEL_MAX_ROWS:
+            raise ValueError(f"{len(df)} righe superano il limite di un foglio Excel")
+        df.to_excel(path, index=False)
+    elif ext == "csv":
+        df.to_csv(path, index=False)
+    elif ext == "parquet":
+        df.to_parquet(path, index=False)
+    elif ext == "feather":
+        df.to_feather(path)
+    else:
+        raise ValueError(f"Formato non supportato: {ext}")
+    return path
+
+
+def dataset_path(n, fmt, directory=SYNTHETIC_DIR):
+    return os.path.join(directory, f"eventi_{size_label(n)}.{fmt}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera dataset eventi sintetici per i benchmark")
+    parser.add_argument("--sizes", nargs="+", default=list(DEFAULT_SIZES), help="es. 1k 10k 100k 1M")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--out", default=SYNTHETIC_DIR)
+    parser.add_argument("--source", default=EXCEL_FILE, help="file reale da cui ricavare il profilo")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    profile = profile_dataset(load_events(args.source))
+    for size in args.sizes:
+        n = parse_size(size)
+        start = time.perf_counter()
+        df = generate_events(n, seed=args.seed, profile=profile)
+        print(f"{size_label(n)}: generati {len(df)} eventi, "
+              f"{df['A CHI CHIEDERE'].nunique()} contatti in {time.perf_counter() - start:.1f}s")
+        for fmt in args.formats:
+            if fmt == "xlsx" and n > EXCEL_MAX_ROWS:
+                print(f"  xlsx: saltato (oltre {EXCEL_MAX_ROWS} righe)")
+                continue
+            start = time.perf_counter()
+            path = write_dataset(df, dataset_path(n, fmt, args.out))
+            print(f"  {fmt}: {path} ({os.path.getsize(path) / 2**20:.1f} MB, {time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
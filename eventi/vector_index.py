@@ -0,0 +1,389 @@
+"""
+Indice vettoriale locale dei testi degli eventi (ricerca semantica ed eventi simili)
+Ogni evento è un vettore TF-IDF dei termini di NOME EVENTO, NOTE e TAG
+(minuscole, senza accenti né parole vuote, con una radice italiana semplice:
+"conferenza" e "conferenze" sono lo stesso termine). Una ricerca in testo libero
+o "eventi simili a questo" è la similarità coseno tra vettori, calcolata sulle
+sole liste di eventi dei termini della domanda (indice invertito, numpy puro):
+nessuna rete, nessun modello da scaricare.
+
+I documenti sono identificati dall'hash del loro testo, non dalla posizione: a
+ogni nuova versione dei dati `sync` tokenizza solo le righe con testo mai visto
+(un inserimento costa una riga) e le nuove voci restano in una coda lineare
+finché non superano COMPACT_RATIO dell'indice. I pesi IDF si ricalcolano sui
+documenti ancora presenti; quando quelli spariti (modificati o eliminati) sono
+troppi l'indice si ricostruisce. Lo stato è salvato in .eventi_cache/indice_testi
+così un nuovo processo riparte dal punto in cui era arrivato.
+
+Esempio (dalla cartella del progetto):
+    python -m eventi.vector_index "formazione intelligenza artificiale" --k 5
+"""
+
+import argparse
+import os
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from eventi.response_cache import CACHE_DIR
+
+INDEX_DIR = os.path.join(CACHE_DIR, "indice_testi")
+INDEX_FORMAT = 1
+TEXT_COLUMNS = ('NOME EVENTO', 'NOTE', 'TAG')
+MIN_TOKEN_LENGTH = 2
+# Sotto questa similarità un evento non è considerato pertinente
+MIN_SCORE = 0.05
+# Coda delle voci nuove oltre la quale si ricostruiscono le liste per termine
+COMPACT_RATIO = 0.1
+# Documenti non più presenti oltre i quali l'indice si ricostruisce da zero
+REBUILD_DEAD_RATIO = 0.3
+MAX_CACHED_MAPPINGS = 4
+
+STOPWORDS = frozenset("""
+a ad al alla alle allo agli ai all anche che chi con col come cui da dal dalla dalle dallo dai
+degli dei del della delle dello di e ed gli i il in la le lo ma mi ne negli nei nel nella
+nelle nello non o per piu po quale quali quella quelle quello questa queste questo se si
+sia sono su sua sue sui sul sulla sulle suo tra fra un una uno va via
+an and are as at be by for from in is it of on or the to with
+""".split())
+
+_VOWELS = tuple("aeiou")
+
+
+def _normalize_text(values):
+    """Minuscole e senza accenti (Series di stringhe)"""
+    return (values.str.lower().str.normalize('NFKD')
+            .str.encode('ascii', errors='ignore').str.decode('ascii'))
+
+
+def _stem(token):
+    # Radice minima: via la vocale finale (singolare/plurale, maschile/femminile)
+    if len(token) > 4 and token.endswith(_VOWELS):
+        return token[:-1]
+    return token
+
+
+def _event_text(df):
+    cols = [col for col in TEXT_COLUMNS if col in df.columns]
+    if not cols:
+        return pd.Series("", index=df.index)
+    text = df[cols[0]].fillna('').astype(str)
+    for col in cols[1:]:
+        text = text + " " + df[col].fillna('').astype(str)
+    return text
+
+
+def _row_hashes(df):
+    """Hash del testo indicizzato di ogni riga (identità del documento)"""
+    if len(df) == 0:
+        return np.empty(0, dtype=np.uint64)
+    return pd.util.hash_pandas_object(_event_text(df), index=False).to_numpy()
+
+
+def tokenize(text):
+    """Termini (già ridotti alla radice) di un testo libero"""
+    tokens = _normalize_text(pd.Series([str(text)])).str.findall(r"[a-z0-9]+").iloc[0]
+    return [_stem(t) for t in tokens if len(t) >= MIN_TOKEN_LENGTH and t not in STOPWORDS]
+
+
+def _tokenize_column(text):
+    """(posizione della riga, termine) per tutte le righe, con i termini ricavati
+    una volta per parola distinta"""
+    words = _normalize_text(text.reset_index(drop=True)).str.findall(r"[a-z0-9]+").explode().dropna()
+    codes, uniques = pd.factorize(words)
+    keep = np.array([len(w) >= MIN_TOKEN_LENGTH and w not in STOPWORDS for w in uniques], dtype=bool)
+    stems = np.array([_stem(w) for w in uniques], dtype=object)
+    selected = keep[codes] if len(codes) else np.zeros(0, dtype=bool)
+    return words.index.to_numpy()[selected], stems[codes[selected]]
+
+
+class EventIndex:
+    """Indice invertito TF-IDF dei testi degli eventi; thread-safe, uno per file"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.vocab = {}
+        self.doc_hash = np.empty(0, dtype=np.uint64)
+        self.doc_ptr = np.zeros(1, dtype=np.int64)  # voci di ogni documento (CSR)
+        self.entry_term = np.empty(0, dtype=np.int32)
+        self.entry_tf = np.empty(0, dtype=np.float32)
+        self.live = np.zeros(0, dtype=bool)
+        self.version = None
+        self._hash_lookup = pd.Index(self.doc_hash)
+        self._mappings = {}  # versione -> documento di ogni riga
+        self._main_entries = 0  # voci già nelle liste per termine, le altre sono in coda
+        self._reset_weights()
+
+    def _reset_weights(self):
+        self._entry_doc = np.empty(0, dtype=np.int32)
+        self._entry_weight = np.empty(0, dtype=np.float32)
+        self._idf = np.empty(0, dtype=np.float32)
+        self._postings = np.empty(0, dtype=np.int64)
+        self._term_ptr = np.zeros(1, dtype=np.int64)
+
+    @property
+    def n_docs(self):
+        return len(self.doc_hash)
+
+    @property
+    def n_terms(self):
+        return len(self.vocab)
+
+    # ---------- aggiornamento ----------
+
+    def _append_docs(self, text, hashes):
+        rows, terms = _tokenize_column(text)
+        for term in pd.unique(terms):
+            self.vocab.setdefault(term, len(self.vocab))
+        term_ids = np.fromiter((self.vocab[t] for t in terms), dtype=np.int32, count=len(terms))
+        # Conteggio per (documento, termine): le voci restano ordinate per documento
+        pairs = pd.DataFrame({"doc": rows, "term": term_ids}).groupby(["doc", "term"], sort=True).size()
+        docs = pairs.index.get_level_values("doc").to_numpy()
+        counts = np.bincount(docs, minlength=len(hashes))
+        self.doc_ptr = np.concatenate([self.doc_ptr, self.doc_ptr[-1] + np.cumsum(counts)])
+        self.entry_term = np.concatenate([self.entry_term, pairs.index.get_level_values("term").to_numpy(np.int32)])
+        self.entry_tf = np.concatenate([self.entry_tf, pairs.to_numpy(np.float32)])
+        self.doc_hash = np.concatenate([self.doc_hash, hashes])
+        self.live = np.concatenate([self.live, np.ones(len(hashes), dtype=bool)])
+        self._hash_lookup = pd.Index(self.doc_hash)
+
+    def _compute_weights(self):
+        """IDF sui documenti presenti, pesi (1 + log tf) * idf normalizzati per documento"""
+        entry_doc = np.repeat(np.arange(self.n_docs, dtype=np.int32), np.diff(self.doc_ptr))
+        live_entries = self.live[entry_doc]
+        n_live = int(self.live.sum())
+        doc_freq = np.bincount(self.entry_term[live_entries], minlength=self.n_terms)
+        self._idf = (np.log((1 + n_live) / (1 + doc_freq)) + 1).astype(np.float32)
+        weight = (1 + np.log(self.entry_tf)) * self._idf[self.entry_term]
+        norms = np.sqrt(np.bincount(entry_doc, weights=weight.astype(np.float64) ** 2, minlength=self.n_docs))
+        norms[norms == 0] = 1
+        self._entry_doc = entry_doc
+        self._entry_weight = (weight / norms[entry_doc]).astype(np.float32)
+
+    def _compact(self):
+        """Liste per termine (ordine CSC) di tutte le voci: la coda torna vuota"""
+        self._postings = np.argsort(self.entry_term, kind="stable")
+        self._term_ptr = np.searchsorted(self.entry_term[self._postings], np.arange(self.n_terms + 1))
+        self._main_entries = len(self.entry_term)
+
+    def sync(self, df, version=None):
+        """Allinea l'indice al contenuto di `df`: tokenizza solo i testi nuovi
+        Ritorna il numero di documenti aggiunti."""
+        hashes = _row_hashes(df)
+        with self._lock:
+            if self.version is not None and version == self.version:
+                return 0
+            doc_of_row = self._hash_lookup.get_indexer(hashes) if self.n_docs else np.full(len(hashes), -1)
+            new_rows = np.flatnonzero(doc_of_row < 0)
+            _, first = np.unique(hashes[new_rows], return_index=True)
+            new_rows = np.sort(new_rows[first])
+            if len(new_rows):
+                self._append_docs(_event_text(df).iloc[new_rows], hashes[new_rows])
+                doc_of_row = self._hash_lookup.get_indexer(hashes)
+            self.live = np.zeros(self.n_docs, dtype=bool)
+            self.live[doc_of_row] = True
+            if self.n_docs and (~self.live).mean() > REBUILD_DEAD_RATIO:
+                self._rebuild(df, hashes)
+                doc_of_row = self._hash_lookup.get_indexer(hashes)
+            self._compute_weights()
+            if len(self.entry_term) - self._main_entries > COMPACT_RATIO * max(self._main_entries, 1):
+                self._compact()
+            self.version = version
+            self._remember(version, doc_of_row)
+            return len(new_rows)
+
+    def _rebuild(self, df, hashes):
+        # Troppi documenti spariti: riparte dai soli testi presenti
+        _, first = np.unique(hashes, return_index=True)
+        rows = np.sort(first)
+        self.vocab = {}
+        self.doc_hash = np.empty(0, dtype=np.uint64)
+        self.doc_ptr = np.zeros(1, dtype=np.int64)
+        self.entry_term = np.empty(0, dtype=np.int32)
+        self.entry_tf = np.empty(0, dtype=np.float32)
+        self.live = np.zeros(0, dtype=bool)
+        self._main_entries = 0
+        self._reset_weights()
+        self._append_docs(_event_text(df).iloc[rows], hashes[rows])
+
+    def _remember(self, version, doc_of_row):
+        if version is None:
+            return
+        self._mappings[version] = doc_of_row
+        while len(self._mappings) > MAX_CACHED_MAPPINGS:
+            self._mappings.pop(next(iter(self._mappings)))
+
+    def _docs_of(self, df, version=None):
+        """Documento di ogni riga di `df` (-1 se il testo non è nell'indice)"""
+        if version is not None and version in self._mappings and len(self._mappings[version]) == len(df):
+            return self._mappings[version]
+        return self._hash_lookup.get_indexer(_row_hashes(df)) if self.n_docs else np.full(len(df), -1)
+
+    # ---------- interrogazione ----------
+
+    def _query_vector(self, terms):
+        ids, counts = np.unique([self.vocab[t] for t in terms if t in self.vocab], return_counts=True)
+        if len(ids) == 0:
+            return ids.astype(np.int64), np.empty(0, dtype=np.float32)
+        weight = (1 + np.log(counts)) * self._idf[ids]
+        return ids.astype(np.int64), (weight / np.linalg.norm(weight)).astype(np.float32)
+
+    def _doc_scores(self, ids, weights):
+        """Similarità coseno della domanda con tutti i documenti"""
+        docs, values = [], []
+        for term, weight in zip(ids, weights):
+            if term + 1 < len(self._term_ptr):
+                entries = self._postings[self._term_ptr[term]:self._term_ptr[term + 1]]
+                docs.append(self._entry_doc[entries])
+                values.append(self._entry_weight[entries] * weight)
+        queue = slice(self._main_entries, None)
+        in_queue = np.isin(self.entry_term[queue], ids)
+        if in_queue.any():
+            queue_terms = self.entry_term[queue][in_queue]
+            docs.append(self._entry_doc[queue][in_queue])
+            values.append(self._entry_weight[queue][in_queue] * weights[np.searchsorted(ids, queue_terms)])
+        if not docs:
+            return np.zeros(self.n_docs, dtype=np.float64)
+        return np.bincount(np.concatenate(docs), weights=np.concatenate(values), minlength=self.n_docs)
+
+    def _row_scores(self, df, doc_scores, version=None):
+        doc_of_row = self._docs_of(df, version)
+        return np.where(doc_of_row >= 0, doc_scores[np.maximum(doc_of_row, 0)], 0.0) if len(doc_scores) \
+            else np.zeros(len(df))
+
+    def scores(self, df, query, version=None):
+        """Similarità (0-1) di ogni riga di `df` con il testo libero `query`"""
+        with self._lock:
+            ids, weights = self._query_vector(tokenize(query))
+            return self._row_scores(df, self._doc_scores(ids, weights), version)
+
+    @staticmethod
+    def _top(df, scores, k, min_score, exclude=None):
+        if exclude is not None:
+            scores = scores.copy()
+            scores[exclude] = 0
+        candidates = np.flatnonzero(scores >= min_score)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        result = df.iloc[candidates].copy()
+        result.insert(0, 'RILEVANZA', np.round(scores[candidates], 3))
+        return result
+
+    def search(self, df, query, k=10, version=None, min_score=MIN_SCORE):
+        """Le `k` righe di `df` più pertinenti al testo `query`, con colonna RILEVANZA"""
+        return self._top(df, self.scores(df, query, version), k, min_score)
+
+    def similar(self, df, event, k=5, version=None, min_score=MIN_SCORE):
+        """Le `k` righe di `df` più simili all'evento `event` (riga, anche di un altro
+        dataframe), escluse quelle con lo stesso testo"""
+        with self._lock:
+            doc_of_row = self._docs_of(df, version)
+            doc = self._hash_lookup.get_indexer(_row_hashes(event.to_frame().T))[0] if self.n_docs else -1
+            if doc < 0:
+                return self._top(df, np.zeros(len(df)), k, min_score)
+            start, end = self.doc_ptr[doc], self.doc_ptr[doc + 1]
+            ids = self.entry_term[start:end].astype(np.int64)
+            scores = self._row_scores(df, self._doc_scores(ids, self._entry_weight[start:end]), version)
+        return self._top(df, scores, k, min_score, exclude=doc_of_row == doc)
+
+    def stats(self):
+        with self._lock:
+            return {"documenti": self.n_docs, "presenti": int(self.live.sum()), "termini": self.n_terms,
+                    "voci": len(self.entry_term), "in_coda": len(self.entry_term) - self._main_entries}
+
+    # ---------- persistenza ----------
+
+    def save(self, path):
+        """Salva l'indice (file .npz scritto e poi sostituito in modo atomico)"""
+        with self._lock:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp.npz"
+            np.savez(tmp, formato=np.array([INDEX_FORMAT]), versione=np.array([self.version or ""]),
+                     termini=np.array(list(self.vocab), dtype=str), doc_hash=self.doc_hash,
+                     doc_ptr=self.doc_ptr, entry_term=self.entry_term, entry_tf=self.entry_tf)
+            os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Indice salvato con `save`, None se manca o è di un formato diverso"""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["formato"][0]) != INDEX_FORMAT:
+                    return None
+                index = cls()
+                index.vocab = {term: i for i, term in enumerate(data["termini"].tolist())}
+                index.doc_hash = data["doc_hash"]
+                index.doc_ptr = data["doc_ptr"]
+                index.entry_term = data["entry_term"]
+                index.entry_tf = data["entry_tf"]
+        except (OSError, KeyError, ValueError):
+            return None
+        index.live = np.ones(index.n_docs, dtype=bool)
+        index._hash_lookup = pd.Index(index.doc_hash)
+        # Versione non ripristinata: il primo sync riallinea i documenti presenti
+        index._compute_weights()
+        index._compact()
+        return index
+
+
+def index_path(path, directory=INDEX_DIR):
+    return os.path.join(directory, f"{os.path.basename(path)}.npz")
+
+
+class SharedIndex:
+    """Indice del file `path` per processo: caricato dal disco, aggiornato per versione
+    dei dati e salvato quando riceve testi nuovi"""
+
+    def __init__(self, path, directory=INDEX_DIR):
+        self.path = path
+        self.index_file = index_path(path, directory)
+        self.index = EventIndex.load(self.index_file) or EventIndex()
+
+    def ready(self, df, version):
+        """Indice allineato a `df` (versione `version` dei dati)"""
+        if self.index.sync(df, version):
+            try:
+                self.index.save(self.index_file)
+            except OSError:
+                pass  # senza copia su disco si ricostruisce al prossimo avvio
+        return self.index
+
+
+_SHARED = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_index(path):
+    """Indice condiviso del file `path`, uno per processo anche se lo usano più pagine"""
+    key = os.path.abspath(path)
+    with _SHARED_LOCK:
+        if key not in _SHARED:
+            _SHARED[key] = SharedIndex(path)
+        return _SHARED[key]
+
+
+def main(argv=None):
+    from eventi.core import EXCEL_FILE, load_events
+    from eventi.fingerprint import file_fingerprint
+
+    parser = argparse.ArgumentParser(description="Ricerca semantica locale negli eventi")
+    parser.add_argument("query", help="testo libero da cercare")
+    parser.add_argument("--file", default=EXCEL_FILE)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    df = load_events(args.file)
+    index = shared_index(args.file).ready(df, file_fingerprint(args.file))
+    results = index.search(df, args.query, k=args.k)
+    if len(results) == 0:
+        print("Nessun evento pertinente")
+    for _, row in results.iterrows():
+        data = row['DATA EVENTO'].strftime('%d/%m/%Y') if pd.notna(row['DATA EVENTO']) else "-"
+        print(f"{row['RILEVANZA']:.3f}  {data}  {row['NOME EVENTO']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Versione dei dati guidata dagli eventi del file system
+Un watcher (watchdog) osserva la cartella del workbook: quando il file cambia,
+ad esempio per un inserimento da un'altra sessione o da un altro processo, la
+versione dei dati (impronta del file) passa alla successiva e:
+- i listener registrati invalidano solo ciò che è legato alla versione precedente
+  (es. le maschere dei filtri) o preparano la nuova (snapshot Arrow);
+- le sessioni Streamlit aperte e inattive vengono rieseguite, così mostrano i dati
+  nuovi senza attendere un TTL né un clic su "Ricarica Dati".
+Le cache indicizzate per versione non vanno svuotate: le voci vecchie diventano
+irraggiungibili ed escono per anzianità. Nessun polling: senza watchdog installato
+la versione si verifica a ogni lettura confrontando dimensione e data di modifica.
+"""
+
+import logging
+import os
+import threading
+
+from eventi.fingerprint import file_fingerprint, file_signature
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog è opzionale, fallback sulla verifica a ogni lettura
+    Observer = None
+    FileSystemEventHandler = object
+
+# Le scritture di Excel/pandas arrivano in più eventi ravvicinati: si attende che finiscano
+DEBOUNCE_SECONDS = 0.3
+
+logger = logging.getLogger(__name__)
+
+
+def _current_signature(path):
+    try:
+        return file_signature(path)
+    except FileNotFoundError:
+        return None
+
+
+class _FileEvents(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+        self.target = os.path.abspath(watcher.path)
+
+    def on_any_event(self, event):
+        paths = [getattr(event, "src_path", None), getattr(event, "dest_path", None)]
+        if any(p and os.path.abspath(os.fsdecode(p)) == self.target for p in paths):
+            self.watcher.schedule_check()
+
+
+class DataWatcher:
+    """Versione corrente del file `path`, aggiornata dal watcher; un'istanza per processo"""
+
+    def __init__(self, path, debounce=DEBOUNCE_SECONDS):
+        self.path = path
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._signature = _current_signature(path)
+        self._version = file_fingerprint(path)
+        self._listeners = []
+        self._sessions = set()
+        self._timer = None
+        self._observer = None
+
+    # ---------- watcher ----------
+
+    def start(self):
+        """Avvia l'osservazione della cartella del file (no-op senza watchdog)"""
+        if Observer is None or self._observer is not None:
+            return self
+        observer = Observer()
+        observer.schedule(_FileEvents(self), os.path.dirname(os.path.abspath(self.path)) or ".", recursive=False)
+        observer.daemon = True
+        observer.start()
+        self._observer = observer
+        return self
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        if self._timer is not None:
+            self._timer.cancel()
+
+    @property
+    def watching(self):
+        return self._observer is not None
+
+    def schedule_check(self):
+        """Verifica differita: riparte a ogni evento finché il file non è stabile"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self.check)
+            self._timer.daemon = True
+            self._timer.start()
+
+    # ---------- versione ----------
+
+    @property
+    def version(self):
+        if not self.watching:
+            self.check()
+        return self._version
+
+    def check(self):
+        """Confronta il file con l'ultima versione nota; se è cambiato passa alla nuova
+        e avvisa listener e sessioni. Ritorna la versione corrente."""
+        signature = _current_signature(self.path)
+        with self._lock:
+            if signature == self._signature:
+                return self._version
+            old, new = self._version, file_fingerprint(self.path)
+            self._signature, self._version = signature, new
+            listeners = list(self._listeners)
+        if new != old:
+            for listener in listeners:
+                try:
+                    listener(old, new)
+                except Exception:
+                    # Un listener non deve bloccare gli altri né le sessioni, ma l'errore resta nel log
+                    logger.exception("Listener %r fallito al passaggio alla versione %s", listener, new)
+            self.notify_sessions()
+        return new
+
+    def add_listener(self, listener):
+        """`listener(vecchia, nuova)` chiamato a ogni cambio di versione, dal thread del watcher"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    # ---------- sessioni ----------
+
+    def register_session(self):
+        """Da chiamare nello script della pagina: la sessione corrente riceverà i cambi di versione"""
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx()
+        if ctx is not None:
+            with self._lock:
+                self._sessions.add(ctx.session_id)
+
+    def notify_sessions(self):
+        """Riesegue le sessioni aperte e inattive; quelle in esecuzione leggeranno la
+        nuova versione al prossimo rerun (un rerun forzato interromperebbe, ad esempio,
+        una risposta della chat in streaming)"""
+        try:
+            from streamlit import runtime
+            from streamlit.runtime.app_session import AppSessionState
+        except ImportError:
+            return
+        if not runtime.exists():
+            return
+        # API interna di Streamlit (la stessa usata per "Rerun on save"): se manca, nessun avviso
+        session_mgr = getattr(runtime.get_instance(), "_session_mgr", None)
+        if session_mgr is None or not hasattr(session_mgr, "get_active_session_info"):
+            return
+        with self._lock:
+            session_ids = list(self._sessions)
+        for session_id in session_ids:
+            info = session_mgr.get_active_session_info(session_id)
+            if info is None:
+                with self._lock:
+                    self._sessions.discard(session_id)
+                continue
+            session = info.session
+            if getattr(session, "_state", None) == AppSessionState.APP_NOT_RUNNING:
+                session.request_rerun(getattr(session, "_client_state", None))
+
+
+_WATCHERS = {}
+_WATCHERS_LOCK = threading.Lock()
+
+
+def shared_watcher(path):
+    """Watcher avviato del file `path`, uno per processo anche se lo usano più pagine"""
+    key = os.path.abspath(path)
+    with _WATCHERS_LOCK:
+        if key not in _WATCHERS:
+            _WATCHERS[key] = DataWatcher(path).start()
+        return _WATCHERS[key]
+
+
+def notify_data_change(session_state, version, key="versione_dati_vista"):
+    """True (una volta) se la sessione ha visto finora una versione diversa dei dati"""
+    previous = session_state.get(key)
+    session_state[key] = version
+    return previous is not None and previous != version
+
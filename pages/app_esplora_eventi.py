@@ -1,10 +1,39 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import os
-from collections import Counter
+
+from eventi.core import (
+    PERIODI,
+    category_growth,
+    category_synergies,
+    contact_category_matrix,
+    delete_event,
+    ensure_event_ids,
+    filter_events,
+    filter_mask,
+    insert_event,
+    low_activity_contacts,
+    monthly_trend,
+    to_csv,
+    top_tags,
+    update_event,
+    underrepresented_categories,
+    unique_tags,
+    weekday_counts,
+)
+from eventi.changelog import ChangeLog
+from eventi.digest import STATUS_DONE, DigestStore, digest_markdown
+from eventi.filters import FilterSpec, MaskCache
+from eventi.partitions import load_events_window
+from eventi.profiler import profiler_enabled, render_profiler_panel, session_profiler
+from eventi.schema import CATEGORIE, ID_COLUMN
+from eventi.snapshot import SnapshotStore
+from eventi.watcher import notify_data_change, shared_watcher
+from eventi.sidecar import load_stats, upcoming_events
+from eventi.similarity import ContactSimilarity
+from eventi.contacts import ContactDirectory, canonicalize_contacts
+from eventi.vector_index import MIN_SCORE, shared_index
 
 st.set_page_config(
     page_title="Esplora Eventi",
@@ -13,6 +42,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+profiler = session_profiler(st.session_state, profiler_enabled(st.query_params))
+profiler.start_run("Esplora Eventi")
+profiler.checkpoint("setup")
+
 # CSS
 st.markdown("""
 <style>
@@ -42,29 +75,107 @@ st.markdown("""
 
 EXCEL_FILE = "gestione_eventi.xlsx"
 
-CATEGORIE = [
-    'EVENTI sociali/politici/economici',
-    'EVENTI delle organizzazioni',
-    'EVENTI che interessano a logotel',
-    'EVENTI di logotel che farà'
-]
+@st.cache_resource
+def get_snapshot_store():
+    """Snapshot Arrow del file eventi, mappato in memoria e condiviso da sessioni e processi"""
+    return SnapshotStore(EXCEL_FILE)
 
-@st.cache_data(ttl=1)
 def load_data():
+    """Eventi e versione dei dati (impronta del file letto), che indicizza le maschere dei filtri
+    Nessuna cache_data: restituirebbe una copia deserializzata invece delle colonne mappate."""
     if os.path.exists(EXCEL_FILE):
-        df = pd.read_excel(EXCEL_FILE)
-        if 'DATA EVENTO' in df.columns:
-            df['DATA EVENTO'] = pd.to_datetime(df['DATA EVENTO'], errors='coerce', dayfirst=True)
-        if 'TIMESTAMP INSERIMENTO' in df.columns:
-            df['TIMESTAMP INSERIMENTO'] = pd.to_datetime(df['TIMESTAMP INSERIMENTO'], errors='coerce')
-        if 'TIMESTAMP MODIFICA' in df.columns:
-            df['TIMESTAMP MODIFICA'] = pd.to_datetime(df['TIMESTAMP MODIFICA'], errors='coerce')
-        return df
-    return pd.DataFrame()
-
-def save_data(df):
-    df.to_excel(EXCEL_FILE, index=False)
-    st.cache_data.clear()
+        return get_snapshot_store().load()
+    return pd.DataFrame(), None
+
+@st.cache_resource
+def get_mask_cache():
+    """Maschere dei filtri per clausola, condivise tra sessioni e rerun"""
+    return MaskCache()
+
+@st.cache_resource
+def get_data_watcher():
+    """Versione dei dati dal watcher del file: al cambio libera le maschere della versione
+    superata e prepara il nuovo snapshot prima che le sessioni vengano rieseguite"""
+    watcher = shared_watcher(EXCEL_FILE)
+    mask_cache, snapshot_store, event_index = get_mask_cache(), get_snapshot_store(), get_event_index()
+    watcher.add_listener(lambda old, new: mask_cache.discard_version(old))
+    watcher.add_listener(lambda old, new: snapshot_store.load() if new else None)
+    # Dopo lo snapshot: l'indice dei testi tokenizza solo le righe nuove o modificate
+    watcher.add_listener(lambda old, new: event_index.ready(*snapshot_store.load()) if new else None)
+    return watcher
+
+@st.cache_resource
+def get_event_index():
+    """Indice dei testi degli eventi (ricerca semantica ed eventi simili), per processo"""
+    return shared_index(EXCEL_FILE)
+
+def indice_testi():
+    """Indice allineato alla versione corrente dei dati: di norma lo aggiorna il listener
+    del watcher, altrimenti (es. processo appena avviato) si leggono tutti gli eventi.
+    Da chiamare solo quando la ricerca semantica o gli eventi simili servono davvero."""
+    shared = get_event_index()
+    if shared.index.version != get_data_watcher().version:
+        shared.ready(*load_data())
+    return shared.index
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def load_window_data(version, start, end):
+    """Solo gli eventi in [start, end), dalle partizioni annuali che intersecano l'intervallo
+    (una voce per versione dei dati: niente TTL né svuotamenti globali)"""
+    return load_events_window(EXCEL_FILE, start, end)
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _contact_directory(version):
+    # Dai conteggi per contatto del sidecar: nessun caricamento degli eventi
+    return ContactDirectory.from_stats(load_stats(EXCEL_FILE) if os.path.exists(EXCEL_FILE) else None)
+
+def get_contact_directory():
+    """Nomi canonici dei contatti, calcolati una volta per versione dei dati"""
+    return _contact_directory(get_data_watcher().version)
+
+def contatti_canonici(df, version):
+    """Vista con un solo nome per contatto (il workbook conserva le grafie originali)
+    La mappatura copre tutti i contatti, così è la stessa in ogni vista e finestra."""
+    view = canonicalize_contacts(df, get_contact_directory())
+    # Versione distinta: le maschere dei filtri sui contatti non si mescolano con i dati grezzi
+    return view, version if view is df else f"{version}+contatti"
+
+def load_view_data(filtri, now=None):
+    """Dati di una vista: le sole partizioni necessarie se i filtri limitano le date, altrimenti tutto"""
+    window = FilterSpec.from_dict(filtri).date_window(now)
+    with profiler.section("load_data"):
+        if window is None:
+            df, version = load_data()
+        else:
+            df, version = load_window_data(get_data_watcher().version, *window)
+        return contatti_canonici(df, version)
+
+def filtra(df, version, filtri, sort_by='DATA EVENTO'):
+    """filter_events con le maschere delle clausole riusate tra i rerun"""
+    return filter_events(df, filtri, sort_by=sort_by, version=version, cache=get_mask_cache())
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_contact_similarity(version, _df):
+    """Contatti simili (top-k per contatto), calcolati una volta per versione dei dati"""
+    return ContactSimilarity.build(_df)
+
+@st.cache_resource
+def get_change_log():
+    """Storico delle modifiche (versioni per riga) del file eventi"""
+    return ChangeLog(EXCEL_FILE)
+
+def save_data(write, *args):
+    """Scrittura con storico (insert_event, update_event o delete_event)"""
+    df = write(*args, path=EXCEL_FILE, log=get_change_log())
+    # Nuova versione subito, senza attendere l'evento del file system
+    get_data_watcher().check()
+    return df
+
+# Cambi dei dati da altre sessioni o processi: il watcher riesegue questa sessione
+data_watcher = get_data_watcher()
+data_watcher.register_session()
+if notify_data_change(st.session_state, data_watcher.version):
+    st.toast("🔄 Dati aggiornati")
 
 # Sidebar
 with st.sidebar:
@@ -78,61 +189,46 @@ with st.sidebar:
     menu_option = st.radio(
         "Vista",
         ["🗓️ Timeline", "🏷️ Per Categoria", "👥 Per Contatto", 
-         "🔍 Cerca & Filtra", "➕ Nuovo Evento", "📊 Insights"],
+         "🔍 Cerca & Filtra", "➕ Nuovo Evento", "✏️ Modifica Evento", "📊 Insights"],
         label_visibility="collapsed"
     )
+    profiler.set_view(menu_option)
     
     st.markdown("---")
-    df = load_data()
-    if len(df) > 0:
-        st.metric("📌 Totale Eventi", len(df))
-        st.metric("📅 Prossimi 30gg", len(df[
-            (df['DATA EVENTO'] >= datetime.now()) &
-            (df['DATA EVENTO'] <= datetime.now() + timedelta(days=30))
-        ]))
+    profiler.checkpoint("sidebar")
+    # Indicatori dal sidecar: i dati si caricano nelle viste, solo per la finestra che serve
+    with profiler.section("statistiche_sidecar"):
+        stats = load_stats(EXCEL_FILE) if os.path.exists(EXCEL_FILE) else {"totale": 0}
+    has_data = stats["totale"] > 0
+    if has_data:
+        st.metric("📌 Totale Eventi", stats["totale"])
+        st.metric("📅 Prossimi 30gg", upcoming_events(stats, days=30))
 
 st.markdown('<div class="main-header">🔍 Esplora Eventi</div>', unsafe_allow_html=True)
+profiler.checkpoint("intestazione")
 
 # ========== TIMELINE ==========
 if menu_option == "🗓️ Timeline":
     st.header("Timeline Cronologica")
     
-    if len(df) > 0:
+    if has_data:
         col1, col2 = st.columns([2, 1])
         with col1:
             filtro_cat = st.multiselect("Filtra per Categoria", CATEGORIE, key="tl_cat")
         with col2:
-            periodo = st.selectbox("Periodo", ["Tutti", "Passati", "Futuri", "Questo Mese", "Prossimi 3 Mesi"])
-        
-        df_filtered = df.copy()
-        
-        # Filtro categoria
-        if filtro_cat:
-            df_filtered = df_filtered[df_filtered['CATEGORIA'].isin(filtro_cat)]
-        
-        # Filtro periodo
-        now = datetime.now()
-        if periodo == "Passati":
-            df_filtered = df_filtered[df_filtered['DATA EVENTO'] < now]
-        elif periodo == "Futuri":
-            df_filtered = df_filtered[df_filtered['DATA EVENTO'] >= now]
-        elif periodo == "Questo Mese":
-            df_filtered = df_filtered[
-                (df_filtered['DATA EVENTO'].dt.month == now.month) &
-                (df_filtered['DATA EVENTO'].dt.year == now.year)
-            ]
-        elif periodo == "Prossimi 3 Mesi":
-            df_filtered = df_filtered[
-                (df_filtered['DATA EVENTO'] >= now) &
-                (df_filtered['DATA EVENTO'] <= now + timedelta(days=90))
-            ]
+            periodo = st.selectbox("Periodo", PERIODI)
         
-        df_filtered = df_filtered.sort_values('DATA EVENTO')
+        profiler.checkpoint("filtri")
+        df_periodo, periodo_version = load_view_data({"periodo": periodo})
+        df_filtered = filtra(df_periodo, periodo_version, {"periodo": periodo, "categorie": filtro_cat})
         
         st.info(f"📊 **{len(df_filtered)} eventi** visualizzati")
         
         if len(df_filtered) > 0:
             # Timeline grafico
+            profiler.checkpoint("grafico")
+            import plotly.graph_objects as go
+            
             fig = go.Figure()
             
             colors_cat = {
@@ -168,6 +264,7 @@ if menu_option == "🗓️ Timeline":
             # Lista dettagliata
             st.markdown("---")
             st.subheader("📋 Dettaglio Eventi")
+            profiler.checkpoint("lista")
             
             df_filtered_sorted = df_filtered.sort_values(by='DATA EVENTO', ascending=False)
 
@@ -193,10 +290,14 @@ if menu_option == "🗓️ Timeline":
 
 # ========== PER CATEGORIA ==========
 elif menu_option == "🏷️ Per Categoria":
+    import plotly.express as px
+    
     st.header("Esplora per Categoria")
     
+    df, data_version = load_view_data({})
     if len(df) > 0:
         # Overview categorie
+        profiler.checkpoint("grafici")
         st.subheader("📊 Distribuzione Categorie")
         cat_counts = df['CATEGORIA'].value_counts()
         
@@ -224,10 +325,11 @@ elif menu_option == "🏷️ Per Categoria":
         st.markdown("---")
         
         # Esplora ogni categoria
+        profiler.checkpoint("dettaglio")
         st.subheader("🔍 Esplora Categoria")
         categoria_sel = st.selectbox("Seleziona Categoria", CATEGORIE)
         
-        df_cat = df[df['CATEGORIA'] == categoria_sel].sort_values('DATA EVENTO')
+        df_cat = filtra(df, data_version, {"categorie": [categoria_sel]})
         
         if len(df_cat) > 0:
             st.info(f"**{len(df_cat)} eventi** in questa categoria")
@@ -259,6 +361,7 @@ elif menu_option == "🏷️ Per Categoria":
             st.plotly_chart(fig_contatti, use_container_width=True)
             
             # Lista eventi
+            profiler.checkpoint("lista")
             st.markdown("#### 📋 Eventi")
             for _, evento in df_cat.iterrows():
                 data_str = evento['DATA EVENTO'].strftime('%d/%m/%Y') if pd.notna(evento['DATA EVENTO']) else 'N/A'
@@ -275,10 +378,14 @@ elif menu_option == "🏷️ Per Categoria":
 
 # ========== PER CONTATTO ==========
 elif menu_option == "👥 Per Contatto":
+    import plotly.express as px
+    
     st.header("Esplora per Contatto")
     
+    df, data_version = load_view_data({})
     if len(df) > 0:
         # Top contatti
+        profiler.checkpoint("grafici")
         st.subheader("📊 Top Contatti")
         contatti_counts = df['A CHI CHIEDERE'].value_counts().head(15)
         
@@ -293,13 +400,27 @@ elif menu_option == "👥 Per Contatto":
         )
         st.plotly_chart(fig, use_container_width=True)
         
+        # Grafie diverse dello stesso contatto, contate insieme
+        gruppi = get_contact_directory().groups()
+        if gruppi:
+            with st.expander(f"🔀 Contatti scritti in più modi, contati insieme: {len(gruppi)}"):
+                st.dataframe(
+                    pd.DataFrame(
+                        [(canonico, ", ".join(sorted(varianti))) for canonico, varianti in sorted(gruppi.items())],
+                        columns=['Contatto', 'Scritto anche come']
+                    ),
+                    use_container_width=True,
+                    hide_index=True
+                )
+        
         st.markdown("---")
         
         # Seleziona contatto
+        profiler.checkpoint("dettaglio")
         st.subheader("🔍 Esplora Contatto")
         contatto_sel = st.selectbox("Seleziona Contatto", sorted(df['A CHI CHIEDERE'].unique()))
         
-        df_contatto = df[df['A CHI CHIEDERE'] == contatto_sel].sort_values('DATA EVENTO')
+        df_contatto = filtra(df, data_version, {"contatti": [contatto_sel]})
         
         if len(df_contatto) > 0:
             st.info(f"**{len(df_contatto)} eventi** con questo contatto")
@@ -338,6 +459,7 @@ elif menu_option == "👥 Per Contatto":
             st.plotly_chart(fig_timeline, use_container_width=True)
             
             # Lista eventi
+            profiler.checkpoint("lista")
             st.markdown("#### 📋 Tutti gli Eventi")
             for _, evento in df_contatto.iterrows():
                 data_str = evento['DATA EVENTO'].strftime('%d/%m/%Y') if pd.notna(evento['DATA EVENTO']) else 'N/A'
@@ -356,13 +478,21 @@ elif menu_option == "👥 Per Contatto":
 elif menu_option == "🔍 Cerca & Filtra":
     st.header("Cerca e Filtra Eventi")
     
+    # Tutti gli eventi servono per le opzioni dei filtri (contatti e tag)
+    df, data_version = load_view_data({})
     if len(df) > 0:
         # Filtri
+        profiler.checkpoint("widget_filtri")
         with st.expander("🔧 Filtri Avanzati", expanded=True):
             col1, col2, col3 = st.columns(3)
             
             with col1:
                 search_term = st.text_input("🔍 Cerca nel nome")
+                semantica = st.toggle(
+                    "🧠 Ricerca semantica",
+                    help="Cerca per significato in nome, note e tag (es. 'formazione AI' trova anche i corsi "
+                         "sull'intelligenza artificiale), con i risultati ordinati per rilevanza"
+                )
                 filtro_cat = st.multiselect("Categoria", CATEGORIE)
             
             with col2:
@@ -375,11 +505,9 @@ elif menu_option == "🔍 Cerca & Filtra":
             with col3:
                 if 'TAG' in df.columns:
                     # Estrai tutti i tag unici
-                    all_tags = set()
-                    for tags in df['TAG'].dropna():
-                        all_tags.update([t.strip() for t in str(tags).split(',')])
+                    all_tags = unique_tags(df)
                     if all_tags:
-                        filtro_tag = st.multiselect("Tag", sorted(all_tags))
+                        filtro_tag = st.multiselect("Tag", all_tags)
                     else:
                         filtro_tag = []
                 else:
@@ -388,54 +516,79 @@ elif menu_option == "🔍 Cerca & Filtra":
                 data_a = st.date_input("Data A", value=None)
         
         # Applica filtri
-        df_filtered = df.copy()
-        
-        if search_term:
-            mask = df_filtered['NOME EVENTO'].str.contains(search_term, case=False, na=False)
-            if 'NOTE' in df_filtered.columns:
-                mask |= df_filtered['NOTE'].str.contains(search_term, case=False, na=False)
-            df_filtered = df_filtered[mask]
-        
-        if filtro_cat:
-            df_filtered = df_filtered[df_filtered['CATEGORIA'].isin(filtro_cat)]
-        
-        if filtro_persona:
-            df_filtered = df_filtered[df_filtered['A CHI CHIEDERE'].isin(filtro_persona)]
-        
-        if filtro_tag and 'TAG' in df.columns:
-            mask = df_filtered['TAG'].apply(
-                lambda x: any(tag in str(x) for tag in filtro_tag) if pd.notna(x) else False
-            )
-            df_filtered = df_filtered[mask]
-        
-        if data_da:
-            df_filtered = df_filtered[df_filtered['DATA EVENTO'] >= pd.to_datetime(data_da)]
-        
-        if data_a:
-            df_filtered = df_filtered[df_filtered['DATA EVENTO'] <= pd.to_datetime(data_a)]
+        profiler.checkpoint("filtri")
+        ricerca_semantica = semantica and bool(search_term.strip())
+        filtri = {
+            "testo": None if ricerca_semantica else search_term,
+            "categorie": filtro_cat,
+            "contatti": filtro_persona,
+            "tag": filtro_tag,
+            "data_da": data_da,
+            "data_a": data_a
+        }
+        df_cerca, cerca_version = load_view_data(filtri)
+        df_filtered = filtra(df_cerca, cerca_version, filtri, sort_by=None)
+        
+        if ricerca_semantica:
+            profiler.checkpoint("ricerca_semantica")
+            rilevanza = indice_testi().scores(df_filtered, search_term)
+            df_filtered = df_filtered[rilevanza >= MIN_SCORE].assign(RILEVANZA=rilevanza[rilevanza >= MIN_SCORE])
         
         # Risultati
+        profiler.checkpoint("risultati")
         st.markdown("---")
         col1, col2 = st.columns([3, 1])
         with col1:
             st.subheader(f"📊 Risultati: {len(df_filtered)} eventi")
         with col2:
-            ordina = st.selectbox("Ordina", ['DATA EVENTO', 'NOME EVENTO', 'CATEGORIA'])
+            ordinamenti = ['DATA EVENTO', 'NOME EVENTO', 'CATEGORIA']
+            ordina = st.selectbox("Ordina", ['RILEVANZA'] + ordinamenti if ricerca_semantica else ordinamenti)
         
-        df_filtered = df_filtered.sort_values(by=ordina)
+        df_filtered = df_filtered.sort_values(by=ordina, ascending=ordina != 'RILEVANZA')
         
         if len(df_filtered) > 0:
             # Tabella
+            colonne = ['DATA EVENTO', 'NOME EVENTO', 'CATEGORIA', 'A CHI CHIEDERE']
             st.dataframe(
-                df_filtered[['DATA EVENTO', 'NOME EVENTO', 'CATEGORIA', 'A CHI CHIEDERE']],
+                df_filtered[(['RILEVANZA'] if ricerca_semantica else []) + colonne],
+                column_config={
+                    'RILEVANZA': st.column_config.ProgressColumn("Rilevanza", min_value=0, max_value=1, format="%.2f")
+                },
                 use_container_width=True,
                 hide_index=True
             )
             
+            # Eventi simili a uno dei risultati, cercati tra tutti gli eventi (solo su richiesta)
+            if st.toggle("🧭 Eventi simili", key="mostra_simili"):
+                risultati = df_filtered.head(500)
+                etichette = [
+                    f"{row['DATA EVENTO'].strftime('%d/%m/%Y') if pd.notna(row['DATA EVENTO']) else 'senza data'} · "
+                    f"{row['NOME EVENTO']}"
+                    for _, row in risultati.iterrows()
+                ]
+                scelto = st.selectbox("Evento", range(len(risultati)), format_func=lambda i: etichette[i],
+                                      key="evento_simili")
+                event_index = indice_testi()
+                # La vista ha le stesse righe dei dati indicizzati, cambia solo il nome dei contatti
+                simili = event_index.similar(df, risultati.iloc[scelto], k=5, version=event_index.version)
+                if len(simili) > 0:
+                    st.dataframe(
+                        simili[['RILEVANZA'] + colonne],
+                        column_config={
+                            'RILEVANZA': st.column_config.ProgressColumn("Similarità", min_value=0, max_value=1,
+                                                                         format="%.2f")
+                        },
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                else:
+                    st.info("Nessun evento con nome, note o tag simili")
+            
             # Export
+            profiler.checkpoint("export")
             col1, col2 = st.columns(2)
             with col1:
-                csv = df_filtered.to_csv(index=False)
+                csv = to_csv(df_filtered)
                 st.download_button(
                     "📥 Scarica CSV",
                     csv,
@@ -458,6 +611,21 @@ elif menu_option == "🔍 Cerca & Filtra":
 elif menu_option == "➕ Nuovo Evento":
     st.header("Registra Nuovo Evento")
     
+    # Contatto fuori dal form: i suggerimenti si aggiornano appena il nome è inserito
+    def usa_contatto(nome_contatto):
+        st.session_state.nuovo_contatto = nome_contatto
+    
+    if st.session_state.pop("svuota_contatto", False):
+        st.session_state.nuovo_contatto = ""
+    persona = st.text_input("👤 Contatto*", placeholder="Nome referente", key="nuovo_contatto")
+    for i, (nome_simile, eventi_simile) in enumerate(get_contact_directory().suggest(persona)):
+        st.button(
+            f"🔀 Forse intendevi **{nome_simile}**? ({eventi_simile} eventi)",
+            on_click=usa_contatto,
+            args=(nome_simile,),
+            key=f"suggerimento_contatto_{i}"
+        )
+    
     with st.form("nuovo_evento", clear_on_submit=True):
         col1, col2 = st.columns(2)
         
@@ -467,7 +635,6 @@ elif menu_option == "➕ Nuovo Evento":
             categoria = st.selectbox("🏷️ Categoria*", CATEGORIE)
         
         with col2:
-            persona = st.text_input("👤 Contatto*", placeholder="Nome referente")
             link = st.text_input("🔗 Link", placeholder="https://...")
             tag = st.text_input("🏷️ Tag", placeholder="tech, AI, formazione (separati da virgola)")
         
@@ -489,24 +656,140 @@ elif menu_option == "➕ Nuovo Evento":
                     'TIMESTAMP MODIFICA': ''
                 }
                 
+                df, _ = load_data()
                 if 'NOTE' in df.columns:
                     nuovo['NOTE'] = note
                 if 'TAG' in df.columns:
                     nuovo['TAG'] = tag
                 
-                df = pd.concat([df, pd.DataFrame([nuovo])], ignore_index=True)
-                save_data(df)
+                with profiler.section("save_data"):
+                    save_data(insert_event, df, nuovo, username)
                 
+                st.session_state.svuota_contatto = True
                 st.success(f"✅ Evento '{nome}' registrato con successo!")
                 st.balloons()
                 st.rerun()
             else:
                 st.error("⚠️ Compila i campi obbligatori (*)")
 
+# ========== MODIFICA EVENTO ==========
+elif menu_option == "✏️ Modifica Evento":
+    st.header("Modifica o Elimina Evento")
+    
+    if "esito_modifica" in st.session_state:
+        st.success(st.session_state.pop("esito_modifica"))
+    
+    # Dati come scritti nel workbook, senza nomi canonici: il form salva il testo originale
+    with profiler.section("load_data"):
+        df, data_version = load_data()
+    if len(df) > 0:
+        profiler.checkpoint("selezione")
+        cerca_evento = st.text_input("🔍 Cerca evento", placeholder="Nome, contatto o note")
+        if cerca_evento:
+            # Testo in nome e note (filtro condiviso) oppure nel contatto
+            trovati = filter_mask(df, {"testo": cerca_evento}, version=data_version, cache=get_mask_cache())
+            per_contatto = df['A CHI CHIEDERE'].astype('string').str.contains(
+                cerca_evento.strip(), case=False, regex=False, na=False).to_numpy(dtype=bool)
+            df_sel = df[trovati | per_contatto]
+        else:
+            df_sel = df
+        df_sel = df_sel.sort_values('DATA EVENTO', ascending=False)
+        
+        if len(df_sel) == 0:
+            st.info("Nessun evento trovato")
+        else:
+            posizioni = list(range(min(len(df_sel), 500)))
+            etichette = [
+                f"{row['DATA EVENTO'].strftime('%d/%m/%Y') if pd.notna(row['DATA EVENTO']) else 'senza data'} · "
+                f"{row['NOME EVENTO']} · {row['A CHI CHIEDERE']}"
+                for _, row in df_sel.head(len(posizioni)).iterrows()
+            ]
+            scelta = st.selectbox("Evento", posizioni, format_func=lambda i: etichette[i])
+            evento = df_sel.iloc[scelta]
+            riga = df.index.get_loc(df_sel.index[scelta])
+            
+            profiler.checkpoint("modulo")
+            with st.form("modifica_evento"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    nome = st.text_input("📝 Nome Evento*", value=evento['NOME EVENTO'])
+                    data = st.date_input("📅 Data Evento*", evento['DATA EVENTO'].date() if pd.notna(evento['DATA EVENTO']) else datetime.now())
+                    categoria = st.selectbox("🏷️ Categoria*", CATEGORIE,
+                                             index=CATEGORIE.index(evento['CATEGORIA']) if evento['CATEGORIA'] in CATEGORIE else 0)
+                with col2:
+                    persona = st.text_input("👤 Contatto*", value=evento['A CHI CHIEDERE'])
+                    link = st.text_input("🔗 Link", value=evento['LINK EVENTO'] if pd.notna(evento['LINK EVENTO']) else "")
+                    tag = st.text_input("🏷️ Tag", value=evento['TAG'] if 'TAG' in df.columns and pd.notna(evento['TAG']) else "")
+                note = st.text_area("📝 Note", value=evento['NOTE'] if 'NOTE' in df.columns and pd.notna(evento['NOTE']) else "")
+                
+                col1, col2 = st.columns(2)
+                with col1:
+                    salva = st.form_submit_button("💾 Salva Modifiche", type="primary", use_container_width=True)
+                with col2:
+                    elimina = st.form_submit_button("🗑️ Elimina Evento", use_container_width=True)
+                conferma = st.checkbox("Confermo l'eliminazione")
+            
+            if salva or elimina:
+                # Le modifiche sono registrate per ID: se manca (workbook storico) lo si assegna ora
+                df = ensure_event_ids(df)
+                event_id = df[ID_COLUMN].iloc[riga]
+                if elimina and not conferma:
+                    st.warning("⚠️ Spunta la conferma per eliminare l'evento")
+                elif elimina:
+                    with profiler.section("save_data"):
+                        save_data(delete_event, df, event_id, username)
+                    st.session_state.esito_modifica = f"🗑️ Evento '{evento['NOME EVENTO']}' eliminato"
+                    st.rerun()
+                elif not (nome and persona):
+                    st.error("⚠️ Compila i campi obbligatori (*)")
+                else:
+                    changes = {'NOME EVENTO': nome, 'DATA EVENTO': pd.Timestamp(data), 'CATEGORIA': categoria,
+                               'A CHI CHIEDERE': persona, 'LINK EVENTO': link}
+                    if 'NOTE' in df.columns:
+                        changes['NOTE'] = note
+                    if 'TAG' in df.columns:
+                        changes['TAG'] = tag
+                    with profiler.section("save_data"):
+                        save_data(update_event, df, event_id, changes, username)
+                    st.session_state.esito_modifica = f"✅ Evento '{nome}' aggiornato"
+                    st.rerun()
+            
+            # Storico della riga (solo se l'evento ha già un ID, cioè è passato da una scrittura)
+            if ID_COLUMN in df.columns and pd.notna(evento.get(ID_COLUMN)):
+                with st.expander("🕓 Storico modifiche"):
+                    versioni = get_change_log().history(evento[ID_COLUMN])
+                    if versioni:
+                        st.dataframe(pd.DataFrame(versioni).drop(columns="dati"), hide_index=True, use_container_width=True)
+                    else:
+                        st.caption("Nessuna versione registrata")
+        
+        # Com'erano gli eventi a una data passata, dal log delle versioni
+        profiler.checkpoint("as_of")
+        st.markdown("---")
+        st.subheader("🕰️ Eventi a una data passata")
+        giorno = st.date_input("Com'erano gli eventi il", value=None, max_value=datetime.now().date(), key="as_of")
+        if giorno is not None:
+            fine_giorno = pd.Timestamp(giorno) + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+            df_storico = get_change_log().as_of(fine_giorno)
+            if len(df_storico) == 0:
+                st.info("📭 Nessuna versione registrata a quella data (lo storico parte dalla prima modifica)")
+            else:
+                st.info(f"📊 **{len(df_storico)} eventi** al {giorno.strftime('%d/%m/%Y')}")
+                st.dataframe(
+                    df_storico[['DATA EVENTO', 'NOME EVENTO', 'CATEGORIA', 'A CHI CHIEDERE']].sort_values('DATA EVENTO'),
+                    use_container_width=True, hide_index=True
+                )
+                st.download_button("📥 Esporta CSV", to_csv(df_storico), f"eventi_al_{giorno:%Y%m%d}.csv", "text/csv")
+    else:
+        st.info("📭 Nessun evento nel database")
+
 # ========== INSIGHTS ==========
 elif menu_option == "📊 Insights":
+    import plotly.express as px
+    
     st.header("Insights e Affinità")
     
+    df, data_version = load_view_data({})
     if len(df) > 0:
         # Insights box
         st.markdown("""
@@ -516,14 +799,29 @@ elif menu_option == "📊 Insights":
         </div>
         """, unsafe_allow_html=True)
         
+        # Digest AI precalcolato (se il job è attivo): quello della versione attuale o l'ultimo disponibile
+        profiler.checkpoint("digest")
+        digest_store = DigestStore()
+        digest = digest_store.load(get_data_watcher().version)
+        if digest is None or digest["stato"] != STATUS_DONE:
+            digest, digest_current = digest_store.latest(), False
+        else:
+            digest_current = True
+        if digest is not None:
+            with st.expander("🗞️ Digest AI di oggi", expanded=digest_current):
+                if not digest_current:
+                    st.warning("⚠️ Digest calcolato su una versione precedente dei dati")
+                st.markdown(digest_markdown(digest))
+                st.caption(f"Precalcolato il {digest['completato'].replace('T', ' ')[:16]} con {digest['modello']}")
+        
         tab1, tab2, tab3 = st.tabs(["📈 Trend", "🤝 Affinità", "💡 Potenzialità"])
         
         with tab1:
+            profiler.checkpoint("trend")
             st.subheader("📈 Trend Temporali")
             
             # Eventi per mese
-            df['Mese'] = df['DATA EVENTO'].dt.to_period('M').astype(str)
-            eventi_mese = df.groupby('Mese').size().reset_index(name='Numero Eventi')
+            eventi_mese = monthly_trend(df)
             
             fig = px.line(
                 eventi_mese,
@@ -535,30 +833,22 @@ elif menu_option == "📊 Insights":
             st.plotly_chart(fig, use_container_width=True)
             
             # Distribuzione per giorno settimana
-            df['Giorno'] = df['DATA EVENTO'].dt.day_name()
-            giorni_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            giorni_it = {'Monday': 'Lunedì', 'Tuesday': 'Martedì', 'Wednesday': 'Mercoledì', 
-                        'Thursday': 'Giovedì', 'Friday': 'Venerdì', 'Saturday': 'Sabato', 'Sunday': 'Domenica'}
-            
-            giorno_counts = df['Giorno'].value_counts()
+            giorni = weekday_counts(df)
             fig_giorni = px.bar(
-                x=[giorni_it[g] for g in giorni_order if g in giorno_counts.index],
-                y=[giorno_counts[g] for g in giorni_order if g in giorno_counts.index],
-                title="Eventi per Giorno della Settimana",
-                labels={'x': 'Giorno', 'y': 'Numero Eventi'}
+                giorni,
+                x='Giorno',
+                y='Numero Eventi',
+                title="Eventi per Giorno della Settimana"
             )
             st.plotly_chart(fig_giorni, use_container_width=True)
         
         with tab2:
+            profiler.checkpoint("affinita")
             st.subheader("🤝 Affinità e Relazioni")
             
             # Matrice contatti x categorie
             st.markdown("#### Contatti più Attivi per Categoria")
-            pivot = pd.crosstab(df['A CHI CHIEDERE'], df['CATEGORIA'])
-            
-            # Top 10 contatti
-            top_contatti = df['A CHI CHIEDERE'].value_counts().head(10).index
-            pivot_top = pivot.loc[top_contatti]
+            pivot_top = contact_category_matrix(df, top=10)
             
             fig_heatmap = px.imshow(
                 pivot_top,
@@ -575,53 +865,58 @@ elif menu_option == "📊 Insights":
             st.markdown("#### 🔗 Possibili Sinergie")
             st.info("Contatti che operano nelle stesse categorie potrebbero avere interessi comuni")
             
-            for cat in CATEGORIE:
-                df_cat = df[df['CATEGORIA'] == cat]
-                contatti = df_cat['A CHI CHIEDERE'].unique()
-                if len(contatti) > 1:
-                    st.markdown(f"**{cat}:**")
-                    st.write(", ".join(contatti[:10]))
+            for cat, contatti in category_synergies(df, limit=10).items():
+                st.markdown(f"**{cat}:**")
+                st.write(", ".join(contatti))
+            
+            # Contatti simili: categorie, tag e mesi degli eventi in comune
+            st.markdown("#### 👥 Chi lavora su temi simili")
+            with profiler.section("similarita"):
+                similarita = get_contact_similarity(data_version, df)
+            contatto_scelto = st.selectbox("Contatto", similarita.contacts, key="contatto_affinita")
+            simili = similarita.similar(contatto_scelto, k=10)
+            if len(simili) > 0:
+                st.dataframe(
+                    simili,
+                    column_config={
+                        'Similarità': st.column_config.ProgressColumn(min_value=0, max_value=1, format="%.2f")
+                    },
+                    hide_index=True,
+                    use_container_width=True
+                )
+            else:
+                st.info("Nessun contatto con categorie, tag o periodi in comune")
         
         with tab3:
+            profiler.checkpoint("potenzialita")
             st.subheader("💡 Potenzialità")
             
             # Categorie con più momentum
             st.markdown("#### 🚀 Categorie in Crescita")
             
             # Eventi ultimi 3 mesi vs precedenti
+            # Solo gli ultimi 180 giorni: partizioni dell'anno in corso (ed eventualmente del precedente)
             now = datetime.now()
-            tre_mesi_fa = now - timedelta(days=90)
-            sei_mesi_fa = now - timedelta(days=180)
-            
-            df_recenti = df[(df['DATA EVENTO'] >= tre_mesi_fa) & (df['DATA EVENTO'] <= now)]
-            df_precedenti = df[(df['DATA EVENTO'] >= sei_mesi_fa) & (df['DATA EVENTO'] < tre_mesi_fa)]
+            df_recenti, _ = load_window_data(get_data_watcher().version,
+                                             pd.Timestamp(now - timedelta(days=180)).normalize(),
+                                             pd.Timestamp(now).normalize() + pd.Timedelta(days=1))
+            crescita = category_growth(df_recenti, now, window_days=90)
             
-            if len(df_recenti) > 0 and len(df_precedenti) > 0:
-                recenti_cat = df_recenti['CATEGORIA'].value_counts()
-                precedenti_cat = df_precedenti['CATEGORIA'].value_counts()
-                
-                for cat in CATEGORIE:
-                    rec = recenti_cat.get(cat, 0)
-                    prec = precedenti_cat.get(cat, 0)
-                    if prec > 0:
-                        crescita = ((rec - prec) / prec * 100)
-                        if crescita > 0:
-                            st.metric(cat, f"{rec} eventi", f"+{crescita:.0f}% vs 3 mesi fa")
+            if crescita['Recenti'].sum() > 0 and crescita['Precedenti'].sum() > 0:
+                for _, row in crescita[crescita['Crescita %'] > 0].iterrows():
+                    st.metric(row['Categoria'], f"{row['Recenti']} eventi", f"+{row['Crescita %']:.0f}% vs 3 mesi fa")
             
             # Gap da esplorare
             st.markdown("#### 🎯 Opportunità")
             
             # Contatti con pochi eventi
-            contatti_counts = df['A CHI CHIEDERE'].value_counts()
-            contatti_poco_attivi = contatti_counts[contatti_counts <= 2]
+            contatti_poco_attivi = low_activity_contacts(df, max_events=2)
             
             if len(contatti_poco_attivi) > 0:
                 st.info(f"**{len(contatti_poco_attivi)} contatti** hanno 1-2 eventi. Potenziale per approfondire le relazioni!")
             
             # Categorie sottorappresentate
-            cat_counts = df['CATEGORIA'].value_counts()
-            media = cat_counts.mean()
-            cat_sotto = cat_counts[cat_counts < media]
+            cat_sotto, media = underrepresented_categories(df)
             
             if len(cat_sotto) > 0:
                 st.warning("**Categorie con meno eventi della media:**")
@@ -631,26 +926,27 @@ elif menu_option == "📊 Insights":
             # Tag più usati
             if 'TAG' in df.columns:
                 st.markdown("#### 🏷️ Tag Emergenti")
-                all_tags = []
-                for tags in df['TAG'].dropna():
-                    all_tags.extend([t.strip() for t in str(tags).split(',')])
+                tag_counts = top_tags(df, n=10)
                 
-                if all_tags:
-                    tag_counts = Counter(all_tags).most_common(10)
+                if len(tag_counts) > 0:
                     fig_tags = px.bar(
-                        x=[t[1] for t in tag_counts],
-                        y=[t[0] for t in tag_counts],
+                        tag_counts,
+                        x='Frequenza',
+                        y='Tag',
                         orientation='h',
-                        title="Top 10 Tag",
-                        labels={'x': 'Frequenza', 'y': 'Tag'}
+                        title="Top 10 Tag"
                     )
                     st.plotly_chart(fig_tags, use_container_width=True)
     else:
         st.info("📭 Nessun evento nel database per generare insights")
 
 # Footer
+profiler.checkpoint("footer")
 st.markdown("---")
 st.markdown(
     "<div style='text-align: center; color: gray;'>🔍 Esplora Eventi </div>",
     unsafe_allow_html=True
 )
+
+profiler.finish()
+render_profiler_panel(profiler)
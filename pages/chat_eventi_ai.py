@@ -5,11 +5,32 @@ Analizza il file Excel eventi usando conversazioni naturali con Claude
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
+import json
 import os
-from anthropic import Anthropic
+import uuid
+
+from eventi.batch import (
+    DEFAULT_BATCH_CONCURRENCY, SOURCE_LABELS, parse_questions, report_markdown, results_dataframe, run_batch
+)
+from eventi.charts import CHART_INTENTS
+from eventi.chat_store import ChatArchive, cap_history, chart_spec, chart_spec_key, with_version
+from eventi.chunked import MAX_CONTEXT_TOKENS, needs_chunking, run_map_reduce
+from eventi.claude_client import stream_message
+from eventi.digest import STATUS_DONE, STATUS_FAILED, STATUS_RUNNING, DigestWorker, digest_markdown
+from eventi.encoding import dataframe_summary
+from eventi.fast_path import answer_locally
+from eventi.history import DEFAULT_HISTORY_BUDGET, build_messages, conversation_key, estimate_tokens
+from eventi.metrics import MetricsLog, RequestMetrics, summarize
+from eventi.profiler import profiler_enabled, render_profiler_panel, session_profiler
+from eventi.fingerprint import data_fingerprint
+from eventi.query_tools import build_chart, describe_dataset, run_tool_conversation
+from eventi.response_cache import ResponseCache
+from eventi.router import TIER_AUTO, TIER_FAST, TIER_LARGE, ModelRouter
+from eventi.scheduler import RequestScheduler
+from eventi.snapshot import SnapshotStore
+from eventi.vector_index import shared_index
+from eventi.watcher import notify_data_change, shared_watcher
 
 # Configurazione pagina
 st.set_page_config(
@@ -19,6 +40,18 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+profiler = session_profiler(st.session_state, profiler_enabled(st.query_params))
+profiler.start_run("Chat AI")
+profiler.checkpoint("setup")
+
+
+def stop_page():
+    """st.stop() che chiude il rerun misurato e mostra comunque il pannello del profiler"""
+    profiler.finish()
+    render_profiler_panel(profiler)
+    st.stop()
+
+
 # CSS personalizzato
 st.markdown("""
 <style>
@@ -46,195 +79,213 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 EXCEL_FILE = "gestione_eventi.xlsx"
+CLAUDE_MODEL = "claude-sonnet-4-20250514"  # Latest Claude Sonnet
+
+# System prompt per Claude
+SYSTEM_PROMPT = """Sei un assistente esperto nell'analisi di dati eventi per aziende.
+
+Il tuo compito è aiutare l'utente a esplorare, analizzare e comprendere i dati degli eventi forniti.
+
+**IMPORTANTE: Hai accesso al DATASET COMPLETO di tutti gli eventi in formato tabellare compatto.**
+Categorie e contatti sono indicati con codici brevi (C1, P1, ...): usa la legenda per tradurli
+e riporta sempre i nomi completi nelle risposte, mai i codici.
+Non limitarti a un'anteprima - analizza tutti i dati forniti per dare risposte accurate e complete.
+
+**Capacità:**
+- Analisi statistica dettagliata dei dati completi
+- Identificazione pattern e trend su tutto il dataset
+- Risposta a domande specifiche analizzando tutti gli eventi
+- Calcolo di statistiche precise (conteggi, medie, aggregazioni)
+- Suggerimento di visualizzazioni appropriate
+- Identificazione di affinità e relazioni tra contatti/categorie
+- Analisi temporali e previsioni basate su tutti i dati storici
+
+**Stile di risposta:**
+- Sii conciso ma completo
+- Usa emoji appropriate per rendere le risposte più leggibili
+- Fornisci numeri e statistiche concrete basate su TUTTI i dati
+- Se l'utente chiede conteggi o statistiche, analizza l'intero dataset
+- Se l'utente chiede un grafico, suggerisci quale tipo sarebbe più appropriato
+- Rispondi SEMPRE in italiano
+
+**Importante:**
+- Basa le tue risposte SOLO sui dati forniti nel dataset completo
+- Analizza TUTTI gli eventi, non solo un campione
+- Se non hai informazioni sufficienti, dillo chiaramente
+- Non inventare dati o statistiche
+- Quando fai conteggi o aggregazioni, usa TUTTI i dati della tabella
+"""
+
+# System prompt per la modalità strumenti (Claude non riceve la tabella, la interroga)
+TOOLS_SYSTEM_PROMPT = """Sei un assistente esperto nell'analisi di dati eventi per aziende.
+
+Non ricevi la tabella degli eventi: hai a disposizione strumenti che la interrogano localmente
+e restituiscono risultati ESATTI calcolati su tutto il dataset.
+
+**Regole:**
+- Per ogni conteggio, classifica, trend o elenco usa gli strumenti, non stimare mai i numeri
+- Combina più chiamate se servono (es. top contatti e poi dettaglio eventi di un contatto)
+- Usa i filtri degli strumenti invece di chiedere elenchi completi
+- Se l'utente chiede un grafico, usa lo strumento crea_grafico
+- Per eventi su un tema o simili a un evento usa ricerca_semantica (il filtro testo cerca solo parole esatte)
+- Se gli strumenti non permettono di rispondere, dillo chiaramente
+
+**Stile di risposta:**
+- Sii conciso ma completo
+- Usa emoji appropriate per rendere le risposte più leggibili
+- Rispondi SEMPRE in italiano
+"""
 
 # ==================== FUNZIONI UTILITY ====================
 
-@st.cache_data(ttl=3600)
+@st.cache_resource
+def get_snapshot_store():
+    """Snapshot Arrow del file eventi, mappato in memoria e condiviso da sessioni e processi"""
+    return SnapshotStore(EXCEL_FILE)
+
+
+@st.cache_resource
+def get_data_watcher():
+    """Versione dei dati dal watcher del file (condiviso con le altre pagine del processo)"""
+    return shared_watcher(EXCEL_FILE)
+
+
 def load_excel_data():
-    """Carica il file Excel degli eventi con caching"""
+    """Carica gli eventi dallo snapshot della versione corrente del file (senza copie)"""
     if not os.path.exists(EXCEL_FILE):
         return None, "❌ File 'gestione_eventi.xlsx' non trovato"
     
     try:
-        df = pd.read_excel(EXCEL_FILE)
-        
-        # Converti date
-        if 'DATA EVENTO' in df.columns:
-            df['DATA EVENTO'] = pd.to_datetime(df['DATA EVENTO'], errors='coerce', dayfirst=True)
-        if 'TIMESTAMP INSERIMENTO' in df.columns:
-            df['TIMESTAMP INSERIMENTO'] = pd.to_datetime(df['TIMESTAMP INSERIMENTO'], errors='coerce')
-        if 'TIMESTAMP MODIFICA' in df.columns:
-            df['TIMESTAMP MODIFICA'] = pd.to_datetime(df['TIMESTAMP MODIFICA'], errors='coerce')
-        
+        df, _ = get_snapshot_store().load()
         return df, None
     except Exception as e:
         return None, f"❌ Errore caricamento: {str(e)}"
 
 
-def get_dataframe_summary(df):
-    """Crea un sommario dettagliato del dataframe per Claude includendo TUTTI i dati"""
-    
-    # Informazioni base
-    summary = f"""📊 **DATASET EVENTI - Informazioni Complete**
+@st.cache_resource
+def get_response_cache():
+    """Cache persistente delle risposte condivisa tra le sessioni"""
+    return ResponseCache()
 
-**Dimensioni:** {len(df):,} eventi × {len(df.columns)} colonne
 
-**Colonne disponibili:**
-{', '.join(df.columns.tolist())}
+@st.cache_resource
+def get_metrics_log():
+    """Log locale delle metriche delle richieste"""
+    return MetricsLog()
 
-**Tipi di dati:**
-"""
-    for col, dtype in df.dtypes.items():
-        summary += f"\n- {col}: {dtype}"
-    
-    # Statistiche per colonne categoriche
-    summary += "\n\n**📈 Statistiche Categoriche:**"
-    
-    if 'CATEGORIA' in df.columns:
-        cat_counts = df['CATEGORIA'].value_counts()
-        summary += f"\n\n*Categorie ({len(cat_counts)} uniche):*"
-        for cat, count in cat_counts.items():
-            summary += f"\n  - {cat}: {count} eventi"
-    
-    if 'A CHI CHIEDERE' in df.columns:
-        contact_counts = df['A CHI CHIEDERE'].value_counts()
-        summary += f"\n\n*Contatti ({len(contact_counts)} unici):*"
-        for contact, count in contact_counts.items():
-            summary += f"\n  - {contact}: {count} eventi"
-    
-    # Statistiche temporali
-    if 'DATA EVENTO' in df.columns:
-        df_valid_dates = df[df['DATA EVENTO'].notna()]
-        if len(df_valid_dates) > 0:
-            min_date = df_valid_dates['DATA EVENTO'].min()
-            max_date = df_valid_dates['DATA EVENTO'].max()
-            summary += f"\n\n**📅 Range Temporale:**"
-            summary += f"\n- Dal: {min_date.strftime('%d/%m/%Y')}"
-            summary += f"\n- Al: {max_date.strftime('%d/%m/%Y')}"
-            summary += f"\n- Durata: {(max_date - min_date).days} giorni"
-            
-            # Eventi passati vs futuri
-            now = pd.Timestamp.now()
-            past = len(df_valid_dates[df_valid_dates['DATA EVENTO'] < now])
-            future = len(df_valid_dates[df_valid_dates['DATA EVENTO'] >= now])
-            summary += f"\n- Eventi passati: {past}"
-            summary += f"\n- Eventi futuri: {future}"
-    
-    # DATI COMPLETI in formato CSV
-    summary += f"\n\n**📋 DATASET COMPLETO (tutti i {len(df)} eventi):**\n"
-    summary += "\n```csv\n"
-    
-    # Converti il dataframe in CSV string
-    # Formatta le date in modo leggibile
-    df_copy = df.copy()
-    for col in df_copy.columns:
-        if pd.api.types.is_datetime64_any_dtype(df_copy[col]):
-            df_copy[col] = df_copy[col].dt.strftime('%d/%m/%Y %H:%M').fillna('')
-    
-    # Converti in CSV
-    csv_string = df_copy.to_csv(index=False, sep=',', quoting=1)
-    summary += csv_string
-    summary += "```\n"
+
+def get_secrets_config():
+    """Configurazione da st.secrets (vuota se secrets.toml non esiste)"""
+    try:
+        return dict(st.secrets)
+    except Exception:
+        return {}
+
+
+@st.cache_resource
+def get_scheduler():
+    """Scheduler delle richieste condiviso da tutte le sessioni (rate limit e retry)"""
+    return RequestScheduler.from_config(get_secrets_config())
+
+
+def context_token_limit():
+    """Oltre questa stima il dataset va a blocchi: finestra di contesto o token al minuto"""
+    return min(MAX_CONTEXT_TOKENS, get_scheduler().request_token_limit())
+
+
+@st.cache_resource
+def get_model_router():
+    """Scelta del modello per domanda: veloce per le consultazioni, grande per le analisi"""
+    return ModelRouter.from_config({"CLAUDE_LARGE_MODEL": CLAUDE_MODEL, **get_secrets_config()})
+
+
+@st.cache_resource
+def get_digest_worker():
+    """Job di processo che precalcola il digest AI quando il file dati cambia"""
+    return DigestWorker(path=EXCEL_FILE, loader=get_snapshot_store().load, scheduler=get_scheduler())
+
+
+@st.cache_resource(max_entries=256, ttl=3600)
+def get_chat_archive(session_id):
+    """Archivio su disco dei messaggi più vecchi della sessione (gli archivi scaduti
+    vengono cancellati alla creazione)"""
+    return ChatArchive(session_id)
+
+
+@st.cache_resource
+def get_event_index():
+    """Indice dei testi degli eventi (ricerca semantica), condiviso con le altre pagine del processo"""
+    return shared_index(EXCEL_FILE)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _content_fingerprint(version, _df):
+    return data_fingerprint(_df)
+
+
+def get_data_fingerprint(df):
+    """Fingerprint del contenuto dei dati, calcolato una volta per versione del file"""
+    return _content_fingerprint(get_data_watcher().version, df)
+
+
+def format_api_error(e):
+    """Messaggio di errore leggibile per gli errori più comuni dell'API"""
+    error_msg = f"❌ **Errore durante l'elaborazione:**\n\n{str(e)}"
     
-    summary += f"\n**💡 Nota:** Tutti i {len(df):,} eventi sono inclusi sopra in formato CSV. Analizza l'intero dataset per rispondere alle domande."
+    # Gestisci errori comuni
+    if "api_key" in str(e).lower():
+        error_msg += "\n\n💡 Verifica che la tua API key sia corretta e attiva su console.anthropic.com"
+    elif "rate limit" in str(e).lower():
+        error_msg += "\n\n⏱️ Hai raggiunto il limite di richieste. Attendi qualche secondo e riprova."
+    elif "overloaded" in str(e).lower():
+        error_msg += "\n\n⚠️ Il servizio Claude è temporaneamente sovraccarico. Riprova tra poco."
     
-    return summary
+    return error_msg
 
 
-def create_chart_from_intent(df, intent_type, x_col=None, y_col=None, color_col=None):
+def build_system(instructions, data_context):
     """
-    Crea grafici basati su intent predefiniti (SICURO - no code execution)
+    System prompt a due blocchi: istruzioni + contesto dati.
+    Il contesto dati è marcato per il prompt caching, così nei turni successivi
+    della conversazione non viene rielaborato né duplicato.
     """
-    try:
-        if intent_type == "categorie_distribuzione":
-            if 'CATEGORIA' in df.columns:
-                cat_counts = df['CATEGORIA'].value_counts()
-                fig = px.pie(
-                    values=cat_counts.values,
-                    names=cat_counts.index,
-                    title="Distribuzione Eventi per Categoria",
-                    hole=0.4
-                )
-                return fig, "✅ Grafico creato"
-            return None, "❌ Colonna CATEGORIA non trovata"
-        
-        elif intent_type == "contatti_top10":
-            if 'A CHI CHIEDERE' in df.columns:
-                top_contacts = df['A CHI CHIEDERE'].value_counts().head(10)
-                fig = px.bar(
-                    x=top_contacts.values,
-                    y=top_contacts.index,
-                    orientation='h',
-                    title="Top 10 Contatti per Numero Eventi",
-                    labels={'x': 'Numero Eventi', 'y': 'Contatto'},
-                    color=top_contacts.values,
-                    color_continuous_scale='Blues'
-                )
-                fig.update_layout(showlegend=False)
-                return fig, "✅ Grafico creato"
-            return None, "❌ Colonna A CHI CHIEDERE non trovata"
-        
-        elif intent_type == "timeline_eventi":
-            if 'DATA EVENTO' in df.columns:
-                df_time = df[df['DATA EVENTO'].notna()].copy()
-                df_time['Mese'] = df_time['DATA EVENTO'].dt.to_period('M').astype(str)
-                eventi_mese = df_time.groupby('Mese').size().reset_index(name='Numero Eventi')
-                
-                fig = px.line(
-                    eventi_mese,
-                    x='Mese',
-                    y='Numero Eventi',
-                    title='Trend Eventi nel Tempo',
-                    markers=True
-                )
-                fig.update_traces(line_color='#3498db', line_width=3, marker_size=8)
-                return fig, "✅ Grafico creato"
-            return None, "❌ Colonna DATA EVENTO non trovata"
-        
-        elif intent_type == "heatmap_contatti_categorie":
-            if 'A CHI CHIEDERE' in df.columns and 'CATEGORIA' in df.columns:
-                pivot = pd.crosstab(df['A CHI CHIEDERE'], df['CATEGORIA'])
-                top_contacts = df['A CHI CHIEDERE'].value_counts().head(10).index
-                pivot_top = pivot.loc[top_contacts]
-                
-                fig = px.imshow(
-                    pivot_top,
-                    labels=dict(x="Categoria", y="Contatto", color="Eventi"),
-                    x=pivot_top.columns,
-                    y=pivot_top.index,
-                    color_continuous_scale='Blues',
-                    text_auto=True,
-                    aspect='auto',
-                    title="Matrice Contatti × Categorie (Top 10 Contatti)"
-                )
-                return fig, "✅ Grafico creato"
-            return None, "❌ Colonne necessarie non trovate"
-        
-        elif intent_type == "custom_bar" and x_col and y_col:
-            fig = px.bar(
-                df,
-                x=x_col,
-                y=y_col,
-                color=color_col,
-                title=f"{y_col} per {x_col}"
-            )
-            return fig, "✅ Grafico personalizzato creato"
-        
-        elif intent_type == "custom_scatter" and x_col and y_col:
-            fig = px.scatter(
-                df,
-                x=x_col,
-                y=y_col,
-                color=color_col,
-                title=f"{y_col} vs {x_col}"
-            )
-            return fig, "✅ Grafico personalizzato creato"
-        
-        else:
-            return None, "❌ Tipo di grafico non riconosciuto"
-            
-    except Exception as e:
-        return None, f"❌ Errore creazione grafico: {str(e)}"
+    return [
+        {"type": "text", "text": instructions},
+        {"type": "text", "text": data_context, "cache_control": {"type": "ephemeral"}}
+    ]
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def get_chart(version, spec_key, _df):
+    """Grafico ricostruito dalla spec: calcolato una volta per versione dei dati"""
+    return build_chart(_df, json.loads(spec_key))
+
+
+def render_charts(df, chart_specs, key_prefix):
+    """Mostra i grafici di un messaggio a partire dalle spec salvate in cronologia"""
+    version = get_data_fingerprint(df)
+    for j, spec in enumerate(chart_specs):
+        fig, _ = get_chart(version, chart_spec_key(spec), df)
+        if fig is None:
+            continue
+        st.plotly_chart(fig, use_container_width=True, key=f"{key_prefix}_{j}")
+        if spec.get("versione") not in (None, version):
+            st.caption("ℹ️ Grafico ricostruito sui dati attuali (modificati dopo la risposta)")
+
+
+def render_answer(df, answer, chart_specs, caption=None):
+    """Mostra una risposta con i suoi grafici e la salva nella cronologia (solo le spec)"""
+    chart_specs = with_version(chart_specs, get_data_fingerprint(df))
+    st.markdown(answer)
+    render_charts(df, chart_specs, "risposta")
+    if caption:
+        st.caption(caption)
+    
+    st.session_state.messages.append({
+        "role": "assistant",
+        "content": answer,
+        "charts": chart_specs
+    })
 
 
 # ==================== INIZIALIZZAZIONE SESSION STATE ====================
@@ -249,8 +300,19 @@ if "initialized" not in st.session_state:
     })
     st.session_state.initialized = True
 
+# Identificativo della sessione per la coda equa dello scheduler
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# Cambi dei dati da altre sessioni o processi: il watcher riesegue la sessione se inattiva
+data_watcher = get_data_watcher()
+data_watcher.register_session()
+if notify_data_change(st.session_state, data_watcher.version):
+    st.toast("🔄 Dati aggiornati")
+
 # ==================== SIDEBAR: CONFIGURAZIONE ====================
 
+profiler.checkpoint("sidebar")
 with st.sidebar:
     st.markdown("### 🤖 Chat Eventi AI")
     st.markdown("*Powered by Claude 3.5 Sonnet*")
@@ -361,10 +423,12 @@ with st.sidebar:
     st.subheader("📊 Dati")
     
     if st.button("🔄 Ricarica Dati", use_container_width=True):
-        st.cache_data.clear()
+        # Verifica subito il file (di norma il watcher ha già aggiornato la versione)
+        get_data_watcher().check()
         st.rerun()
     
-    df, error = load_excel_data()
+    with profiler.section("load_excel_data"):
+        df, error = load_excel_data()
     
     if error:
         st.error(error)
@@ -392,12 +456,7 @@ with st.sidebar:
     if st.session_state.dataframe is not None:
         st.subheader("📈 Grafici Rapidi")
         
-        chart_options = {
-            "📊 Distribuzione Categorie": "categorie_distribuzione",
-            "👥 Top 10 Contatti": "contatti_top10",
-            "📅 Timeline Eventi": "timeline_eventi",
-            "🔥 Heatmap Contatti×Categorie": "heatmap_contatti_categorie"
-        }
+        chart_options = {label: intent for intent, label in CHART_INTENTS.items()}
         
         selected_chart = st.selectbox(
             "Seleziona grafico",
@@ -405,16 +464,18 @@ with st.sidebar:
         )
         
         if st.button("📊 Genera Grafico", use_container_width=True):
-            intent = chart_options[selected_chart]
-            fig, msg = create_chart_from_intent(st.session_state.dataframe, intent)
+            df = st.session_state.dataframe
+            spec = chart_spec(chart_options[selected_chart], version=get_data_fingerprint(df))
+            fig, msg = get_chart(spec["versione"], chart_spec_key(spec), df)
             
             if fig:
-                # Aggiungi a chat history
+                # Aggiungi a chat history (solo la spec, la figura si ricostruisce dalla cache)
                 st.session_state.messages.append({
                     "role": "assistant",
                     "content": f"Ho generato il grafico richiesto: **{selected_chart}**",
-                    "chart": fig
+                    "charts": [spec]
                 })
+                cap_history(st.session_state.messages, get_chat_archive(st.session_state.session_id))
                 st.rerun()
             else:
                 st.error(msg)
@@ -444,12 +505,159 @@ with st.sidebar:
     
     st.markdown("---")
     
+    # Modalità di analisi
+    st.subheader("⚙️ Modalità Analisi")
+    use_tools = st.toggle(
+        "🛠️ Usa strumenti locali",
+        value=True,
+        key="use_tools",
+        help="Claude interroga i dati con funzioni locali invece di leggere l'intera tabella: "
+             "risposte esatte e prompt piccoli anche con molti eventi"
+    )
+    use_fast_path = st.toggle(
+        "⚡ Risposte locali immediate",
+        value=True,
+        key="use_fast_path",
+        help="Domande semplici (totali, categorie e contatti più attivi, prossimi eventi, trend) "
+             "vengono calcolate direttamente sui dati, senza chiamare l'API"
+    )
+    history_budget = st.slider(
+        "🧠 Budget token cronologia",
+        min_value=0,
+        max_value=16000,
+        value=DEFAULT_HISTORY_BUDGET,
+        step=500,
+        key="history_budget",
+        help="Quanti token della conversazione precedente inviare a Claude per le domande di follow-up. "
+             "I turni più vecchi vengono riassunti o omessi. 0 = ogni domanda è indipendente"
+    )
+    model_router = get_model_router()
+    tier_labels = {
+        TIER_AUTO: "🧭 Automatico",
+        TIER_FAST: f"🐇 Veloce ({model_router.fast_model})",
+        TIER_LARGE: f"🧠 Avanzato ({model_router.large_model})",
+    }
+    model_preference = st.selectbox(
+        "Modello",
+        options=list(tier_labels),
+        format_func=tier_labels.get,
+        key="model_preference",
+        help="Automatico: le domande di consultazione semplici usano il modello veloce (risposte brevi, "
+             "costo minore), analisi, confronti e contesti ampi il modello avanzato"
+    )
+    
+    st.markdown("---")
+    
+    # Domande in batch
+    st.subheader("📋 Domande in Batch")
+    batch_text = st.text_area(
+        "Una domanda per riga",
+        key="batch_questions",
+        height=150,
+        placeholder="Quanti eventi abbiamo in totale?\nQuali sono le categorie più popolari?",
+        help="Le domande vengono inviate in parallelo con lo stesso contesto dati (in prompt cache); "
+             "quelle semplici o già in cache non chiamano l'API"
+    )
+    batch_concurrency = st.slider(
+        "Richieste in parallelo",
+        min_value=1,
+        max_value=8,
+        value=DEFAULT_BATCH_CONCURRENCY,
+        key="batch_concurrency"
+    )
+    run_batch_clicked = st.button(
+        "▶️ Esegui Batch",
+        use_container_width=True,
+        disabled=not parse_questions(batch_text)
+    )
+    
+    st.markdown("---")
+    
+    # Digest AI precalcolato
+    st.subheader("🗞️ Digest AI")
+    digest_enabled = st.toggle(
+        "Calcola digest quando i dati cambiano",
+        value=str(get_secrets_config().get("DIGEST_ENABLED", "")).lower() in ("1", "true", "yes"),
+        key="digest_enabled",
+        help="A ogni nuova versione del file un job in background pone a Claude un insieme fisso di domande "
+             "(con Message Batches, a costo ridotto) e salva le risposte: il digest è poi subito disponibile"
+    )
+    digest_worker = get_digest_worker()
+    if digest_enabled and st.session_state.api_key:
+        digest_version, digest = digest_worker.ensure(
+            st.session_state.api_key,
+            model=model_router.large_model,
+            base_url=get_secrets_config().get("ANTHROPIC_BASE_URL"),
+            version=get_data_watcher().version
+        )
+    else:
+        digest_version = get_data_watcher().version
+        digest = digest_worker.store.load(digest_version)
+    
+    if digest is None:
+        st.caption("Nessun digest per la versione attuale dei dati")
+    elif digest["stato"] == STATUS_RUNNING:
+        st.caption(f"⏳ Digest in calcolo ({digest['modalita']}), disponibile a breve")
+        if st.button("🔄 Aggiorna stato", use_container_width=True):
+            st.rerun()
+    elif digest["stato"] == STATUS_FAILED:
+        st.caption(f"❌ Digest non riuscito: {digest['errore']}")
+        if st.button("🔁 Riprova Digest", use_container_width=True):
+            digest_worker.retry(digest_version)
+            st.rerun()
+    else:
+        st.caption(f"✅ Digest pronto ({digest['completato'].replace('T', ' ')[:16]})")
+    
+    st.markdown("---")
+    
+    # Cache risposte
+    st.subheader("⚡ Cache Risposte")
+    cache_stats = get_response_cache().stats()
+    st.caption(
+        f"{cache_stats['voci']} risposte salvate ({cache_stats['bytes'] / 1024:.1f} KB) · "
+        f"hit {cache_stats['hits']} / miss {cache_stats['misses']}"
+    )
+    if st.button("🧹 Svuota Cache Risposte", use_container_width=True):
+        get_response_cache().clear()
+        st.rerun()
+    
+    st.markdown("---")
+    
+    # Metriche richieste
+    with st.expander("📈 Metriche Chat"):
+        metrics_df = get_metrics_log().load()
+        if metrics_df.empty:
+            st.caption("Nessuna richiesta registrata")
+        else:
+            st.dataframe(summarize(metrics_df).T, use_container_width=True)
+            recent = metrics_df.tail(50).reset_index(drop=True)
+            st.caption("Latenza ultime richieste (ms)")
+            st.line_chart(recent["latency_ms"], height=150)
+            st.caption(
+                f"Ultima: {recent['input_tokens'].iloc[-1]:,} token in / {recent['output_tokens'].iloc[-1]:,} out, "
+                f"{recent['context_rows'].iloc[-1]:,} righe nel contesto"
+            )
+        scheduler_stats = get_scheduler().stats()
+        st.caption(
+            f"🚦 Scheduler: {scheduler_stats['in_coda']} in coda · "
+            f"{scheduler_stats['richieste_disponibili']} richieste e "
+            f"{scheduler_stats['token_disponibili']:,} token disponibili · "
+            f"retry {scheduler_stats['retry_totali']} · attesa {scheduler_stats['attesa_totale_s']}s"
+        )
+        if st.button("🧹 Azzera Metriche", use_container_width=True):
+            get_metrics_log().clear()
+            st.rerun()
+    
+    st.markdown("---")
+    
     if st.button("🗑️ Cancella Chat", use_container_width=True):
         st.session_state.messages = []
+        get_chat_archive(st.session_state.session_id).clear()
         st.rerun()
 
 # ==================== MAIN INTERFACE ====================
 
+profiler.checkpoint("intestazione")
 st.markdown('<div class="main-header">🤖 Chat Eventi AI con Claude</div>', unsafe_allow_html=True)
 st.caption("Esplora i tuoi eventi usando linguaggio naturale - Powered by Claude 3.5 Sonnet")
 
@@ -465,22 +673,169 @@ if not st.session_state.api_key_configured:
     
     💡 **Non hai un'API key?** Clicca su "Come ottenere l'API Key" nella sidebar per le istruzioni.
     """)
-    st.stop()
+    stop_page()
 
 if st.session_state.dataframe is None:
     st.warning("👈 **Carica i dati degli eventi per iniziare l'analisi**")
-    st.stop()
+    stop_page()
+
+# ==================== DOMANDE IN BATCH ====================
+
+profiler.checkpoint("batch")
+if run_batch_clicked:
+    df = st.session_state.dataframe
+    questions = parse_questions(batch_text)
+    fingerprint = get_data_fingerprint(df)
+    response_cache = get_response_cache()
+    # Un solo modello per tutto il batch: la prompt cache è per modello
+    if model_preference == TIER_FAST:
+        tier = model_router.fast("scelto manualmente")
+    else:
+        tier = model_router.large("batch con contesto condiviso")
+    data_summary = dataframe_summary(df)
+    
+    def resolve_batch_question(question):
+        local = answer_locally(df, question) if use_fast_path else None
+        if local is not None:
+            return {**local, "source": "locale"}
+        cached = response_cache.get(question, fingerprint, tier.model)
+        if cached is not None:
+            return {**cached, "source": "cache"}
+        return None
+    
+    if needs_chunking(data_summary, context_token_limit()):
+        st.warning(
+            f"⚠️ Dataset troppo grande ({len(df):,} eventi) per un contesto condiviso: "
+            "fai le domande una alla volta nella chat (analisi a blocchi)"
+        )
+    else:
+        st.subheader(f"📋 Batch di {len(questions)} domande")
+        progress = st.progress(0.0, text="⏳ Avvio batch...")
+        live_placeholder = st.empty()
+        live_results = live_placeholder.container()
+        completed = []
+        
+        def show_batch_result(result):
+            completed.append(result)
+            progress.progress(
+                len(completed) / len(questions),
+                text=f"✅ {len(completed)}/{len(questions)} domande completate"
+            )
+            with live_results:
+                st.markdown(f"**{result.index + 1}. {result.question}** · {SOURCE_LABELS[result.source]}")
+        
+        # SDK importato solo quando serve una chiamata API (avvio pagina più rapido)
+        from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+        
+        async_client = AsyncAnthropic(
+            api_key=st.session_state.api_key,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient()
+        )
+        results = run_batch(
+            async_client,
+            questions,
+            model=tier.model,
+            system=build_system(SYSTEM_PROMPT, data_summary),
+            max_tokens=tier.max_tokens,
+            concurrency=batch_concurrency,
+            context_rows=len(df),
+            resolve=resolve_batch_question,
+            on_result=show_batch_result,
+            scheduler=get_scheduler().session(st.session_state.session_id)
+        )
+        progress.empty()
+        live_placeholder.empty()
+        
+        for result in results:
+            if result.source == "claude":
+                response_cache.set(result.question, fingerprint, tier.model, {"answer": result.answer, "charts": []})
+            if result.metrics is not None:
+                get_metrics_log().append(result.metrics)
+        
+        details = [
+            f"Eventi analizzati: {len(df):,}",
+            f"Modello: {tier.model}",
+            f"Domande: {len(results)} "
+            f"({sum(r.source == 'claude' for r in results)} con Claude, "
+            f"{sum(r.source in ('locale', 'cache') for r in results)} senza API, "
+            f"{sum(r.source == 'errore' for r in results)} errori)"
+        ]
+        st.session_state.batch_report = {
+            "results": [
+                {**result.as_dict(), "charts": with_version(result.charts, fingerprint)} for result in results
+            ],
+            "markdown": report_markdown(results, details=details),
+            "csv": results_dataframe(results).to_csv(index=False),
+            "details": details
+        }
+
+if st.session_state.get("batch_report"):
+    batch_report = st.session_state.batch_report
+    with st.expander(f"📋 Risultati batch ({len(batch_report['results'])} domande)", expanded=run_batch_clicked):
+        st.caption(" · ".join(batch_report["details"]))
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.download_button(
+                "📥 Report (Markdown)",
+                data=batch_report["markdown"],
+                file_name=f"report_batch_{datetime.now():%Y%m%d_%H%M}.md",
+                mime="text/markdown",
+                use_container_width=True
+            )
+        with col2:
+            st.download_button(
+                "📥 Risultati (CSV)",
+                data=batch_report["csv"],
+                file_name=f"risultati_batch_{datetime.now():%Y%m%d_%H%M}.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
+        with col3:
+            if st.button("✖️ Chiudi Risultati", use_container_width=True):
+                del st.session_state.batch_report
+                st.rerun()
+        
+        for i, row in enumerate(batch_report["results"]):
+            st.markdown(f"#### {row['n']}. {row['domanda']}")
+            st.caption(SOURCE_LABELS[row["origine"]])
+            if row["errore"]:
+                st.error(format_api_error(Exception(row["errore"])))
+            else:
+                st.markdown(row["risposta"])
+                render_charts(st.session_state.dataframe, row["charts"], f"batch_{i}")
 
 # ==================== CHAT INTERFACE ====================
 
+profiler.checkpoint("cronologia")
+# Digest precalcolato per la versione attuale dei dati: risposta immediata, nessuna chiamata API
+if digest is not None and digest["stato"] == STATUS_DONE:
+    with st.expander("🗞️ Digest di oggi", expanded=not st.session_state.messages):
+        st.markdown(digest_markdown(digest))
+        st.caption(
+            f"Precalcolato il {digest['completato'].replace('T', ' ')[:16]} con {digest['modello']} "
+            f"sulla versione attuale dei dati"
+        )
+
+# Messaggi più vecchi spostati nell'archivio su disco
+chat_archive = get_chat_archive(st.session_state.session_id)
+if chat_archive.count():
+    with st.expander(
+        f"🗄️ {chat_archive.count()} messaggi precedenti archiviati ({chat_archive.size_bytes() / 1024:.1f} KB)"
+    ):
+        if st.toggle("Mostra messaggi archiviati", key="show_archive"):
+            for i, message in enumerate(chat_archive.load()):
+                with st.chat_message(message["role"]):
+                    st.markdown(message["content"])
+                    render_charts(st.session_state.dataframe, message.get("charts", []), f"archive_{i}")
+
 # Display chat history
 for i, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
         
-        # Mostra grafico se presente
-        if "chart" in message and message["chart"] is not None:
-            st.plotly_chart(message["chart"], use_container_width=True, key=f"chart_{i}")
+        # Grafici ricostruiti dalle spec (cache per versione dei dati)
+        render_charts(st.session_state.dataframe, message.get("charts", []), f"chart_{i}")
 
 # Gestione query da esempio
 if "temp_query" in st.session_state:
@@ -491,7 +846,16 @@ else:
 
 # Processa input
 if prompt:
+    profiler.set_view("domanda")
+    profiler.checkpoint("risposta")
     df = st.session_state.dataframe
+    metrics = RequestMetrics("csv")
+    
+    # In sessione solo gli ultimi messaggi: i più vecchi vanno nell'archivio compresso
+    cap_history(st.session_state.messages, chat_archive)
+    
+    # Cronologia precedente (senza la domanda corrente)
+    previous_messages = list(st.session_state.messages)
     
     # Aggiungi messaggio utente
     st.session_state.messages.append({"role": "user", "content": prompt})
@@ -499,112 +863,167 @@ if prompt:
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # Prepara context per Claude
-    data_summary = get_dataframe_summary(df)
+    # Domanda semplice? Risposta calcolata localmente, senza API
+    local = answer_locally(df, prompt) if use_fast_path else None
     
-    # Avviso se il dataset è molto grande
-    if len(df) > 1000:
-        st.info(f"ℹ️ **Dataset di grandi dimensioni:** {len(df):,} eventi. L'analisi potrebbe richiedere qualche secondo in più...")
+    # Cronologia compattata nel budget: il contesto dati va nel system prompt, non nei turni
+    api_messages, history_stats = build_messages(previous_messages, prompt, budget_tokens=history_budget)
+    conv_key = conversation_key(api_messages)
     
-    # System prompt per Claude
-    system_prompt = """Sei un assistente esperto nell'analisi di dati eventi per aziende.
-
-Il tuo compito è aiutare l'utente a esplorare, analizzare e comprendere i dati degli eventi forniti.
-
-**IMPORTANTE: Hai accesso al DATASET COMPLETO di tutti gli eventi in formato CSV.**
-Non limitarti a un'anteprima - analizza tutti i dati forniti per dare risposte accurate e complete.
-
-**Capacità:**
-- Analisi statistica dettagliata dei dati completi
-- Identificazione pattern e trend su tutto il dataset
-- Risposta a domande specifiche analizzando tutti gli eventi
-- Calcolo di statistiche precise (conteggi, medie, aggregazioni)
-- Suggerimento di visualizzazioni appropriate
-- Identificazione di affinità e relazioni tra contatti/categorie
-- Analisi temporali e previsioni basate su tutti i dati storici
-
-**Stile di risposta:**
-- Sii conciso ma completo
-- Usa emoji appropriate per rendere le risposte più leggibili
-- Fornisci numeri e statistiche concrete basate su TUTTI i dati
-- Se l'utente chiede conteggi o statistiche, analizza l'intero dataset CSV
-- Se l'utente chiede un grafico, suggerisci quale tipo sarebbe più appropriato
-- Rispondi SEMPRE in italiano
-
-**Importante:**
-- Basa le tue risposte SOLO sui dati forniti nel CSV completo
-- Analizza TUTTI gli eventi, non solo un campione
-- Se non hai informazioni sufficienti, dillo chiaramente
-- Non inventare dati o statistiche
-- Quando fai conteggi o aggregazioni, usa TUTTI i dati del CSV
-"""
+    # Modello in base a complessità della domanda e dimensione del contesto
+    tier = model_router.route(
+        prompt,
+        context_rows=0 if use_tools else len(df),
+        history_turns=history_stats.included + history_stats.summarized,
+        preference=model_preference
+    )
+    metrics.model = tier.model
     
-    # Costruisci il messaggio completo per Claude
-    full_context = f"""{data_summary}
-
----
-
-**Domanda dell'utente:** {prompt}
-
-Analizza i dati forniti e rispondi alla domanda in modo chiaro e preciso."""
+    # Risposta già in cache per la stessa domanda sugli stessi dati (e stessa conversazione)?
+    response_cache = get_response_cache()
+    fingerprint = get_data_fingerprint(df)
+    cache_model = f"{tier.model}+tools" if use_tools else tier.model
+    cached = response_cache.get(prompt, fingerprint, cache_model, conv_key) if local is None else None
     
-    # Genera risposta con Claude
-    with st.chat_message("assistant"):
-        message_placeholder = st.empty()
+    if local is not None:
+        with st.chat_message("assistant"):
+            render_answer(df, local["answer"], local["charts"], "⚡ Calcolato localmente sui dati (nessuna chiamata API)")
+        metrics.mode, metrics.model = "locale", None
+        get_metrics_log().append(metrics.finish())
+    elif cached is not None:
+        with st.chat_message("assistant"):
+            render_answer(df, cached["answer"], cached.get("charts", []), "⚡ Risposta dalla cache (dati invariati)")
+        metrics.mode = "cache"
+        get_metrics_log().append(metrics.finish())
+    else:
+        metrics.mode = "strumenti" if use_tools else "csv"
+        metrics.context_rows = 0 if use_tools else len(df)
+        
+        # Dataset troppo grande per un solo prompt: analisi a blocchi (map-reduce)
+        data_summary = None if use_tools else dataframe_summary(df)
+        use_chunks = data_summary is not None and needs_chunking(data_summary, context_token_limit())
+        if use_chunks:
+            metrics.mode = "blocchi"
+            st.info(f"ℹ️ **Dataset di grandi dimensioni:** {len(df):,} eventi. Analisi a blocchi in parallelo...")
         
-        try:
-            with st.spinner("🤔 Sto analizzando i dati..."):
-                # Usa l'API key dal session state
-                if not st.session_state.api_key:
-                    st.error("❌ API Key non configurata. Configura l'API key nella sidebar.")
-                    st.stop()
+        # Genera risposta con Claude
+        with st.chat_message("assistant"):
+            message_placeholder = st.empty()
+            streamed = []
+            
+            def show_partial(text):
+                streamed.append(text)
+                message_placeholder.markdown("".join(streamed) + "▌")
+            
+            def restart_partial(attempt, error):
+                # Nuovo tentativo dopo rate limit/sovraccarico: riparte il testo parziale
+                streamed.clear()
+                message_placeholder.info(f"⏳ Servizio occupato, nuovo tentativo ({attempt})...")
+            
+            try:
+                with st.spinner("🛠️ Sto interrogando i dati..." if use_tools else "🤔 Sto analizzando i dati..."):
+                    # Usa l'API key dal session state
+                    if not st.session_state.api_key:
+                        st.error("❌ API Key non configurata. Configura l'API key nella sidebar.")
+                        stop_page()
+                    
+                    from anthropic import Anthropic, AsyncAnthropic, DefaultAsyncHttpxClient, DefaultHttpxClient
+                    
+                    # I retry li gestisce lo scheduler condiviso, non il client
+                    scheduler = get_scheduler().session(st.session_state.session_id)
+                    client = Anthropic(
+                        api_key=st.session_state.api_key,
+                        max_retries=0,
+                        http_client=DefaultHttpxClient(event_hooks=metrics.http_event_hooks())
+                    )
+                    
+                    if use_tools:
+                        # Modalità strumenti: nel prompt solo lo schema, i numeri li calcolano gli strumenti
+                        answer, chart_specs, _ = run_tool_conversation(
+                            client,
+                            df,
+                            model=tier.model,
+                            system=build_system(TOOLS_SYSTEM_PROMPT, describe_dataset(df)),
+                            messages=api_messages,
+                            max_tokens=tier.max_tokens,
+                            on_text=show_partial,
+                            metrics=metrics,
+                            scheduler=scheduler,
+                            on_retry=restart_partial,
+                            index=get_event_index().ready(df, get_data_watcher().version)
+                        )
+                    elif use_chunks:
+                        async_client = AsyncAnthropic(
+                            api_key=st.session_state.api_key,
+                            max_retries=0,
+                            http_client=DefaultAsyncHttpxClient(event_hooks=metrics.async_http_event_hooks())
+                        )
+                        progress = st.progress(0.0, text="🧩 Analisi a blocchi...")
+                        answer, n_chunks = run_map_reduce(
+                            client,
+                            async_client,
+                            df,
+                            model=tier.model,
+                            system=SYSTEM_PROMPT,
+                            messages=api_messages,
+                            max_tokens=tier.max_tokens,
+                            context_tokens=estimate_tokens(data_summary),
+                            on_progress=lambda done, total: progress.progress(
+                                done / total, text=f"🧩 Blocco {done}/{total} analizzato"
+                            ),
+                            on_text=show_partial,
+                            metrics=metrics,
+                            scheduler=scheduler,
+                            on_retry=restart_partial
+                        )
+                        progress.empty()
+                        chart_specs = []
+                    else:
+                        # Chiamata API Claude con il dataset completo nel system prompt
+                        response = stream_message(
+                            client,
+                            on_text=show_partial,
+                            metrics=metrics,
+                            scheduler=scheduler,
+                            on_retry=restart_partial,
+                            model=tier.model,
+                            max_tokens=tier.max_tokens,  # Ridotto per le consultazioni semplici
+                            temperature=0,  # Deterministico per analisi dati
+                            system=build_system(SYSTEM_PROMPT, data_summary),
+                            messages=api_messages
+                        )
+                        answer = response.content[0].text
+                        chart_specs = []
                 
-                client = Anthropic(api_key=st.session_state.api_key)
+                message_placeholder.empty()
                 
-                # Chiamata API Claude
-                response = client.messages.create(
-                    model="claude-sonnet-4-20250514",  # Latest Claude Sonnet
-                    max_tokens=4096,  # Aumentato per analisi complete
-                    temperature=0,  # Deterministico per analisi dati
-                    system=system_prompt,
-                    messages=[{
-                        "role": "user",
-                        "content": full_context
-                    }]
-                )
+                answer_note = f"🧭 Modello: {tier.model} ({tier.reason})"
+                if history_stats.included or history_stats.summarized:
+                    answer_note += (
+                        f" · 🧠 Contesto: {history_stats.included} turni completi, "
+                        f"{history_stats.summarized} riassunti, {history_stats.dropped} omessi "
+                        f"(~{history_stats.tokens:,} token)"
+                    )
+                render_answer(df, answer, chart_specs, answer_note)
                 
-                answer = response.content[0].text
+                # Salva in cache per le prossime domande identiche
+                response_cache.set(prompt, fingerprint, cache_model, {"answer": answer, "charts": chart_specs}, conv_key)
+                get_metrics_log().append(metrics.finish())
                 
-                # Mostra risposta
-                message_placeholder.markdown(answer)
+            except Exception as e:
+                get_metrics_log().append(metrics.finish(error=e))
+                error_msg = format_api_error(e)
+                message_placeholder.error(error_msg)
                 
-                # Salva in history
+                # Salva errore in history
                 st.session_state.messages.append({
                     "role": "assistant",
-                    "content": answer
+                    "content": error_msg
                 })
-                
-        except Exception as e:
-            error_msg = f"❌ **Errore durante l'elaborazione:**\n\n{str(e)}"
-            
-            # Gestisci errori comuni
-            if "api_key" in str(e).lower():
-                error_msg += "\n\n💡 Verifica che la tua API key sia corretta e attiva su console.anthropic.com"
-            elif "rate limit" in str(e).lower():
-                error_msg += "\n\n⏱️ Hai raggiunto il limite di richieste. Attendi qualche secondo e riprova."
-            elif "overloaded" in str(e).lower():
-                error_msg += "\n\n⚠️ Il servizio Claude è temporaneamente sovraccarico. Riprova tra poco."
-            
-            message_placeholder.error(error_msg)
-            
-            # Salva errore in history
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": error_msg
-            })
 
 # ==================== INFO INIZIALE (se chat vuota) ====================
 
+profiler.checkpoint("info_iniziale")
 if len(st.session_state.messages) == 0:
     st.markdown("""
     <div class="info-box">
@@ -666,6 +1085,7 @@ if len(st.session_state.messages) == 0:
 
 # ==================== FOOTER ====================
 
+profiler.checkpoint("footer")
 st.markdown("---")
 st.markdown("""
 <div style='text-align: center; color: gray; font-size: 0.8rem;'>
@@ -673,4 +1093,7 @@ st.markdown("""
     Analisi dati sicura e intelligente | 
     No code execution - 100% safe
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+profiler.finish()
+render_profiler_panel(profiler)
@@ -0,0 +1,26 @@
+"""Fixture condivise dei test"""
+
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def mixed_workbook(tmp_path):
+    # NOTE e TAG con un numero scritto in una cella, LINK EVENTO tutto numerico con vuoti
+    path = str(tmp_path / "eventi.xlsx")
+    pd.DataFrame({
+        'DATA EVENTO': ["15/01/2026", "20/02/2026", "03/03/2026"],
+        'NOME EVENTO': ["Convegno", "Workshop", "Fiera"],
+        'LINK EVENTO': [12, None, 7],
+        'A CHI CHIEDERE': ["Mario Rossi", "Anna Ferrari", "Sara Marino"],
+        'CATEGORIA': ["EVENTI delle organizzazioni", "EVENTI di logotel che farà", "EVENTI delle organizzazioni"],
+        'USER INSERIMENTO': ["mario", "anna", "sara"],
+        'TIMESTAMP INSERIMENTO': [datetime(2026, 1, 10, 9, 0)] * 3,
+        'USER MODIFICA': [None, None, None],
+        'TIMESTAMP MODIFICA': [None, None, None],
+        'NOTE': [2025, "Evento strategico Q1", None],
+        'TAG': ["ai", 7, None],
+    }).to_excel(path, index=False)
+    return path
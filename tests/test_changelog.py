@@ -0,0 +1,140 @@
+"""ChangeLog: riconciliazione con il workbook (sync), as_of e compattazione"""
+
+import warnings
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from eventi.changelog import EXTERNAL_USER, OP_BASE, OP_DELETE, OP_INSERT, OP_UPDATE, ChangeLog
+from eventi.core import delete_event, insert_event, load_events, save_events, update_event
+from eventi.schema import ID_COLUMN
+
+T0 = datetime(2026, 1, 10, 9, 0)
+T1 = datetime(2026, 2, 1, 10, 30, 15, 123456)
+T2 = datetime(2026, 3, 1, 16, 45, 1, 987654)
+T3 = datetime(2026, 4, 1, 8, 0)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / "eventi.xlsx")
+    save_events(pd.DataFrame({
+        'DATA EVENTO': pd.to_datetime(["2026-01-15", "2026-02-20"]),
+        'NOME EVENTO': ["Convegno", "Workshop"],
+        'LINK EVENTO': [None, "https://example.org"],
+        'A CHI CHIEDERE': ["Mario Rossi", "Anna Ferrari"],
+        'CATEGORIA': ["EVENTI delle organizzazioni", "EVENTI di logotel che farà"],
+        'USER INSERIMENTO': ["mario", "anna"],
+        'TIMESTAMP INSERIMENTO': [T0, T0],
+        'USER MODIFICA': [None, None],
+        'TIMESTAMP MODIFICA': [None, None],
+        'NOTE': [None, "sala 2"],
+        'TAG': ["ai", None],
+    }), path)
+    return path
+
+
+def versions(log):
+    return log.stats()["versioni"]
+
+
+def test_sync_after_writes_logs_no_spurious_versions(workbook):
+    log = ChangeLog(workbook)
+    nuovo = {'DATA EVENTO': pd.Timestamp("2026-05-05"), 'NOME EVENTO': "Fiera", 'A CHI CHIEDERE': "Sara Marino",
+             'CATEGORIA': "EVENTI delle organizzazioni", 'USER INSERIMENTO': "sara", 'TIMESTAMP INSERIMENTO': T1}
+    df = insert_event(load_events(workbook), nuovo, "sara", workbook, log, T1)
+    assert versions(log) == 3  # due versioni base + inserimento
+    new_id = df[ID_COLUMN].iloc[-1]
+
+    # Il workbook riletto (date al secondo, celle vuote come NaN) non cambia nulla
+    log.sync(load_events(workbook), T2)
+    assert versions(log) == 3
+
+    update_event(load_events(workbook), new_id, {'NOTE': "stand 4"}, "sara", workbook, log, T2)
+    assert versions(log) == 4
+    log.sync(load_events(workbook), T3)
+    log.sync(load_events(workbook), T3)
+    assert versions(log) == 4
+    assert [v["operazione"] for v in log.history(new_id)] == [OP_UPDATE, OP_INSERT]
+
+
+def test_sync_records_external_changes(workbook):
+    log = ChangeLog(workbook)
+    df = load_events(workbook)
+    df[ID_COLUMN] = ["a1", "b2"]
+    log.sync(df, T1)
+    assert {v["operazione"] for v in log.history("a1")} == {OP_BASE}
+    assert log.history("a1")[0]["valido_da"] == pd.Timestamp(T0).isoformat()  # datata all'inserimento
+
+    df.loc[0, 'NOTE'] = "modificata a mano"
+    log.sync(df.iloc[[0]], T2)  # b2 sparita dal workbook
+    assert log.history("a1")[0]["operazione"] == OP_UPDATE
+    assert log.history("a1")[0]["utente"] == EXTERNAL_USER
+    assert log.history("b2")[0]["operazione"] == OP_DELETE
+
+    log.sync(df, T3)  # b2 ricompare: nuova versione, non un doppione di a1
+    assert log.history("b2")[0]["operazione"] == OP_UPDATE
+    assert versions(log) == 5
+
+
+def test_as_of(workbook):
+    log = ChangeLog(workbook)
+    nuovo = {'DATA EVENTO': pd.Timestamp("2026-05-05"), 'NOME EVENTO': "Fiera", 'A CHI CHIEDERE': "Sara Marino",
+             'CATEGORIA': "EVENTI delle organizzazioni", 'USER INSERIMENTO': "sara", 'TIMESTAMP INSERIMENTO': T1}
+    df = insert_event(load_events(workbook), nuovo, "sara", workbook, log, T1)
+    new_id = df[ID_COLUMN].iloc[-1]
+    first_id = df[ID_COLUMN].iloc[0]
+    update_event(load_events(workbook), new_id, {'NOTE': "stand 4"}, "sara", workbook, log, T2)
+    delete_event(load_events(workbook), first_id, "mario", workbook, log, T3)
+
+    assert log.as_of(datetime(2026, 1, 1)).empty
+    assert sorted(log.as_of(T1 - pd.Timedelta(seconds=1))['NOME EVENTO']) == ["Convegno", "Workshop"]
+    at_t1 = log.as_of(T1).set_index(ID_COLUMN)
+    assert sorted(at_t1['NOME EVENTO']) == ["Convegno", "Fiera", "Workshop"]
+    assert pd.isna(at_t1.loc[new_id, 'NOTE'])
+    assert log.as_of(T2).set_index(ID_COLUMN).loc[new_id, 'NOTE'] == "stand 4"
+    at_t3 = log.as_of(T3)
+    assert first_id not in set(at_t3[ID_COLUMN])
+    assert pd.api.types.is_datetime64_any_dtype(at_t3['DATA EVENTO'])
+
+
+def test_compact_keeps_state_at_cutoff(workbook):
+    log = ChangeLog(workbook)
+    df = load_events(workbook)
+    df[ID_COLUMN] = ["a1", "b2"]
+    log.sync(df, T0)
+    for i, when in enumerate([T1, T2]):
+        df.loc[0, 'NOTE'] = f"versione {i}"
+        log.sync(df, when)
+    log.sync(df.iloc[[0]], T2)  # b2 eliminata
+    df.loc[0, 'NOTE'] = "dopo il limite"
+    log.sync(df.iloc[[0]], T3)
+    before = {when: log.as_of(when) for when in (T2, T3)}
+
+    removed = log.compact(before=T2)
+    # a1: base e versione 0 fuse nella versione 1; b2: base ed eliminazione rimosse
+    assert removed == 4
+    assert [v["operazione"] for v in log.history("a1")] == [OP_UPDATE, OP_BASE]
+    assert log.history("b2") == []
+    for when, expected in before.items():
+        pd.testing.assert_frame_equal(log.as_of(when), expected)
+    # Prima del limite il log risponde con lo stato al limite
+    assert log.as_of(T1)['NOTE'].tolist() == ["versione 1"]
+    assert log.stats()["ultima_compattazione"] is not None
+    assert log.compact(before=T2) == 0
+
+
+def test_update_into_empty_columns_keeps_values(workbook):
+    # Workbook letto senza core.load_events: USER MODIFICA tutta vuota è float64
+    df = pd.read_excel(workbook)
+    df['DATA EVENTO'] = pd.to_datetime(df['DATA EVENTO'])
+    df[ID_COLUMN] = ["a1", "b2"]
+    assert df['USER MODIFICA'].dtype == "float64"
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", FutureWarning)
+        out = update_event(df, "a1", {'NOTE': "stand 4", 'LINK EVENTO': 12}, "sara", workbook, ChangeLog(workbook), T1)
+    row = out.set_index(ID_COLUMN).loc["a1"]
+    assert (row['USER MODIFICA'], row['NOTE'], row['LINK EVENTO']) == ("sara", "stand 4", 12)
+    assert row['TIMESTAMP MODIFICA'] == pd.Timestamp(T1)
+    assert pd.isna(out.set_index(ID_COLUMN).loc["b2", 'USER MODIFICA'])
@@ -0,0 +1,96 @@
+"""Contatti canonici: stessa persona, iniziali ambigue e applicazione ai dati"""
+
+import pandas as pd
+import pytest
+
+from eventi.contacts import ContactDirectory, canonicalize_contacts, name_tokens, same_person
+
+
+def directory(counts):
+    return ContactDirectory(pd.Series(counts, dtype='int64'))
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Mario Rossi", "rossi mario"),
+    ("Mario Rossi", "M. Rossi"),
+    ("Mario Rossi", "Mario Rosi"),       # lettera omessa
+    ("Giulia Fontana", "Giulia Fontanna"),  # lettera inserita
+    ("Mario Rossi", "Mairo Rossi"),      # lettere vicine scambiate
+    ("Niccolò Bianchi", "niccolo bianchi"),
+])
+def test_same_person(a, b):
+    assert same_person(name_tokens(a), name_tokens(b))
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Mario Rossi", "Marco Rossi"),      # sostituzione: persone diverse
+    ("Mario Rossi", "Mario Rossi Bianchi"),
+    ("M. R.", "Mario Rossi"),            # nessuna parola lunga in comune
+    ("Anna Ferrari", "Sara Marino"),
+    ("", "Mario Rossi"),
+])
+def test_different_people(a, b):
+    assert not same_person(name_tokens(a), name_tokens(b))
+
+
+def test_variants_map_to_most_frequent_spelling():
+    contacts = directory({"Mario Rossi": 10, "rossi mario": 2, "Mario Rosi": 1, "M. Rossi": 3, "Anna Ferrari": 4})
+    assert contacts.canonical("rossi mario") == "Mario Rossi"
+    assert contacts.canonical(" Mario Rosi ") == "Mario Rossi"
+    assert contacts.canonical("M. Rossi") == "Mario Rossi"
+    assert contacts.canonical("Anna Ferrari") == "Anna Ferrari"
+    assert sorted(contacts.groups()["Mario Rossi"]) == ["M. Rossi", "Mario Rosi", "rossi mario"]
+    assert contacts.totals["Mario Rossi"] == 16
+
+
+def test_ambiguous_initials_stay_unmerged():
+    contacts = directory({"Mario Rossi": 5, "Marco Rossi": 4, "M. Rossi": 3})
+    assert contacts.canonical("M. Rossi") == "M. Rossi"
+    assert contacts.canonical("Marco Rossi") == "Marco Rossi"
+    assert contacts.mapping == {}
+    assert contacts.suggest("M. Rossi") == []
+    assert contacts.suggest("M Rossi") == []
+
+
+def test_initials_never_become_canonical():
+    contacts = directory({"M. Rossi": 9, "Mario Rossi": 1})
+    assert contacts.canonical("M. Rossi") == "Mario Rossi"
+
+
+def test_suggest():
+    contacts = directory({"Mario Rossi": 10, "Mario Rosi": 1, "Anna Ferrari": 4})
+    assert contacts.suggest("rossi  mario") == [("Mario Rossi", 11)]
+    assert contacts.suggest("Mario Rosi") == [("Mario Rossi", 11)]
+    assert contacts.suggest("Mario Rossi") == []
+    assert contacts.suggest("Luca Verdi") == []
+
+
+def test_from_stats_without_counts():
+    assert ContactDirectory.from_stats(None).mapping == {}
+    assert ContactDirectory.from_stats({"conteggi_contatti": {"Mario Rossi": 2, "rossi mario": 1}}).canonical(
+        "rossi mario") == "Mario Rossi"
+
+
+@pytest.mark.parametrize("dtype", [object, "string[pyarrow]"])
+def test_canonicalize_keeps_dtype_and_missing_values(dtype):
+    index = [10, 11, 12, 13, 14]
+    df = pd.DataFrame({
+        "A CHI CHIEDERE": pd.Series(["Mario Rossi", "rossi mario", None, "Anna Ferrari", " Mario Rosi"],
+                                    index=index, dtype=dtype),
+        "NOME EVENTO": pd.Series(["a", "b", "c", "d", "e"], index=index),
+    })
+    original = df.copy()
+    out = canonicalize_contacts(df, ContactDirectory.from_events(df))
+
+    assert out["A CHI CHIEDERE"].dtype == df["A CHI CHIEDERE"].dtype
+    assert out.index.equals(df.index)
+    assert out["A CHI CHIEDERE"].isna().tolist() == [False, False, True, False, False]
+    assert out["A CHI CHIEDERE"].dropna().tolist() == ["Mario Rossi", "Mario Rossi", "Anna Ferrari", "Mario Rossi"]
+    pd.testing.assert_frame_equal(df, original)  # il df di partenza non cambia
+
+
+def test_canonicalize_without_variants_returns_same_frame():
+    df = pd.DataFrame({"A CHI CHIEDERE": ["Mario Rossi", None, "Anna Ferrari"]})
+    assert canonicalize_contacts(df, ContactDirectory.from_events(df)) is df
+    empty = df.iloc[:0]
+    assert canonicalize_contacts(empty, directory({"Mario Rossi": 2, "rossi mario": 1})).empty
@@ -0,0 +1,48 @@
+"""Digest: le chiamate singole passano dallo scheduler condiviso con la chat"""
+
+from types import SimpleNamespace
+
+import pandas as pd
+
+from eventi.digest import DIGEST_PROMPTS, DIGEST_SESSION, STATUS_DONE, DigestStore, compute_digest
+from eventi.scheduler import RequestScheduler
+
+
+class RecordingScheduler(RequestScheduler):
+    def __init__(self):
+        super().__init__()
+        self.served = []
+
+    def acquire(self, session_id, estimated_tokens):
+        super().acquire(session_id, estimated_tokens)
+        self.served.append(session_id)
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = 0
+        self.messages = SimpleNamespace(create=self.create)
+
+    def create(self, **params):
+        self.calls += 1
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=f"risposta {self.calls}")],
+                               usage=SimpleNamespace(input_tokens=10))
+
+
+def events():
+    return pd.DataFrame({
+        'DATA EVENTO': pd.to_datetime(["2026-01-15", "2026-02-20"]),
+        'NOME EVENTO': ["Convegno", "Workshop"],
+        'A CHI CHIEDERE': ["Mario Rossi", "Anna Ferrari"],
+        'CATEGORIA': ["EVENTI delle organizzazioni", "EVENTI di logotel che farà"],
+    })
+
+
+def test_sequential_digest_goes_through_scheduler(tmp_path):
+    scheduler = RecordingScheduler()
+    client = FakeClient()
+    digest = compute_digest(client, events(), "v1", store=DigestStore(str(tmp_path)), use_batches=False,
+                            scheduler=scheduler.session(DIGEST_SESSION))
+    assert digest["stato"] == STATUS_DONE
+    assert client.calls == len(DIGEST_PROMPTS)
+    assert scheduler.served == [DIGEST_SESSION] * len(DIGEST_PROMPTS)
@@ -0,0 +1,70 @@
+"""FilterSpec.date_window: l'intervallo contiene tutte le date ammesse dalle clausole esatte"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from eventi.filters import PERIODI, FilterSpec, compile_mask
+
+NOW = datetime(2026, 3, 15, 14, 37, 12)
+
+
+@pytest.fixture
+def df():
+    # Ogni 30 minuti per ~8 mesi attorno a NOW, più gli estremi dei giorni e una data mancante
+    dates = pd.date_range("2025-12-01", "2026-08-01", freq="30min")
+    edges = pd.to_datetime(["2026-03-15 00:00:00", "2026-03-15 23:59:59", "2026-06-13 23:59:59",
+                            "2026-06-14 00:00:00", "2026-03-31 23:59:59", "2026-04-01 00:00:00"])
+    dates = dates.append(edges).append(pd.DatetimeIndex([pd.NaT]))
+    return pd.DataFrame({"DATA EVENTO": dates, "CATEGORIA": "c", "A CHI CHIEDERE": "x", "NOME EVENTO": "e"})
+
+
+def assert_window_covers(df, filtri):
+    spec = FilterSpec.from_dict(filtri)
+    mask = compile_mask(df, spec, now=NOW)
+    window = spec.date_window(now=NOW)
+    selected = df.loc[mask, 'DATA EVENTO']
+    assert len(selected) > 0
+    if window is None:
+        return
+    start, end = window
+    inside = np.ones(len(df), dtype=bool)
+    if start is not None:
+        assert start == start.normalize()
+        inside &= (df['DATA EVENTO'] >= start).to_numpy()
+    if end is not None:
+        assert end == end.normalize()
+        inside &= (df['DATA EVENTO'] < end).to_numpy()
+    # Nessuna riga ammessa dalle clausole resta fuori dall'intervallo
+    assert not (mask & ~inside).any()
+
+
+@pytest.mark.parametrize("periodo", PERIODI)
+def test_window_covers_period(df, periodo):
+    assert_window_covers(df, {"periodo": periodo})
+
+
+@pytest.mark.parametrize("periodo", PERIODI)
+@pytest.mark.parametrize("data_da, data_a", [
+    ("2026-01-10", None), (None, "2026-04-20"), ("2026-03-01", "2026-03-15"), ("2026-03-15", "2026-07-01")
+])
+def test_window_covers_period_and_dates(df, periodo, data_da, data_a):
+    filtri = {"periodo": periodo, "data_da": data_da, "data_a": data_a}
+    spec = FilterSpec.from_dict(filtri)
+    if not compile_mask(df, spec, now=NOW).any():
+        assert spec.date_window(now=NOW) is not None  # combinazione vuota: basta un limite
+        return
+    assert_window_covers(df, filtri)
+
+
+def test_window_bounds():
+    assert FilterSpec().date_window(now=NOW) is None
+    assert FilterSpec(categorie=["c"]).date_window(now=NOW) is None
+    assert FilterSpec(periodo="Questo Mese").date_window(now=NOW) == (pd.Timestamp("2026-03-01"),
+                                                                       pd.Timestamp("2026-04-01"))
+    assert FilterSpec(periodo="Passati").date_window(now=NOW) == (None, pd.Timestamp("2026-03-16"))
+    # data_a comprende tutto il giorno indicato
+    assert FilterSpec(data_da="2026-01-10 18:00", data_a="2026-02-01").date_window(now=NOW) == (
+        pd.Timestamp("2026-01-10"), pd.Timestamp("2026-02-02"))
@@ -0,0 +1,48 @@
+"""Partizioni Parquet: workbook con celle numeriche nelle colonne di testo"""
+
+import pandas as pd
+
+import eventi.core
+from eventi.fingerprint import file_fingerprint
+from eventi.partitions import PartitionStore
+
+
+def test_windows_of_mixed_workbook(mixed_workbook, tmp_path):
+    store = PartitionStore(mixed_workbook, directory=str(tmp_path / "partizioni"), granularity="mese")
+    df, manifest = store.load()
+    assert manifest["righe"] == 3
+    assert sorted(df['NOTE'].dropna()) == ["2025", "Evento strategico Q1"]
+
+    window, _ = store.load(pd.Timestamp("2026-02-01"), pd.Timestamp("2026-03-01"))
+    assert window['NOME EVENTO'].tolist() == ["Workshop"]
+    assert window['TAG'].tolist() == ["7"]
+    empty, _ = store.load(pd.Timestamp("2027-01-01"), pd.Timestamp("2027-02-01"))
+    assert empty.empty and 'NOTE' in empty.columns
+
+
+def test_write_accepts_object_columns(mixed_workbook, tmp_path):
+    store = PartitionStore(mixed_workbook, directory=str(tmp_path / "partizioni"))
+    raw = pd.read_excel(mixed_workbook)
+    raw['DATA EVENTO'] = pd.to_datetime(raw['DATA EVENTO'], dayfirst=True)
+    assert store.write(raw)["righe"] == 3
+    assert raw['NOTE'].tolist()[0] == 2025  # il dataframe passato non cambia
+
+
+def test_manifest_matches_the_content_read(mixed_workbook, tmp_path, monkeypatch):
+    read = eventi.core.load_events
+    calls = []
+
+    def load_then_save_elsewhere(path):
+        df = read(path)
+        if not calls:
+            df.iloc[:2].to_excel(path, index=False)
+        calls.append(path)
+        return df
+
+    monkeypatch.setattr(eventi.core, "load_events", load_then_save_elsewhere)
+    store = PartitionStore(mixed_workbook, directory=str(tmp_path / "partizioni"))
+    df, manifest = store.load()
+    assert len(calls) == 2
+    assert manifest["righe"] == len(df) == 2
+    assert manifest["impronta"] == file_fingerprint(mixed_workbook)
+    assert store.manifest() is not None
@@ -0,0 +1,33 @@
+"""Contatti simili: vettori per contatto, righe senza contatto e contatti più vicini"""
+
+import pandas as pd
+import pytest
+
+from eventi.similarity import ContactSimilarity
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'A CHI CHIEDERE': pd.Series(["Andrea Greco", "Andrea Greco", "Luca Neri", "Luca Neri", "Sara Marino",
+                                     None, "  "], dtype="string"),
+        'CATEGORIA': ["A", "A", "A", "A", "B", "A", "A"],
+        'DATA EVENTO': pd.to_datetime(["2026-01-05", "2026-02-05", "2026-01-20", "2026-02-20", "2025-06-01",
+                                       "2026-01-05", "2026-01-05"]),
+        'TAG': ["ai, retail", "ai", "ai", "retail", "moda", "ai", None],
+    })
+
+
+def test_rows_without_contact_are_ignored(df):
+    similarity = ContactSimilarity.build(df)
+    assert similarity.contacts == ["Andrea Greco", "Luca Neri", "Sara Marino"]
+    assert similarity.events.to_dict() == {"Andrea Greco": 2, "Luca Neri": 2, "Sara Marino": 1}
+
+
+def test_similar(df):
+    similarity = ContactSimilarity.build(df)
+    similar = similarity.similar(" Andrea Greco ", k=5)
+    assert similar['Contatto'].tolist()[0] == "Luca Neri"
+    assert similar['Similarità'].iloc[0] > 0.5
+    assert "ai" in similar['In comune'].iloc[0]
+    assert similarity.similar("Nessuno").empty
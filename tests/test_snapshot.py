@@ -0,0 +1,59 @@
+"""Snapshot Arrow: workbook con celle numeriche nelle colonne di testo"""
+
+import pandas as pd
+
+import eventi.core
+from eventi.core import load_events
+from eventi.fingerprint import file_fingerprint
+from eventi.snapshot import SnapshotStore
+
+
+def test_load_events_reads_text_columns_as_strings(mixed_workbook):
+    df = load_events(mixed_workbook)
+    for col in ['NOME EVENTO', 'LINK EVENTO', 'NOTE', 'TAG', 'USER MODIFICA']:
+        assert isinstance(df[col].dtype, pd.StringDtype), col
+    assert df['NOTE'].tolist()[:2] == ["2025", "Evento strategico Q1"]
+    assert df['TAG'][1] == "7"
+    assert df['LINK EVENTO'][0] == "12"  # non "12.0"
+    assert df['NOTE'].isna().tolist() == [False, False, True]
+    assert pd.api.types.is_datetime64_any_dtype(df['DATA EVENTO'])
+
+
+def test_snapshot_of_mixed_workbook(mixed_workbook, tmp_path):
+    store = SnapshotStore(mixed_workbook, directory=str(tmp_path / "snapshot"))
+    df, version = store.load()
+    assert version == file_fingerprint(mixed_workbook)
+    assert df['NOTE'].tolist()[:2] == ["2025", "Evento strategico Q1"]
+    assert pd.isna(df['NOTE'][2])
+
+
+def test_publish_accepts_object_columns(mixed_workbook, tmp_path):
+    # Un dataframe non passato da load_events (colonne object miste) viene normalizzato
+    store = SnapshotStore(mixed_workbook, directory=str(tmp_path / "snapshot"))
+    raw = pd.read_excel(mixed_workbook)
+    pointer = store.publish(raw)
+    assert store.open(pointer["versione"])['TAG'].tolist()[:2] == ["ai", "7"]
+    assert raw['NOTE'].tolist()[0] == 2025  # il dataframe passato non cambia
+
+
+def test_file_changed_while_reading_is_read_again(mixed_workbook, tmp_path, monkeypatch):
+    # Un altro processo salva il workbook mentre lo snapshot lo sta leggendo
+    read = eventi.core.load_events
+    calls = []
+
+    def load_then_save_elsewhere(path):
+        df = read(path)
+        if not calls:
+            changed = df.copy()
+            changed.loc[0, 'NOME EVENTO'] = "Convegno spostato a un'altra sede"
+            changed.to_excel(path, index=False)
+        calls.append(path)
+        return df
+
+    monkeypatch.setattr(eventi.core, "load_events", load_then_save_elsewhere)
+    store = SnapshotStore(mixed_workbook, directory=str(tmp_path / "snapshot"))
+    df, version = store.load()
+    assert len(calls) == 2
+    assert version == file_fingerprint(mixed_workbook)
+    assert df['NOME EVENTO'][0] == "Convegno spostato a un'altra sede"
+    assert store.pointer()["versione"] == version
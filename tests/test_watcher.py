@@ -0,0 +1,28 @@
+"""DataWatcher: cambio di versione e listener"""
+
+import logging
+
+from eventi.watcher import DataWatcher
+
+
+def test_failing_listener_is_logged_and_others_run(tmp_path, caplog):
+    path = tmp_path / "eventi.xlsx"
+    path.write_bytes(b"prima")
+    watcher = DataWatcher(str(path))
+    seen = []
+
+    def broken(old, new):
+        raise RuntimeError("snapshot non scritto")
+
+    watcher.add_listener(broken)
+    watcher.add_listener(lambda old, new: seen.append((old, new)))
+    old = watcher.version
+    path.write_bytes(b"dopo la modifica")
+    with caplog.at_level(logging.ERROR, logger="eventi.watcher"):
+        new = watcher.check()
+
+    assert new != old
+    assert seen == [(old, new)]
+    assert "snapshot non scritto" in caplog.text
+    assert watcher.check() == new  # stesso file: nessun nuovo avviso
+    assert len(seen) == 1